@@ -55,6 +55,12 @@ Usage:
 	
 --no-optimize
 	Do not optimize the knowledge database file after updating.	
+
+--liftover-batch
+	Lift positions from old genome builds using the array batch liftOver engine.	
+
+--snp-file
+	Export the SNP loci to a memory-mapped file next to the knowledge database file, for batch lookups without SQL.	
 ```
 """
 
@@ -99,6 +105,10 @@ if __name__ == "__main__":
 	parser.add_argument('-d', '--temp-directory', type=str, metavar='dir', action='store', default=None,
 			help="a directory to use for temporary storage of downloaded or archived source data files (default: platform dependent)"
 	)
+	parser.add_argument('--profile', type=str, choices=('default','build','low-memory'), default='default',
+			help="the storage profile: 'build' for large updates (bigger pages and cache, parallel sorts), "
+			+"'low-memory' for small machines, or 'default'"
+	)
 #	parser.add_argument('-m', '--memory', type=str, metavar='size', default=None, #TODO
 #			help="the target amount of system memory to use (not exact, allow some margin); default: ~1gb"
 #	)
@@ -127,6 +137,12 @@ if __name__ == "__main__":
 	parser.add_argument('--no-optimize', action='store_true',
 			help="do not optimize the knowledge database file after updating"
 	)
+	parser.add_argument('--liftover-batch', action='store_true',
+			help="lift positions from old genome builds using the array batch liftOver engine"
+	)
+	parser.add_argument('--snp-file', action='store_true',
+			help="export the SNP loci to a memory-mapped file next to the knowledge database file"
+	)
 	parser.add_argument('-v', '--verbose', action='store_true',
 			help="print warnings and log messages (default)"
 	)
@@ -181,7 +197,7 @@ if __name__ == "__main__":
 		os.environ['TMPDIR'] = os.path.abspath(args.temp_directory)
 	
 	# instantiate database object
-	db = loki_db.Database(testing=args.test_data, updating=True)
+	db = loki_db.Database(testing=args.test_data, updating=True, profile=args.profile)
 	db.setVerbose(args.verbose or (not args.quiet))
 	db.attachDatabaseFile(args.knowledge)
 	
@@ -273,7 +289,7 @@ if __name__ == "__main__":
 			#if fromArchive
 			
 			os.chdir(cacheDir)
-			updateOK = db.updateDatabase(srcSet, userOptions, args.cache_only, args.force_update)
+			updateOK = db.updateDatabase(srcSet, userOptions, args.cache_only, args.force_update, args.liftover_batch)
 			os.chdir(startDir)
 			
 			# create output archive, if requested
@@ -307,6 +323,13 @@ if __name__ == "__main__":
 			else:
 				db.testDatabaseWriteable()
 				db.optimizeDatabase()
+		
+		# export snp loci?
+		if args.snp_file:
+			if not updateOK:
+				print ("WARNING: errors encountered during knowledge database update; skipping SNP locus file export")
+			elif not db.openSNPLocusFile():
+				db.saveSNPLocusFile()
 	#if knowledge
 #__main__
 
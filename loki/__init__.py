@@ -1 +1 @@
-__all__ = ["loki_db","loki_source","loki_updater","loaders","util"]
+__all__ = ["loki_db","loki_aio","loki_source","loki_updater","loaders","util"]
@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+import asyncio
+import concurrent.futures
+import itertools
+import os
+
+
+class AsyncDatabase(object):
+	"""
+	An asyncio facade over a knowledge database's pool of read-only connections.
+
+	Each query runs on its own pooled connection in a bounded thread pool, and its results are
+	handed to the event loop in batches as they are consumed, so the loop never waits on sqlite.
+	At most one query per pooled connection runs at once; later queries wait their turn in order,
+	and a query which is abandoned (or whose task is cancelled) stops and returns its connection.
+
+	Usage:
+		adb = AsyncDatabase(db, size=8)
+		async for row in adb.generateSNPLociByRSes(rses):
+			...
+		await adb.close()
+	"""
+
+	# the Database query methods which may be called as async iterators
+	_generators = frozenset((
+		'generateCurrentRSesByRSes', 'generateSNPLociByRSes', 'generateSNPsByRegions',
+		'generateBiopolymersByIDs', 'generateBiopolymerIDsByIdentifiers', 'generateTypedBiopolymerIDsByIdentifiers',
+		'generateBiopolymerIDsBySearch', 'generateTypedBiopolymerIDsBySearch', 'generateBiopolymerNameStats',
+		'generateBiopolymersByRegions', 'generateBiopolymersByPositions',
+		'generateGroupsByIDs', 'generateGroupIDsByIdentifiers', 'generateTypedGroupIDsByIdentifiers',
+		'generateGroupIDsBySearch', 'generateTypedGroupIDsBySearch', 'generateGroupNameStats',
+		'generateGroupAncestorsByIDs', 'generateGroupDescendantsByIDs', 'generateBiopolymerIDsByGroupIDs',
+		'generateGroupOverlapCounts', 'generateGroupOverlaps',
+		'generateLiftOverLoci', 'generateLiftOverRegions',
+	))
+
+
+	def __init__(self, db, size=None, maxWaiting=None, batchSize=1000):
+		"""
+		Initializes the facade, opening the database's connection pool if it has none.
+
+		Args:
+			db (loki_db.Database): A Database with a knowledge database file attached.
+			size (int, optional): The number of pooled connections to open if the database has no
+				pool yet; defaults to the number of CPUs.
+			maxWaiting (int, optional): The maximum number of queries which may wait for a free
+				connection before further queries are refused, or None for no limit.
+			batchSize (int, optional): The number of results fetched from a query at a time.
+		"""
+		if db.getConnectionPoolCapacity() == None:
+			db.openConnectionPool(size or os.cpu_count() or 1)
+		self._db = db
+		self._size = db.getConnectionPoolCapacity()
+		self._maxWaiting = maxWaiting
+		self._batchSize = max(int(batchSize), 1)
+		self._waiting = 0
+		self._slots = asyncio.Semaphore(self._size)
+		self._executor = concurrent.futures.ThreadPoolExecutor(self._size, thread_name_prefix='loki_aio')
+	#__init__()
+
+
+	def __getattr__(self, name):
+		if name in AsyncDatabase._generators:
+			return lambda *args, **kwargs: self.generate(name, *args, **kwargs)
+		raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+	#__getattr__()
+
+
+	async def _acquire(self):
+		if self._slots.locked() and (self._maxWaiting != None) and (self._waiting >= self._maxWaiting):
+			raise Exception("ERROR: too many knowledge database queries are waiting (%d)" % (self._waiting,))
+		self._waiting += 1
+		try:
+			await self._slots.acquire()
+		finally:
+			self._waiting -= 1
+	#_acquire()
+
+
+	async def generate(self, method, *args, **kwargs):
+		"""
+		Runs one of the Database generator methods on a pooled connection.
+
+		Any tally dict is filled in by the time iteration ends; any errorCallback is called from
+		the worker thread running the query.
+
+		Args:
+			method (str): The name of the Database method, such as 'generateSNPLociByRSes'.
+			*args, **kwargs: The method's arguments.
+
+		Yields:
+			tuple: The method's results.
+
+		Raises:
+			Exception: If the method is unknown, or too many queries are already waiting.
+		"""
+		if method not in AsyncDatabase._generators:
+			raise Exception("ERROR: '%s' is not an asynchronous knowledge database query" % (method,))
+		await self._acquire()
+		loop = asyncio.get_running_loop()
+		release = lambda: loop.call_soon_threadsafe(self._slots.release)
+		state = dict(conn=None, gen=None)
+
+		def start():
+			state['conn'] = self._db.checkoutConnection()
+			state['gen'] = getattr(state['conn'], method)(*args, **kwargs)
+		def fetch():
+			return list(itertools.islice(state['gen'], self._batchSize))
+		def finish():
+			try:
+				if state['gen']:
+					state['gen'].close()
+			finally:
+				if state['conn']:
+					self._db.checkinConnection(state['conn'])
+				release()
+		#finish()
+
+		job = None
+		try:
+			job = self._executor.submit(start)
+			await asyncio.wrap_future(job)
+			while True:
+				job = self._executor.submit(fetch)
+				batch = await asyncio.wrap_future(job)
+				for row in batch:
+					yield row
+				if len(batch) < self._batchSize:
+					break
+		finally:
+			# closing the generator runs sqlite cleanup, so it happens on a worker thread;
+			# a cancelled fetch may still be running, so the generator is closed once it stops
+			if job:
+				job.add_done_callback(lambda f: self._executor.submit(finish))
+			else:
+				self._executor.submit(finish)
+	#generate()
+
+
+	async def call(self, method, *args, **kwargs):
+		"""
+		Runs any other Database query method on a pooled connection, such as
+		countGroupBiopolymers() or liftOverRegionBatch().
+
+		Args:
+			method (str): The name of the Database method.
+			*args, **kwargs: The method's arguments.
+
+		Returns:
+			The method's return value.
+		"""
+		await self._acquire()
+		def run():
+			conn = self._db.checkoutConnection()
+			try:
+				return getattr(conn, method)(*args, **kwargs)
+			finally:
+				self._db.checkinConnection(conn)
+		#run()
+		loop = asyncio.get_running_loop()
+		job = self._executor.submit(run)
+		job.add_done_callback(lambda f: loop.call_soon_threadsafe(self._slots.release))
+		return await asyncio.wrap_future(job)
+	#call()
+
+
+	async def close(self):
+		"""
+		Waits for running queries to stop and shuts down the worker threads; the database and
+		its connection pool are left open.
+		"""
+		await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+	#close()
+
+#AsyncDatabase
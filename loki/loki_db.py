@@ -2,9 +2,24 @@
 
 import datetime
 import apsw
+import array
 import bisect
+import collections
+import concurrent.futures
+import contextlib
+import glob
+import hashlib
 import itertools
+import json
+import mmap
+import multiprocessing
+from multiprocessing import shared_memory
+import operator
+import os
+import queue
 import sys
+import threading
+import urllib.parse
 
 ##################################################
 # Note on included docstring
@@ -13,6 +28,24 @@ import sys
 # Docstring has not been inspected line by line
 ##################################################
 
+class _LiftOverSharedMemory(shared_memory.SharedMemory):
+	"""
+	A shared memory block holding a liftOver chain index.
+
+	The index columns are views onto the block, so it cannot be closed while any lookup
+	still uses them; the mapping is then released along with the last of those views.
+	"""
+	
+	def __del__(self):
+		try:
+			self.close()
+		except BufferError:
+			pass
+	#__del__()
+	
+#_LiftOverSharedMemory
+
+
 class Database(object):
 	"""
 	A class to interact with a SQLite database using APSW.
@@ -143,7 +176,7 @@ class Database(object):
 )
 """,
 				'data': [
-					('schema','3'),
+					('schema','7'),
 					('ucschg',None),
 					('zone_size','100000'),
 					('optimized','0'),
@@ -392,6 +425,21 @@ class Database(object):
 				'index': {
 					'biopolymer__type': '(type_id)',
 					'biopolymer__label_type': '(label,type_id)',
+				},
+				# optional FTS5 trigram index of labels, names and descriptions for text searches, if sqlite
+				# has the fts5 module; built by finalize/optimize and dropped whenever any of its tables are updated
+				'fts': {
+					'biopolymer_search': {
+						'table': "(text, biopolymer_id UNINDEXED, field UNINDEXED, tokenize='trigram')",
+						'tables': ('biopolymer','biopolymer_name'),
+						'data': """
+SELECT label, biopolymer_id, 0 FROM `{db}`.`biopolymer`
+UNION ALL
+SELECT DISTINCT name, biopolymer_id, 1 FROM `{db}`.`biopolymer_name`
+UNION ALL
+SELECT description, biopolymer_id, 2 FROM `{db}`.`biopolymer` WHERE description IS NOT NULL
+""",
+					},
 				}
 			}, #.db.biopolymer
 			
@@ -437,6 +485,7 @@ class Database(object):
   chr TINYINT NOT NULL,
   posMin BIGINT NOT NULL,
   posMax BIGINT NOT NULL,
+  bin INTEGER NOT NULL DEFAULT 0,
   source_id TINYINT NOT NULL,
   PRIMARY KEY (biopolymer_id,ldprofile_id,chr,posMin,posMax)
 )
@@ -444,6 +493,15 @@ class Database(object):
 				'index': {
 					'biopolymer_region__ldprofile_chr_min': '(ldprofile_id,chr,posMin)',
 					'biopolymer_region__ldprofile_chr_max': '(ldprofile_id,chr,posMax)',
+					'biopolymer_region__ldprofile_chr_bin': '(ldprofile_id,chr,bin)',
+				},
+				# optional R*Tree index, used for overlap queries if sqlite has the rtree module;
+				# like the indices it is dropped while the table is updated and rebuilt afterwards
+				'rtree': {
+					'biopolymer_region__rtree': {
+						'table': '(id, ldprofileMin, ldprofileMax, chrMin, chrMax, posMin, posMax, +biopolymer_id)',
+						'data': 'SELECT ldprofile_id, ldprofile_id, chr, chr, MIN(posMin,posMax), MAX(posMin,posMax), biopolymer_id FROM `{db}`.`biopolymer_region`',
+					},
 				}
 			}, #.db.biopolymer_region
 			
@@ -482,6 +540,19 @@ class Database(object):
 					'group__type': '(type_id)',
 					'group__subtype': '(subtype_id)',
 					'group__label_type': '(label,type_id)',
+				},
+				'fts': {
+					'group_search': {
+						'table': "(text, group_id UNINDEXED, field UNINDEXED, tokenize='trigram')",
+						'tables': ('group','group_name'),
+						'data': """
+SELECT label, group_id, 0 FROM `{db}`.`group`
+UNION ALL
+SELECT DISTINCT name, group_id, 1 FROM `{db}`.`group_name`
+UNION ALL
+SELECT description, group_id, 2 FROM `{db}`.`group` WHERE description IS NOT NULL
+""",
+					},
 				}
 			}, #.db.group
 			
@@ -521,6 +592,44 @@ class Database(object):
 			}, #.db.group_group
 			
 			
+			'group_closure': {
+				# every pair of groups connected by a path of containment relationships, computed
+				# from group_group by the updater; every group is its own ancestor at depth 0
+				# depth is the length of the shortest such path, and relationships is the union of
+				# (1 << relationship_id) over every edge on every path (ids above 62 share the top bit)
+				'table': """
+(
+  ancestor_group_id INTEGER NOT NULL,
+  descendant_group_id INTEGER NOT NULL,
+  depth SMALLINT NOT NULL,
+  relationships BIGINT NOT NULL,
+  PRIMARY KEY (ancestor_group_id,descendant_group_id)
+)
+""",
+				'index': {
+					'group_closure__descendant': '(descendant_group_id,ancestor_group_id)',
+				}
+			}, #.db.group_closure
+			
+			
+			'group_overlap': {
+				# optional cache of the shared member counts of every pair of groups with any members
+				# in common (group_id < related_group_id), valid while the 'group_overlap_key' setting
+				# matches the current sources and membership thresholds
+				'table': """
+(
+  group_id INTEGER NOT NULL,
+  related_group_id INTEGER NOT NULL,
+  members INTEGER NOT NULL,
+  related_members INTEGER NOT NULL,
+  shared INTEGER NOT NULL,
+  PRIMARY KEY (group_id,related_group_id)
+)
+""",
+				'index': {}
+			}, #.db.group_overlap
+			
+			
 			'group_biopolymer': {
 				'table': """
 (
@@ -600,6 +709,7 @@ class Database(object):
   new_end BIGINT NOT NULL,
   score BIGINT NOT NULL,
   is_fwd TINYINT NOT NULL,
+  data BLOB,
   source_id TINYINT NOT NULL
 )
 """,
@@ -609,6 +719,10 @@ class Database(object):
 			}, #.db.chain
 			
 			
+			# chain blocks are normally packed into chain.data (see Database.packChainData());
+			# rows here are only read for chains whose data is NULL
+			
+			
 			'chain_data': { # all coordinates in LOKI are 1-based closed intervals
 				'table': """
 (
@@ -630,11 +744,62 @@ class Database(object):
 	} #_schema{}
 	
 	
+	# number of inputs above which lookups join against a temp table instead of querying once per input
+	_bulkLookupThreshold = 10000
+	
+	# number of inputs sorted and swept together by the position and region overlap lookups
+	_overlapBatchSize = 100000
+	
+	# translation for sqlite's LOWER(), which only folds ASCII letters
+	_asciiLower = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+	
+	# (offset,shift) of each level of the UCSC-style region binning scheme, from the smallest
+	# bins (128kb) to the single top-level bin which holds anything up to 512Mb (or beyond)
+	_binLevels = ((585,17), (73,20), (9,23), (1,26), (0,29))
+	
+	# leading bytes of a prepared liftOver chain index file
+	_liftOverCacheMagic = b'LOKICHN1'
+	
+	# int64 columns of each chromosome's liftOver chain index
+	_liftOverChainColumns = (
+		'chain_id', 'start', 'end', 'is_fwd', 'new_chr', 'maxend', 'rank', 'seg_lo', 'seg_hi',
+		'seg_start', 'seg_end', 'seg_new',
+	)
+	
+	# storage settings by profile name; page_size only takes effect when a file is created (or vacuumed),
+	# cache_size is in kibibytes, temp_store is None to leave sqlite's default, and threads is the
+	# number of helper threads sqlite may use for large sorts (it caps this at its own limit)
+	_storageProfiles = {
+		# the long-standing settings
+		'default': {
+			'page_size': 4096, 'cache_size': 65536, 'mmap_size': 0, 'temp_store': None, 'threads': 0,
+			'readOnly': False, 'immutable': False,
+		},
+		# large updates: big pages and cache for bulk inserts and index builds, and parallel sorts;
+		# scratch space stays on disk since index builds can outgrow memory
+		'build': {
+			'page_size': 16384, 'cache_size': 1048576, 'mmap_size': 0, 'temp_store': 'FILE', 'threads': min(os.cpu_count() or 1, 8),
+			'readOnly': False, 'immutable': False,
+		},
+		# query nodes: a finished file opened read-only and immutable (so sqlite skips locking
+		# and change detection), read through a memory map with a modest page cache
+		'serve': {
+			'page_size': 4096, 'cache_size': 262144, 'mmap_size': 1 << 40, 'temp_store': 'MEMORY', 'threads': 2,
+			'readOnly': True, 'immutable': True,
+		},
+		# small machines: a small page cache, no memory map and scratch space on disk
+		'low-memory': {
+			'page_size': 4096, 'cache_size': 8192, 'mmap_size': 0, 'temp_store': 'FILE', 'threads': 0,
+			'readOnly': False, 'immutable': False,
+		},
+	}
+	
+	
 	##################################################
 	# constructor
 	
 	
-	def __init__(self, dbFile=None, testing=False, updating=False, tempMem=False):
+	def __init__(self, dbFile=None, testing=False, updating=False, tempMem=False, profile='default'):
 		"""
 		Initializes a Database instance.
 
@@ -643,7 +808,17 @@ class Database(object):
 			testing (bool, optional): If True, runs in testing mode.
 			updating (bool, optional): If True, runs in updating mode.
 			tempMem (bool, optional): If True, uses memory for temporary storage.
+			profile (str, optional): The storage profile: 'default', 'build' (large updates), 'serve'
+				(read-only query nodes) or 'low-memory'.
+
+		Raises:
+			Exception: If the storage profile is unknown, or is read-only while updating.
 		"""
+		if profile not in self._storageProfiles:
+			raise Exception("ERROR: unknown storage profile '%s'" % (profile,))
+		if updating and self._storageProfiles[profile]['readOnly']:
+			raise Exception("ERROR: storage profile '%s' is read-only and cannot be used for updating" % (profile,))
+		
 		# initialize instance properties
 		self._is_test = testing
 		self._updating = updating
@@ -652,11 +827,32 @@ class Database(object):
 		self._logFile = sys.stderr
 		self._logIndent = 0
 		self._logHanging = False
-		self._db = apsw.Connection('')
+		# URI filenames let knowledge database files be attached read-only
+		self._db = apsw.Connection('', flags=(apsw.SQLITE_OPEN_READWRITE | apsw.SQLITE_OPEN_CREATE | apsw.SQLITE_OPEN_URI))
 		self._dbFile = None
 		self._dbNew = None
+		self._dbReadOnly = False
 		self._updater = None
-		self._liftOverCache = dict() # { (from,to) : [] }
+		self._pool = None
+		self._poolSize = 0
+		self._poolLock = threading.Lock()
+		self._parallelLookupChunkSize = None
+		self._lookupIndexOffset = 0 # added to the input indices reported to errorCallback
+		self._bulkLookupCounter = itertools.count()
+		self._bulkLookupTrash = set()
+		self._rtreeSupported = None
+		self._ftsSupported = None
+		self._biopolymerIDCached = False
+		self._biopolymerIDIndex = None
+		self._groupMembershipCache = dict() # { (minSpecificity,minImplication,minQuality) : index }
+		self._liftOverCache = collections.OrderedDict() # { (from,to) : { chr:index } } in LRU order
+		self._liftOverCacheLimit = 2
+		self._liftOverShared = False
+		self._liftOverSharedBlocks = dict() # { (from,to) : (SharedMemory,owned) }
+		
+		self._tempMem = tempMem
+		self._storageProfile = profile
+		self._poolOwner = None
 		
 		self.configureDatabase(tempMem=tempMem)
 		self.attachDatabaseFile(dbFile)
@@ -694,6 +890,259 @@ class Database(object):
 	#__exit__()
 	
 	
+	##################################################
+	# connection pool
+	
+	
+	def openConnectionPool(self, size):
+		"""
+		Opens a pool of read-only connections to the current knowledge database file, for
+		running queries from several threads at once.
+
+		Each pooled connection is a separate Database with its own sqlite connection, configured
+		the same way and with its own liftOver and identifier caches, so any query method can be
+		called on it; sqlite work runs without the GIL, so queries on different connections
+		proceed in parallel.
+
+		Args:
+			size (int): The number of connections.
+
+		Raises:
+			Exception: If no database file is loaded.
+		"""
+		if not self._dbFile:
+			raise Exception("ERROR: no knowledge database file is loaded")
+		self.closeConnectionPool()
+		pool = queue.LifoQueue()
+		try:
+			for n in range(size):
+				conn = Database(tempMem=self._tempMem, profile=self._storageProfile)
+				try:
+					conn.setVerbose(False)
+					conn.setLogger(self._logger)
+					conn.setLiftOverCacheLimit(self._liftOverCacheLimit)
+					conn.setLiftOverCacheShared(self._liftOverShared)
+					conn.setBiopolymerIDCache(self._biopolymerIDCached)
+					conn.attachDatabaseFile(self._dbFile, quiet=True, readOnly=True)
+					if not conn._dbFile:
+						raise Exception("ERROR: could not open knowledge database file '%s' read-only" % (self._dbFile,))
+				except:
+					conn._close()
+					raise
+				pool.put(conn)
+		except:
+			# close whatever connections were already opened
+			while not pool.empty():
+				pool.get_nowait()._close()
+			raise
+		with self._poolLock:
+			self._pool = pool
+			self._poolSize = size
+	#openConnectionPool()
+	
+	
+	def closeConnectionPool(self):
+		"""
+		Closes the pooled connections; any which are checked out are closed when they are returned.
+		"""
+		with self._poolLock:
+			pool,self._pool = self._pool,None
+			self._poolSize = 0
+		while pool:
+			try:
+				pool.get_nowait()._close()
+			except queue.Empty:
+				break
+	#closeConnectionPool()
+	
+	
+	def getConnectionPoolSize(self):
+		"""
+		Gets the number of pooled connections which are not checked out.
+
+		Returns:
+			int: The number of available connections, or None if there is no pool.
+		"""
+		pool = self._pool
+		return pool.qsize() if pool else None
+	#getConnectionPoolSize()
+	
+	
+	def getConnectionPoolCapacity(self):
+		"""
+		Gets the total number of pooled connections, whether or not they are checked out.
+
+		Returns:
+			int: The number of connections opened by openConnectionPool(), or None if there is no pool.
+		"""
+		with self._poolLock:
+			return self._poolSize if self._pool else None
+	#getConnectionPoolCapacity()
+	
+	
+	def checkoutConnection(self, timeout=None):
+		"""
+		Takes a connection from the pool, waiting for one to be returned if necessary;
+		it must be given back with checkinConnection() once its queries are finished.
+
+		Args:
+			timeout (float, optional): Maximum number of seconds to wait, or None to wait indefinitely.
+
+		Returns:
+			Database: A pooled connection, or this Database itself if there is no pool.
+
+		Raises:
+			queue.Empty: If no connection became available within the timeout.
+		"""
+		pool = self._pool
+		if not pool:
+			return self
+		conn = pool.get(timeout=timeout)
+		conn._poolOwner = pool
+		return conn
+	#checkoutConnection()
+	
+	
+	def checkinConnection(self, conn):
+		"""
+		Returns a connection to the pool it was taken from.
+
+		Args:
+			conn (Database): A connection from checkoutConnection().
+		"""
+		if conn is self:
+			return
+		pool,conn._poolOwner = conn._poolOwner,None
+		with self._poolLock:
+			if pool and (pool is self._pool):
+				pool.put(conn)
+				return
+		conn._close()
+	#checkinConnection()
+	
+	
+	@contextlib.contextmanager
+	def connection(self, timeout=None):
+		"""
+		Checks out a pooled connection for the duration of a with block; generators returned
+		by its query methods must be used up before the block ends.
+
+		Args:
+			timeout (float, optional): Maximum number of seconds to wait, or None to wait indefinitely.
+
+		Yields:
+			Database: A pooled connection, or this Database itself if there is no pool.
+		"""
+		conn = self.checkoutConnection(timeout)
+		try:
+			yield conn
+		finally:
+			self.checkinConnection(conn)
+	#connection()
+	
+	
+	def setParallelLookups(self, chunkSize=100000):
+		"""
+		Sets whether large lookups are split into chunks which run at once on the pooled
+		connections; results, tallies and error callbacks are the same as for a serial lookup.
+
+		This applies to lookups of SNPs by RS or region, and of biopolymers and groups by
+		identifier or region, while a connection pool is open.
+
+		Args:
+			chunkSize (int, optional): The number of inputs per chunk, or None to run lookups serially.
+		"""
+		self._parallelLookupChunkSize = chunkSize
+	#setParallelLookups()
+	
+	
+	def _generateParallelLookupRows(self, lookup, inputs, tally, errorCallback, runs):
+		"""
+		Runs a lookup over chunks of its inputs on the pooled connections at once, and passes on
+		each chunk's results, error callbacks and tallies in input order, as if it had run here.
+
+		Args:
+			lookup (callable): lookup(conn, inputs, tally, errorCallback), which runs the lookup on a pooled connection.
+			inputs (iterable): The lookup inputs.
+			tally (dict or None): The caller's tally, which receives the sums of every chunk's tallies.
+			errorCallback (callable or None): The caller's error callback.
+			runs (bool): True if the lookup numbers its inputs by runs of identical consecutive inputs
+				(which it looks up as one), rather than individually, in its error callbacks.
+
+		Yields:
+			tuple: The lookup's results.
+		"""
+		chunkSize = self._parallelLookupChunkSize
+		workers = max(self._poolSize, 1)
+		
+		def generateChunks():
+			# runs of identical inputs are never split, since the lookup would count them as one
+			chunk = list()
+			offset = 0
+			for item in inputs:
+				if (len(chunk) >= chunkSize) and (item != chunk[-1]):
+					yield (chunk, offset)
+					offset += sum(1 for i in range(len(chunk)) if (i == 0) or (chunk[i] != chunk[i-1])) if runs else len(chunk)
+					chunk = list()
+				chunk.append(item)
+			yield (chunk, offset)
+		#generateChunks()
+		
+		def runChunk(chunk, offset):
+			events = list()
+			chunkTally = dict() if (tally != None) else None
+			callback = (lambda *args: events.append( (False, args) )) if errorCallback else None
+			conn = self.checkoutConnection()
+			try:
+				conn._lookupIndexOffset = offset
+				for row in lookup(conn, chunk, chunkTally, callback):
+					events.append( (True, row) )
+			finally:
+				conn._lookupIndexOffset = 0
+				self.checkinConnection(conn)
+			return (events, chunkTally)
+		#runChunk()
+		
+		totals = dict()
+		def finishChunk(future):
+			events,chunkTally = future.result()
+			for isRow,value in events:
+				if isRow:
+					yield value
+				else:
+					errorCallback(*value)
+			for key,value in (chunkTally or dict()).items():
+				totals[key] = totals.get(key, 0) + value
+		#finishChunk()
+		
+		executor = concurrent.futures.ThreadPoolExecutor(workers)
+		try:
+			pending = collections.deque()
+			for chunk,offset in generateChunks():
+				pending.append(executor.submit(runChunk, chunk, offset))
+				# keep a bounded number of chunks in flight
+				while len(pending) > 2 * workers:
+					yield from finishChunk(pending.popleft())
+			while pending:
+				yield from finishChunk(pending.popleft())
+		finally:
+			executor.shutdown(cancel_futures=True)
+		if tally != None:
+			tally.update(totals)
+	#_generateParallelLookupRows()
+	
+	
+	def _close(self):
+		"""
+		Closes this Database's sqlite connection, along with any pool of its own.
+		"""
+		self.closeConnectionPool()
+		self.clearLiftOverCache(files=False)
+		self._db.close()
+		self._dbFile = None
+	#_close()
+	
+	
 	##################################################
 	# logging
 	
@@ -736,6 +1185,44 @@ class Database(object):
 	#setVerbose()
 	
 	
+	def setLiftOverCacheLimit(self, limit=2):
+		"""
+		Sets the number of genome build pairs whose liftOver chain indexes are kept in memory.
+
+		Args:
+			limit (int, optional): Maximum number of cached build pairs, or None for no limit.
+		"""
+		self._liftOverCacheLimit = limit
+		self._trimLiftOverCache()
+	#setLiftOverCacheLimit()
+	
+	
+	def setLiftOverCacheShared(self, shared=True):
+		"""
+		Sets whether liftOver chain indexes are placed in named shared memory blocks,
+		so that every process on the node using the same knowledge database maps a single copy.
+
+		Args:
+			shared (bool, optional): True to share chain indexes between processes, False to keep private copies.
+		"""
+		self._liftOverShared = shared
+	#setLiftOverCacheShared()
+	
+	
+	def setBiopolymerIDCache(self, cached=True):
+		"""
+		Sets whether biopolymer identifier lookups are resolved from an in-memory index of all
+		biopolymer names and labels, which is loaded on first use, instead of by query.
+
+		Args:
+			cached (bool, optional): True to preload the index, False to query the database.
+		"""
+		self._biopolymerIDCached = cached
+		if not cached:
+			self._biopolymerIDIndex = None
+	#setBiopolymerIDCache()
+	
+	
 	def setLogger(self, logger=None):
 		"""
 		Sets the logger object.
@@ -868,6 +1355,70 @@ class Database(object):
 	#getDatabaseMemoryLimit()
 	
 	
+	def hasRTreeSupport(self):
+		"""
+		Checks whether the sqlite library was built with the R*Tree module.
+
+		Returns:
+			bool: True if R*Tree indices can be created and queried.
+		"""
+		if self._rtreeSupported == None:
+			self._rtreeSupported = any(row[0] == 'ENABLE_RTREE' for row in self._db.cursor().execute("PRAGMA compile_options"))
+		return self._rtreeSupported
+	#hasRTreeSupport()
+	
+	
+	def hasDatabaseRTree(self, rtreeName):
+		"""
+		Checks whether an R*Tree index is currently available in the knowledge database.
+
+		Args:
+			rtreeName (str): The name of the R*Tree index, as defined in the schema.
+
+		Returns:
+			bool: True if the R*Tree exists and can be queried.
+		"""
+		if not (self._dbFile and self.hasRTreeSupport()):
+			return False
+		return any(self._db.cursor().execute("SELECT 1 FROM `db`.`sqlite_master` WHERE type = 'table' AND name = ?", (rtreeName,)))
+	#hasDatabaseRTree()
+	
+	
+	def hasFTSSupport(self):
+		"""
+		Checks whether the sqlite library was built with the FTS5 module and its trigram tokenizer.
+
+		Returns:
+			bool: True if text search indices can be created and queried.
+		"""
+		if self._ftsSupported == None:
+			cursor = self._db.cursor()
+			try:
+				cursor.execute("CREATE VIRTUAL TABLE `temp`.`_fts_probe` USING fts5(text, tokenize='trigram')")
+				cursor.execute("DROP TABLE `temp`.`_fts_probe`")
+				self._ftsSupported = True
+			except apsw.SQLError:
+				self._ftsSupported = False
+		return self._ftsSupported
+	#hasFTSSupport()
+	
+	
+	def hasDatabaseSearchIndex(self, ftsName):
+		"""
+		Checks whether a text search index is currently available in the knowledge database.
+
+		Args:
+			ftsName (str): The name of the FTS5 index, as defined in the schema.
+
+		Returns:
+			bool: True if the index exists and can be queried.
+		"""
+		if not (self._dbFile and self.hasFTSSupport()):
+			return False
+		return any(self._db.cursor().execute("SELECT 1 FROM `db`.`sqlite_master` WHERE type = 'table' AND name = ?", (ftsName,)))
+	#hasDatabaseSearchIndex()
+	
+	
 	def setDatabaseMemoryLimit(self, limit=0):
 		"""
 		Sets a new memory limit for the database.
@@ -887,18 +1438,23 @@ class Database(object):
 			db (str, optional): The name of the database to configure. Defaults to None.
 			tempMem (bool, optional): If True, configures the temporary storage to use memory. Defaults to False.
 
-		The function sets various PRAGMA settings to optimize performance for typical usage scenarios.
+		The function sets various PRAGMA settings according to the storage profile.
 		"""
 		cursor = self._db.cursor()
+		profile = self._storageProfiles[self._storageProfile]
 		db = ("%s." % db) if db else ""
 		
 		# linux VFS doesn't usually report actual disk cluster size,
-		# so sqlite ends up using 1KB pages by default; we prefer 4KB
-		cursor.execute("PRAGMA %spage_size = 4096" % (db,))
+		# so sqlite ends up using 1KB pages by default; we prefer 4KB or more
+		cursor.execute("PRAGMA %spage_size = %d" % (db,profile['page_size']))
 		
 		# cache_size is pages if positive, kibibytes if negative;
 		# seems to only affect write performance
-		cursor.execute("PRAGMA %scache_size = -65536" % (db,))
+		cursor.execute("PRAGMA %scache_size = -%d" % (db,profile['cache_size']))
+		
+		# reading through a memory map saves copying pages into the cache,
+		# but the mapped pages count against the process' address space
+		cursor.execute("PRAGMA %smmap_size = %d" % (db,profile['mmap_size']))
 		
 		# for typical read-only usage, synchronization behavior is moot anyway,
 		# and while updating we're not that worried about a power failure
@@ -915,8 +1471,12 @@ class Database(object):
 		# the temp store is used for all of sqlite's internal scratch space
 		# needs, such as the TEMP database, indexing, etc; keeping it in memory
 		# is much faster, but it can get quite large
-		if tempMem and not db:
-			cursor.execute("PRAGMA temp_store = MEMORY")
+		if not db:
+			if tempMem:
+				cursor.execute("PRAGMA temp_store = MEMORY")
+			elif profile['temp_store']:
+				cursor.execute("PRAGMA temp_store = %s" % (profile['temp_store'],))
+			cursor.execute("PRAGMA threads = %d" % (profile['threads'],))
 		
 		# we want EXCLUSIVE while updating since the data shouldn't be read
 		# until ready and we want the performance gain; for normal read usage,
@@ -949,18 +1509,24 @@ class Database(object):
 	#attachTempDatabase()
 	
 	
-	def attachDatabaseFile(self, dbFile, quiet=False):
+	def attachDatabaseFile(self, dbFile, quiet=False, readOnly=None):
 		"""
 		Attaches a new database file and configures it.
 
 		Args:
 			dbFile (str): The path to the database file to attach.
 			quiet (bool, optional): If True, suppresses log messages. Defaults to False.
+			readOnly (bool, optional): If True, opens the existing file read-only, and only checks its schema
+				rather than updating or repairing it. Defaults to None, for the storage profile's choice.
 
 		The function detaches any currently attached database file, then attaches the new one and configures it.
 		It also establishes or audits the database schema.
 		"""
 		cursor = self._db.cursor()
+		self.closeConnectionPool()
+		profile = self._storageProfiles[self._storageProfile]
+		if readOnly == None:
+			readOnly = profile['readOnly']
 		
 		# detach the current db file, if any
 		if self._dbFile and not quiet:
@@ -976,20 +1542,35 @@ class Database(object):
 		# reset db info
 		self._dbFile = None
 		self._dbNew = None
+		self._dbReadOnly = False
+		self._biopolymerIDIndex = None
+		self._groupMembershipCache.clear()
 		
 		# attach the new db file, if any
 		if dbFile:
 			if not quiet:
 				self.logPush("loading knowledge database file '%s' ..." % dbFile)
-			cursor.execute("ATTACH DATABASE ? AS `db`", (dbFile,))
+			if readOnly:
+				# an immutable file is also never locked or checked for changes by other processes
+				cursor.execute("ATTACH DATABASE ? AS `db`", ("file:%s?mode=ro%s" % (urllib.parse.quote(os.path.abspath(dbFile)),("&immutable=1" if profile['immutable'] else "")),))
+			else:
+				cursor.execute("ATTACH DATABASE ? AS `db`", (dbFile,))
 			self._dbFile = dbFile
 			self._dbNew = (0 == max(row[0] for row in cursor.execute("SELECT COUNT(1) FROM `db`.`sqlite_master`")))
+			self._dbReadOnly = readOnly
 			self.configureDatabase('db')
 			
 			# establish or audit database schema
 			err_msg = ""
 			with self._db:
-				if self._dbNew:
+				if readOnly:
+					ok = (not self._dbNew) and (self.getDatabaseSetting('schema',int) == int(dict(self._schema['db']['setting']['data'])['schema']))
+					if not ok:
+						err_msg = "Database must be created or updated before it can be opened read-only"
+					elif not self.auditDatabaseObjects(None, 'db', doRepair=False):
+						ok = False
+						err_msg = "Audit of database failed"
+				elif self._dbNew:
 					self.createDatabaseObjects(None, 'db')
 					ok = True
 				else:
@@ -1009,6 +1590,7 @@ class Database(object):
 			else:
 				self._dbFile = None
 				self._dbNew = None
+				self._dbReadOnly = False
 				cursor.execute("DETACH DATABASE `db`")
 				if not quiet:
 					self.logPop("... ERROR (" + err_msg + ")\n")
@@ -1087,10 +1669,20 @@ class Database(object):
 						pass
 			if doIndecies:
 				for idxName in (idxList or schema[tblName]['index'].keys()):
+					if idxName in schema[tblName].get('rtree', {}) or idxName in schema[tblName].get('fts', {}):
+						continue
 					if idxName not in schema[tblName]['index']:
 						raise Exception("ERROR: no definition for index '%s' on table '%s'" % (idxName,tblName))
 					cursor.execute("CREATE INDEX IF NOT EXISTS `%s`.`%s` ON `%s` %s" % (dbName, idxName, tblName, schema[tblName]['index'][idxName]))
 				#foreach idxName in idxList
+				for rtreeName,rtree in schema[tblName].get('rtree', {}).items():
+					if (idxList and rtreeName not in idxList) or not self.hasRTreeSupport():
+						continue
+					dbMaster = "`sqlite_temp_master`" if (dbName == "temp") else ("`%s`.`sqlite_master`" % (dbName,))
+					if not any(cursor.execute("SELECT 1 FROM %s WHERE type = 'table' AND name = ?" % (dbMaster,), (rtreeName,))):
+						cursor.execute("CREATE VIRTUAL TABLE `%s`.`%s` USING rtree_i32%s" % (dbName, rtreeName, rtree['table']))
+						cursor.execute("INSERT INTO `%s`.`%s` SELECT NULL, * FROM (%s)" % (dbName, rtreeName, rtree['data'].format(db=dbName)))
+				#foreach rtreeName
 				cursor.execute("ANALYZE `%s`.`%s`" % (dbName,tblName))
 		#foreach tblName in tblList
 		
@@ -1133,6 +1725,41 @@ class Database(object):
 	#createDatabaseIndices()
 	
 	
+	def createDatabaseSearchIndices(self, schema, dbName, tblList=None):
+		"""
+		Creates and populates the text search indices in the database based on the provided schema.
+
+		Args:
+			schema (dict): The schema definition for the database objects.
+			dbName (str): The name of the database to create the indices in.
+			tblList (list, optional): List of tables whose indices to create. Defaults to None, which creates all of them.
+
+		Returns:
+			bool: True if the indices are available, False if sqlite lacks the FTS5 module.
+
+		Unlike ordinary indices these are not rebuilt as each table is updated, since they span several
+		tables; they are dropped along with the indices of any table they cover, and built again here
+		when the database is finalized or optimized.
+		"""
+		if not self.hasFTSSupport():
+			return False
+		cursor = self._db.cursor()
+		schema = schema or self._schema[dbName]
+		if tblList and isinstance(tblList, str):
+			tblList = (tblList,)
+		dbMaster = "`sqlite_temp_master`" if (dbName == "temp") else ("`%s`.`sqlite_master`" % (dbName,))
+		for tblName in (tblList or schema.keys()):
+			for ftsName,fts in schema[tblName].get('fts', {}).items():
+				if not any(cursor.execute("SELECT 1 FROM %s WHERE type = 'table' AND name = ?" % (dbMaster,), (ftsName,))):
+					cursor.execute("CREATE VIRTUAL TABLE `%s`.`%s` USING fts5%s" % (dbName, ftsName, fts['table']))
+					cursor.execute("INSERT INTO `%s`.`%s` %s" % (dbName, ftsName, fts['data'].format(db=dbName)))
+					cursor.execute("INSERT INTO `%s`.`%s` (`%s`) VALUES ('optimize')" % (dbName, ftsName, ftsName))
+			#foreach ftsName
+		#foreach tblName in tblList
+		return True
+	#createDatabaseSearchIndices()
+	
+	
 	def dropDatabaseObjects(self, schema, dbName, tblList=None, doTables=True, idxList=None, doIndecies=True):
 		"""
 		Drops tables and indices in the database based on the provided schema.
@@ -1154,6 +1781,15 @@ class Database(object):
 		if idxList and isinstance(idxList, str):
 			idxList = (idxList,)
 		for tblName in (tblList or schema.keys()):
+			if doTables or doIndecies:
+				for rtreeName in schema[tblName].get('rtree', {}).keys():
+					if doTables or not idxList or rtreeName in idxList:
+						cursor.execute("DROP TABLE IF EXISTS `%s`.`%s`" % (dbName, rtreeName))
+				# text search indices span several tables, and go stale if any of them change
+				for ftsTable in schema.values():
+					for ftsName,fts in ftsTable.get('fts', {}).items():
+						if (tblName in fts['tables']) and (doTables or not idxList or ftsName in idxList):
+							cursor.execute("DROP TABLE IF EXISTS `%s`.`%s`" % (dbName, ftsName))
 			if doTables:
 				cursor.execute("DROP TABLE IF EXISTS `%s`.`%s`" % (dbName, tblName))
 			elif doIndecies:
@@ -1233,6 +1869,64 @@ class Database(object):
 			self.setDatabaseSetting('schema', 3)
 			self.log(" OK\n")
 		#schema<3
+		
+		if self.getDatabaseSetting('schema',int) < 4:
+			self.logPush("updating database schema to version 4 ...\n")
+			self.log("chain ...")
+			tblColumns = 'chain_id,old_ucschg,old_chr,old_start,old_end,new_ucschg,new_chr,new_start,new_end,score,is_fwd,source_id'
+			cursor.execute("ALTER TABLE `db`.`chain` RENAME TO `___old_chain___`")
+			self.createDatabaseTables(None, 'db', 'chain')
+			cursor.execute("INSERT INTO `db`.`chain` (%s) SELECT %s FROM `db`.`___old_chain___`" % (tblColumns,tblColumns))
+			cursor.execute("DROP TABLE `db`.`___old_chain___`")
+			self.createDatabaseIndices(None, 'db', 'chain')
+			self.log(" OK\n")
+			
+			# pack each chain's blocks into its row, then drop the block rows
+			self.log("chain_data ...")
+			sql = "SELECT chain_id, old_start, old_end, new_start FROM `db`.`chain_data` ORDER BY chain_id, old_start"
+			packed = (
+				(self.packChainData(seg[1:] for seg in segs), chainID)
+				for chainID,segs in itertools.groupby(cursor.execute(sql), key=lambda row: row[0])
+			)
+			self._db.cursor().executemany("UPDATE `db`.`chain` SET data = ? WHERE chain_id = ?", list(packed))
+			cursor.execute("DELETE FROM `db`.`chain_data`")
+			self.log(" OK\n")
+			self.setDatabaseSetting('schema', 4)
+			self.logPop("... OK\n")
+		#schema<4
+		
+		if self.getDatabaseSetting('schema',int) < 5:
+			self.logPush("updating database schema to version 5 ...\n")
+			self.log("biopolymer_region ...")
+			tblColumns = 'biopolymer_id,ldprofile_id,chr,posMin,posMax,source_id'
+			cursor.execute("ALTER TABLE `db`.`biopolymer_region` RENAME TO `___old_biopolymer_region___`")
+			self.createDatabaseTables(None, 'db', 'biopolymer_region')
+			cursor.execute("INSERT INTO `db`.`biopolymer_region` (%s,bin) SELECT %s,%s FROM `db`.`___old_biopolymer_region___`" % (tblColumns,tblColumns,self.getRegionBinSQL()))
+			cursor.execute("DROP TABLE `db`.`___old_biopolymer_region___`")
+			self.createDatabaseIndices(None, 'db', 'biopolymer_region')
+			self.log(" OK\n")
+			self.setDatabaseSetting('schema', 5)
+			self.logPop("... OK\n")
+		#schema<5
+		
+		if self.getDatabaseSetting('schema',int) < 6:
+			self.logPush("updating database schema to version 6 ...\n")
+			self.log("group_closure ...")
+			self.createDatabaseTables(None, 'db', 'group_closure')
+			cursor.execute("DELETE FROM `db`.`group_closure`")
+			cursor.executemany("INSERT INTO `db`.`group_closure` (ancestor_group_id,descendant_group_id,depth,relationships) VALUES (?,?,?,?)", self.generateGroupClosure())
+			self.createDatabaseIndices(None, 'db', 'group_closure')
+			self.log(" OK\n")
+			self.setDatabaseSetting('schema', 6)
+			self.logPop("... OK\n")
+		#schema<6
+		
+		if self.getDatabaseSetting('schema',int) < 7:
+			self.log("updating database schema to version 7 ...")
+			self.createDatabaseTables(None, 'db', 'group_overlap')
+			self.setDatabaseSetting('schema', 7)
+			self.log(" OK\n")
+		#schema<7
 	#updateDatabaseSchema()
 	
 	
@@ -1272,6 +1966,9 @@ class Database(object):
 		sql = None
 		for tblName in current:
 			tblEmpty[tblName] = True
+			if current[tblName]['table'] and current[tblName]['table'].startswith("CREATE VIRTUAL TABLE"):
+				# virtual tables may need a module this sqlite doesn't have, and are never in the audit anyway
+				continue
 			sql = "SELECT 1 FROM `%s`.`%s` LIMIT 1" % (dbName,tblName)
 			for row in cursor.execute(sql):
 				tblEmpty[tblName] = False
@@ -1360,6 +2057,8 @@ class Database(object):
 		self.dropDatabaseTables(None, 'db', ('snp_entrez_role','biopolymer_name_name','group_member_name'))
 		self.createDatabaseTables(None, 'db', ('snp_entrez_role','biopolymer_name_name','group_member_name'), True)
 		self.log(" OK\n")
+		self.log("building text search indices ...")
+		self.log(" OK\n" if self.createDatabaseSearchIndices(None, 'db') else " unavailable\n")
 		self.setDatabaseSetting('finalized', 1)
 		self.setDatabaseSetting('optimized', 0)
 	#finalizeDatabase()
@@ -1374,6 +2073,8 @@ class Database(object):
 		Returns:
 			None
 		"""
+		self.log("building text search indices ...")
+		self.log(" OK\n" if self.createDatabaseSearchIndices(None, 'db') else " unavailable\n")
 		self.log("updating optimizer statistics ...")
 		self._db.cursor().execute("ANALYZE `db`")
 		self.log(" OK\n")
@@ -1399,6 +2100,8 @@ class Database(object):
 			dbFile = self._dbFile
 			self.detachDatabaseFile(quiet=True)
 			db = apsw.Connection(dbFile)
+			# VACUUM also rewrites the file with the storage profile's page size
+			db.cursor().execute("PRAGMA page_size = %d" % (self._storageProfiles[self._storageProfile]['page_size'],))
 			db.cursor().execute("VACUUM")
 			db.close()
 			self.attachDatabaseFile(dbFile, quiet=True)
@@ -1495,7 +2198,7 @@ class Database(object):
 	#getSourceModuleOptions()
 	
 	
-	def updateDatabase(self, sources=None, sourceOptions=None, cacheOnly=False, forceUpdate=False):
+	def updateDatabase(self, sources=None, sourceOptions=None, cacheOnly=False, forceUpdate=False, liftOverBatch=False):
 		"""
 		Updates the database using the specified source modules and options.
 
@@ -1506,6 +2209,7 @@ class Database(object):
 			sourceOptions (dict, optional): A dictionary of options for the source modules. Defaults to None.
 			cacheOnly (bool, optional): If True, only updates the cache. Defaults to False.
 			forceUpdate (bool, optional): If True, forces the update even if not necessary. Defaults to False.
+			liftOverBatch (bool, optional): If True, lifts old genome build positions with the array batch engine. Defaults to False.
 
 		Returns:
 			Any: The result of the update operation.
@@ -1518,7 +2222,7 @@ class Database(object):
 		if not self._updater:
 			import loki.loki_updater as loki_updater
 			self._updater = loki_updater.Updater(self, self._is_test)
-		return self._updater.updateDatabase(sources, sourceOptions, cacheOnly, forceUpdate)
+		return self._updater.updateDatabase(sources, sourceOptions, cacheOnly, forceUpdate, liftOverBatch)
 	#updateDatabase()
 	
 	
@@ -1539,6 +2243,10 @@ class Database(object):
 		"""
 		if self.getDatabaseSetting('finalized',int):
 			raise Exception("ERROR: cannot update a finalized database")
+		if table in ('biopolymer','biopolymer_name','namespace'):
+			self._biopolymerIDIndex = None
+		if table == 'group_biopolymer':
+			self._groupMembershipCache.clear()
 		if self._updater:
 			return self._updater.prepareTableForUpdate(table)
 		return None
@@ -1908,79 +2616,238 @@ class Database(object):
 	#getSubtypeIDs()
 	
 	##################################################
-	# snp data retrieval
+	# region binning
 	
 	
-	def generateCurrentRSesByRSes(self, rses, tally=None):
+	@classmethod
+	def getRegionBin(cls, posMin, posMax):
 		"""
-		Generates current RS IDs by merging RS IDs from the database.
+		Calculates the bin of a region: the smallest bin in the UCSC-style hierarchy which contains it.
 
 		Args:
-			rses (list): A list of tuples, where each tuple contains (rsMerged, extra).
-			tally (dict, optional): A dictionary to store tally counts for 'merge' and 'match'. Defaults to None.
+			posMin (int): The first position of the region (1-based).
+			posMax (int): The last position of the region (1-based, inclusive).
 
-		Yields:
-			tuple: A tuple containing (rsMerged, extra, rsCurrent).
+		Returns:
+			int: The region's bin.
 		"""
-		# rses=[ (rsInput,extra), ... ]
-		# tally=dict()
-		# yield:[ (rsInput,extra,rsCurrent), ... ]
-		sql = """
-SELECT i.rsMerged, i.extra, COALESCE(sm.rsCurrent, i.rsMerged) AS rsCurrent
-FROM (SELECT ? AS rsMerged, ? AS extra) AS i
-LEFT JOIN `db`.`snp_merge` AS sm USING (rsMerged)
-"""
-		with self._db:
-			if tally != None:
-				numMerge = numMatch = 0
-				for row in self._db.cursor().executemany(sql, rses):
-					if row[2] != row[0]:
-						numMerge += 1
-					else:
-						numMatch += 1
-					yield row
-				tally['merge'] = numMerge
-				tally['match'] = numMatch
-			else:
-				for row in self._db.cursor().executemany(sql, rses):
-					yield row
-	#generateCurrentRSesByRSes()
+		start,end = min(posMin,posMax) - 1, max(posMin,posMax) - 1
+		if end >> cls._binLevels[-1][1]:
+			return cls._binLevels[-1][0]
+		for offset,shift in cls._binLevels[:-1]:
+			if (start >> shift) == (end >> shift):
+				return offset + (start >> shift)
+		return cls._binLevels[-1][0]
+	#getRegionBin()
 	
 	
-	def generateSNPLociByRSes(self, rses, minMatch=1, maxMatch=1, validated=None, tally=None, errorCallback=None):
+	@classmethod
+	def getRegionBinSQL(cls, posMin='posMin', posMax='posMax'):
 		"""
-		Generates SNP loci by RS IDs from the database.
+		Builds an SQL expression which calculates the bin of a region, equivalent to getRegionBin().
 
 		Args:
-			rses (list): A list of tuples, where each tuple contains (rs, extra).
-			minMatch (int, optional): Minimum number of matches required. Defaults to 1.
-			maxMatch (int, optional): Maximum number of matches allowed. Defaults to 1.
-			validated (bool, optional): Flag to filter validated SNP loci. Defaults to None.
-			tally (dict, optional): A dictionary to store tally counts for 'zero', 'one', and 'many'. Defaults to None.
-			errorCallback (callable, optional): A callable function for error handling. Defaults to None.
+			posMin (str, optional): SQL expression for the first position of the region. Defaults to 'posMin'.
+			posMax (str, optional): SQL expression for the last position of the region. Defaults to 'posMax'.
 
-		Yields:
-			tuple: A tuple containing (rs, extra, chr, pos) for each SNP locus.
+		Returns:
+			str: The SQL expression.
 		"""
-		# rses=[ (rs,extra), ... ]
-		# tally=dict()
-		# yield:[ (rs,extra,chr,pos), ... ]
-		sql = """
-SELECT i.rs, i.extra, sl.chr, sl.pos
-FROM (SELECT ? AS rs, ? AS extra) AS i
-LEFT JOIN `db`.`snp_locus` AS sl
-  ON sl.rs = i.rs
-ORDER BY sl.chr, sl.pos
-"""
-		if validated != None:
-			sql += "  AND sl.validated = %d" % (1 if validated else 0)
-		
-		minMatch = int(minMatch) if (minMatch != None) else 0
-		maxMatch = int(maxMatch) if (maxMatch != None) else None
-		tag = matches = None
-		n = numZero = numOne = numMany = 0
+		start = "(MIN(%s,%s) - 1)" % (posMin,posMax)
+		end = "(MAX(%s,%s) - 1)" % (posMin,posMax)
+		sql = "(CASE WHEN (%s >> %d) THEN %d" % (end, cls._binLevels[-1][1], cls._binLevels[-1][0])
+		for offset,shift in cls._binLevels[:-1]:
+			sql += " WHEN (%s >> %d) = (%s >> %d) THEN %d + (%s >> %d)" % (start,shift,end,shift,offset,start,shift)
+		return sql + " ELSE %d END)" % (cls._binLevels[-1][0],)
+	#getRegionBinSQL()
+	
+	
+	@classmethod
+	def getRegionBinRanges(cls, posMin, posMax):
+		"""
+		Enumerates the bins which may contain regions overlapping a query range.
+
+		Args:
+			posMin (int): The first position of the range (1-based).
+			posMax (int): The last position of the range (1-based, inclusive).
+
+		Returns:
+			list: Tuples (firstBin, lastBin) of consecutive bins, one per level of the hierarchy.
+		"""
+		limit = (1 << cls._binLevels[-1][1]) - 1
+		start,end = max(min(posMin,posMax) - 1, 0), min(max(posMin,posMax) - 1, limit)
+		ret = [ (offset + (start >> shift), offset + (end >> shift)) for offset,shift in cls._binLevels[:-1] if start <= end ]
+		ret.append( (cls._binLevels[-1][0], cls._binLevels[-1][0]) )
+		return ret
+	#getRegionBinRanges()
+	
+	
+	##################################################
+	# bulk lookups
+	
+	
+	def _prepareLookupInput(self, rows):
+		"""
+		Chooses how to run a lookup, based on the number of inputs.
+
+		Up to _bulkLookupThreshold inputs are looked up one query execution at a time;
+		beyond that, they are staged in a temp table and looked up with one set-based join.
+
+		Args:
+			rows (iterable): The lookup inputs.
+
+		Returns:
+			tuple: (rows, bulk), where rows is an iterable of all the inputs and bulk is True
+			if they should be looked up with _generateBulkLookupRows().
+		"""
+		rows = iter(rows)
+		head = list(itertools.islice(rows, self._bulkLookupThreshold))
+		if len(head) < self._bulkLookupThreshold:
+			return (head, False)
+		return (itertools.chain(head, rows), True)
+	#_prepareLookupInput()
+	
+	
+	def _generateBulkLookupRows(self, columns, rows, sql):
+		"""
+		Runs a lookup query once over all of its inputs, staged in a temp table.
+
+		Args:
+			columns (tuple): Names of the input columns.
+			rows (iterable): The lookup inputs, streamed into the temp table.
+			sql (str): The lookup query, with '{input}' in place of the input table,
+				whose 'idx' column numbers the inputs in their original order.
+
+		Yields:
+			tuple: The rows of the lookup query.
+		"""
+		# tables can't be dropped while another statement is running (such as an enclosing
+		# lookup), so any that couldn't be dropped before are retried now
+		for table in list(self._bulkLookupTrash):
+			self._dropBulkLookupTable(table)
+		
+		table = "`temp`.`_lookup_input_%d`" % next(self._bulkLookupCounter)
+		cursor = self._db.cursor()
+		# input columns are left without type affinity, so values are returned just as they were bound;
+		# queries compare them as +i.column so that the other side's affinity applies as it would to a bound parameter
+		cursor.execute("CREATE TEMP TABLE %s (idx INTEGER PRIMARY KEY NOT NULL, %s)" % (table, ", ".join(columns)))
+		try:
+			cursor.executemany("INSERT INTO %s (%s) VALUES (%s)" % (table, ", ".join(columns), ",".join("?" * len(columns))), rows)
+			for row in cursor.execute(sql.format(input=table)):
+				yield row
+		finally:
+			cursor.close()
+			self._dropBulkLookupTable(table)
+	#_generateBulkLookupRows()
+	
+	
+	def _dropBulkLookupTable(self, table):
+		"""
+		Drops a bulk lookup input table, or saves it to be dropped later if another statement is running.
+
+		Args:
+			table (str): The qualified name of the table.
+		"""
+		try:
+			self._db.cursor().execute("DROP TABLE IF EXISTS %s" % (table,))
+			self._bulkLookupTrash.discard(table)
+		except apsw.LockedError:
+			self._bulkLookupTrash.add(table)
+	#_dropBulkLookupTable()
+	
+	
+	##################################################
+	# snp data retrieval
+	
+	
+	def generateCurrentRSesByRSes(self, rses, tally=None):
+		"""
+		Generates current RS IDs by merging RS IDs from the database.
+
+		Args:
+			rses (list): A list of tuples, where each tuple contains (rsMerged, extra).
+			tally (dict, optional): A dictionary to store tally counts for 'merge' and 'match'. Defaults to None.
+
+		Yields:
+			tuple: A tuple containing (rsMerged, extra, rsCurrent).
+		"""
+		# rses=[ (rsInput,extra), ... ]
+		# tally=dict()
+		# yield:[ (rsInput,extra,rsCurrent), ... ]
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn.generateCurrentRSesByRSes(rows, t), rses, tally, None, False)
+			return
+		
+		sql = """
+SELECT i.rsMerged, i.extra, COALESCE(sm.rsCurrent, i.rsMerged) AS rsCurrent
+FROM {input} AS i
+LEFT JOIN `db`.`snp_merge` AS sm USING (rsMerged)
+"""
+		rses,bulk = self._prepareLookupInput(rses)
+		with self._db:
+			if bulk:
+				rows = self._generateBulkLookupRows(('rsMerged','extra'), rses, sql + "ORDER BY i.idx")
+			else:
+				rows = self._db.cursor().executemany(sql.format(input="(SELECT ? AS rsMerged, ? AS extra)"), rses)
+			if tally != None:
+				numMerge = numMatch = 0
+				for row in rows:
+					if row[2] != row[0]:
+						numMerge += 1
+					else:
+						numMatch += 1
+					yield row
+				tally['merge'] = numMerge
+				tally['match'] = numMatch
+			else:
+				for row in rows:
+					yield row
+	#generateCurrentRSesByRSes()
+	
+	
+	def generateSNPLociByRSes(self, rses, minMatch=1, maxMatch=1, validated=None, tally=None, errorCallback=None):
+		"""
+		Generates SNP loci by RS IDs from the database.
+
+		Args:
+			rses (list): A list of tuples, where each tuple contains (rs, extra).
+			minMatch (int, optional): Minimum number of matches required. Defaults to 1.
+			maxMatch (int, optional): Maximum number of matches allowed. Defaults to 1.
+			validated (bool, optional): Flag to filter validated SNP loci. Defaults to None.
+			tally (dict, optional): A dictionary to store tally counts for 'zero', 'one', and 'many'. Defaults to None.
+			errorCallback (callable, optional): A callable function for error handling. Defaults to None.
+
+		Yields:
+			tuple: A tuple containing (rs, extra, chr, pos) for each SNP locus.
+		"""
+		# rses=[ (rs,extra), ... ]
+		# tally=dict()
+		# yield:[ (rs,extra,chr,pos), ... ]
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn.generateSNPLociByRSes(rows, minMatch, maxMatch, validated, t, e), rses, tally, errorCallback, True)
+			return
+		
+		sql = """
+SELECT i.rs, i.extra, sl.chr, sl.pos
+FROM {input} AS i
+LEFT JOIN `db`.`snp_locus` AS sl
+  ON sl.rs = i.rs
+"""
+		if validated != None:
+			sql += "  AND sl.validated = %d\n" % (1 if validated else 0)
+		
+		minMatch = int(minMatch) if (minMatch != None) else 0
+		maxMatch = int(maxMatch) if (maxMatch != None) else None
+		tag = matches = None
+		numZero = numOne = numMany = 0
+		n = self._lookupIndexOffset
+		rses,bulk = self._prepareLookupInput(rses)
 		with self._db:
-			for row in itertools.chain(self._db.cursor().executemany(sql, rses), [(None,None,None,None)]):
+			if bulk:
+				rows = self._generateBulkLookupRows(('rs','extra'), rses, sql + "ORDER BY i.idx, sl.chr, sl.pos")
+			else:
+				rows = self._db.cursor().executemany(sql.format(input="(SELECT ? AS rs, ? AS extra)") + "ORDER BY sl.chr, sl.pos", rses)
+			for row in itertools.chain(rows, [(None,None,None,None)]):
 				if tag != row[0:2]:
 					if tag:
 						if not matches:
@@ -2008,6 +2875,265 @@ ORDER BY sl.chr, sl.pos
 	#generateSNPLociByRSes()
 	
 	
+	def generateSNPsByRegions(self, regions, minMatch=1, maxMatch=None, validated=None, tally=None, errorCallback=None):
+		"""
+		Retrieve the SNPs located within each of the given regions.
+
+		The regions are read in batches; within each batch, overlapping or adjacent regions
+		on the same chromosome are coalesced into blocks, each block is fetched with one range
+		scan of the snp_locus position index, and the SNPs are then split back out to the
+		regions that contain them.
+
+		Parameters:
+		-----------
+		regions : iterable of tuples
+			Each tuple contains (label, chr, posMin, posMax, extra), in 1-based closed coordinates.
+		minMatch : int, optional
+			Minimum number of SNPs per region allowed (default is 1).
+		maxMatch : int or None, optional
+			Maximum number of SNPs per region allowed (default is None for no limit).
+		validated : bool or None, optional
+			Flag to filter validated SNP loci (default is None for all).
+		tally : dict, optional
+			Dictionary to store match counts (default is None).
+		errorCallback : callable, optional
+			Function to handle errors.
+
+		Yields:
+		-------
+		tuple
+			(label, chr, posMin, posMax, extra, rs, pos) for each SNP in each region, in input order.
+		"""
+		# regions=[ (label,chr,posMin,posMax,extra), ... ]
+		# yields (label,chr,posMin,posMax,extra,rs,pos)
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn.generateSNPsByRegions(rows, minMatch, maxMatch, validated, t, e), regions, tally, errorCallback, False)
+			return
+		
+		sql = "SELECT DISTINCT pos, rs FROM `db`.`snp_locus` WHERE chr = ?1 AND pos BETWEEN ?2 AND ?3"
+		if validated != None:
+			sql += " AND validated = %d" % (1 if validated else 0)
+		sql += " ORDER BY pos, rs"
+		
+		minMatch = int(minMatch) if (minMatch != None) else 0
+		maxMatch = int(maxMatch) if (maxMatch != None) else None
+		numZero = numOne = numMany = 0
+		n = self._lookupIndexOffset
+		regions = iter(regions)
+		with self._db:
+			cursor = self._db.cursor()
+			while True:
+				batch = list(itertools.islice(regions, self._overlapBatchSize))
+				if not batch:
+					break
+				
+				# group the batch by chromosome
+				chrRegions = collections.defaultdict(list)
+				for i,region in enumerate(batch):
+					if (region[1] != None) and (region[2] != None) and (region[3] != None):
+						chrRegions[region[1]].append( (min(region[2],region[3]), max(region[2],region[3]), i) )
+				
+				# scan each chromosome's coalesced blocks in order, so the SNP positions come back sorted
+				# and each region's SNPs are a slice found by bisection
+				matches = [None] * len(batch)
+				for chrom,chrList in chrRegions.items():
+					chrList.sort()
+					blocks = list()
+					for posMin,posMax,i in chrList:
+						if blocks and (posMin <= blocks[-1][1] + 1):
+							blocks[-1][1] = max(blocks[-1][1], posMax)
+						else:
+							blocks.append([posMin, posMax])
+					snps = list(cursor.executemany(sql, ((chrom,block[0],block[1]) for block in blocks)))
+					positions = [ snp[0] for snp in snps ]
+					for posMin,posMax,i in chrList:
+						matches[i] = snps[bisect.bisect_left(positions, posMin):bisect.bisect_right(positions, posMax)]
+				
+				for i,region in enumerate(batch):
+					n += 1
+					snps = matches[i] or ()
+					if not snps:
+						numZero += 1
+					elif len(snps) == 1:
+						numOne += 1
+					else:
+						numMany += 1
+					
+					if minMatch <= len(snps) <= (maxMatch if (maxMatch != None) else len(snps)):
+						for snp in (snps or [(None,None)]):
+							yield tuple(region) + (snp[1], snp[0])
+					elif errorCallback:
+						errorCallback("\t".join(str(r) if (r != None) else "" for r in region), "%s match%s at index %d" % ((len(snps) or "no"),("" if len(snps) == 1 else "es"),n))
+				#foreach input
+			#while input
+		if tally != None:
+			tally['zero'] = numZero
+			tally['one']  = numOne
+			tally['many'] = numMany
+	#generateSNPsByRegions()
+	
+	
+	##################################################
+	# snp locus file
+	
+	
+	def _getSNPLocusFileKey(self):
+		"""
+		Identify the currently loaded SNP loci, for matching against an exported SNP locus file.
+
+		Returns:
+			str: A key derived from the file format and every source's version and update time,
+			or None if no knowledge database is loaded.
+		"""
+		if not self._dbFile:
+			return None
+		md5 = hashlib.md5()
+		md5.update(repr((SNPLocusFile._magic, SNPLocusFile._columns, sys.byteorder)).encode())
+		for row in self._db.cursor().execute("SELECT source_id, source, version, updated FROM `db`.`source` ORDER BY source_id"):
+			md5.update(repr(row).encode())
+		return md5.hexdigest()
+	#_getSNPLocusFileKey()
+	
+	
+	def getSNPLocusFilePath(self):
+		"""
+		Determines the path of the exported SNP locus file.
+
+		Returns:
+			str: The path next to the knowledge database file, or None if no file database is loaded.
+		"""
+		if (not self._dbFile) or (self._dbFile == ':memory:'):
+			return None
+		return "%s.snps" % (self._dbFile,)
+	#getSNPLocusFilePath()
+	
+	
+	def saveSNPLocusFile(self):
+		"""
+		Exports all SNP loci to a memory-mappable columnar file next to the knowledge database file.
+
+		The rs, chr, pos and validated columns are written in rs order (then chr, pos), along with
+		an 'order' permutation which lists the same rows in chr/pos order (then rs). The columns are
+		first staged in temporary files, and the finished file is moved into place so readers only
+		ever see a complete one. The file is identified by the current sources' versions, so an
+		SNPLocusFile opened through openSNPLocusFile() is never stale.
+
+		Returns:
+			str: The path of the written file, or None if no file database is loaded.
+		"""
+		path = self.getSNPLocusFilePath()
+		key = self._getSNPLocusFileKey()
+		if (not path) or (not key):
+			return None
+		self.log("writing SNP locus file ...")
+		tmpPath = "%s.%d.tmp" % (path, os.getpid())
+		columns = collections.OrderedDict(SNPLocusFile._columns)
+		files = { col:open("%s.%s" % (tmpPath,col), 'w+b') for col in columns }
+		try:
+			with self._db:
+				cursor = self._db.cursor()
+				
+				# stage the columns in rs order, a chunk at a time
+				count = 0
+				sql = "SELECT rs, chr, pos, validated FROM `db`.`snp_locus` ORDER BY rs, chr, pos, validated"
+				rows = cursor.execute(sql)
+				while True:
+					chunk = list(itertools.islice(rows, 1000000))
+					if not chunk:
+						break
+					for n,col in enumerate(('rs','chr','pos','validated')):
+						array.array(columns[col], (row[n] for row in chunk)).tofile(files[col])
+					count += len(chunk)
+				for f in files.values():
+					f.flush()
+				
+				# locate each row of the chr/pos order in the rs order; identical rows are
+				# adjacent in both orders, so they just take consecutive places
+				maps = { col:mmap.mmap(files[col].fileno(), 0, access=mmap.ACCESS_READ) for col in ('rs','chr','pos','validated') if count }
+				view = { col:memoryview(mm).cast(columns[col]) for col,mm in maps.items() }
+				rsView,chrView,posView,validView = (view.get(col, ()) for col in ('rs','chr','pos','validated'))
+				order = array.array(columns['order'])
+				prev = None
+				i = 0
+				sql = "SELECT rs, chr, pos, validated FROM `db`.`snp_locus` ORDER BY chr, pos, rs, validated"
+				for row in cursor.execute(sql):
+					if row == prev:
+						i += 1
+					else:
+						i = bisect.bisect_left(rsView, row[0])
+						while (chrView[i] != row[1]) or (posView[i] != row[2]) or (validView[i] != row[3]):
+							i += 1
+						prev = row
+					order.append(i)
+					if len(order) >= 1000000:
+						order.tofile(files['order'])
+						del order[:]
+				order.tofile(files['order'])
+				for col in maps:
+					view[col].release()
+					maps[col].close()
+			#with db
+			
+			# assemble the header and the padded columns into the final file
+			layout = dict()
+			offset = 0
+			for col,fmt in columns.items():
+				layout[col] = (offset, fmt)
+				size = count * array.array(fmt).itemsize
+				offset += size + (-size % 8)
+			header = json.dumps({ 'key':key, 'count':count, 'layout':layout }).encode('utf-8')
+			header = SNPLocusFile._magic + len(header).to_bytes(8, 'little') + header
+			with open(tmpPath, 'wb') as out:
+				out.write(header + bytes(-len(header) % 8))
+				for col,f in files.items():
+					f.seek(0)
+					size = 0
+					for data in iter(lambda: f.read(1 << 24), b''):
+						out.write(data)
+						size += len(data)
+					out.write(bytes(-size % 8))
+			os.replace(tmpPath, path)
+		finally:
+			for col,f in files.items():
+				f.close()
+				os.remove("%s.%s" % (tmpPath,col))
+			if os.path.exists(tmpPath):
+				os.remove(tmpPath)
+		self.log(" OK: %d loci\n" % (count,))
+		return path
+	#saveSNPLocusFile()
+	
+	
+	def openSNPLocusFile(self):
+		"""
+		Opens the exported SNP locus file, if there is one for the currently loaded data.
+
+		Returns:
+			SNPLocusFile: The memory-mapped file, or None if it is missing or stale.
+		"""
+		path = self.getSNPLocusFilePath()
+		if (not path) or (not os.path.exists(path)):
+			return None
+		try:
+			return SNPLocusFile(path, self._getSNPLocusFileKey())
+		except (OSError, ValueError, KeyError):
+			return None
+	#openSNPLocusFile()
+	
+	
+	def clearSNPLocusFile(self):
+		"""
+		Removes the exported SNP locus file, if any.
+		"""
+		path = self.getSNPLocusFilePath()
+		if path and os.path.exists(path):
+			try:
+				os.remove(path)
+			except OSError:
+				pass
+	#clearSNPLocusFile()
+	
+	
 	##################################################
 	# biopolymer data retrieval
 	
@@ -2024,6 +3150,10 @@ ORDER BY sl.chr, sl.pos
 		"""
 		# ids=[ (id,extra), ... ]
 		# yield:[ (id,extra,type_id,label,description), ... ]
+		ids,bulk = self._prepareLookupInput(ids)
+		if bulk:
+			sql = "SELECT b.biopolymer_id, i.extra, b.type_id, b.label, b.description FROM {input} AS i JOIN `db`.`biopolymer` AS b ON b.biopolymer_id = i.id ORDER BY i.idx"
+			return self._generateBulkLookupRows(('id','extra'), ids, sql)
 		sql = "SELECT biopolymer_id, ?2 AS extra, type_id, label, description FROM `db`.`biopolymer` WHERE biopolymer_id = ?1"
 		return self._db.cursor().executemany(sql, ids)
 	#generateBiopolymersByIDs()
@@ -2052,24 +3182,27 @@ ORDER BY sl.chr, sl.pos
 		# tally=dict() or None
 		# errorCallback=callable(position,input,error)
 		# yields (namespace,name,extra,id)
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn._lookupBiopolymerIDs(typeID, rows, minMatch, maxMatch, t, e), identifiers, tally, errorCallback, True)
+			return
 		
 		sql = """
 SELECT i.namespace, i.identifier, i.extra, COALESCE(bID.biopolymer_id,bLabel.biopolymer_id,bName.biopolymer_id) AS biopolymer_id
-FROM (SELECT ?1 AS namespace, ?2 AS identifier, ?3 AS extra) AS i
+FROM {{input}} AS i
 LEFT JOIN `db`.`biopolymer` AS bID
   ON i.namespace = '='
   AND bID.biopolymer_id = 1*i.identifier
   AND ( ({0} IS NULL) OR (bID.type_id = {0}) )
 LEFT JOIN `db`.`biopolymer` AS bLabel
   ON i.namespace = '-'
-  AND bLabel.label = i.identifier
+  AND bLabel.label = +i.identifier
   AND ( ({0} IS NULL) OR (bLabel.type_id = {0}) )
 LEFT JOIN `db`.`namespace` AS n
   ON i.namespace NOT IN ('=','-')
   AND n.namespace = COALESCE(NULLIF(NULLIF(LOWER(TRIM(i.namespace)),''),'*'),n.namespace)
 LEFT JOIN `db`.`biopolymer_name` AS bn
   ON i.namespace NOT IN ('=','-')
-  AND bn.name = i.identifier
+  AND bn.name = +i.identifier
   AND bn.namespace_id = n.namespace_id
 LEFT JOIN `db`.`biopolymer` AS bName
   ON i.namespace NOT IN ('=','-')
@@ -2080,9 +3213,17 @@ LEFT JOIN `db`.`biopolymer` AS bName
 		minMatch = int(minMatch) if (minMatch != None) else 0
 		maxMatch = int(maxMatch) if (maxMatch != None) else None
 		tag = matches = None
-		n = numZero = numOne = numMany = 0
+		numZero = numOne = numMany = 0
+		n = self._lookupIndexOffset
+		identifiers,bulk = self._prepareLookupInput(identifiers)
 		with self._db:
-			for row in itertools.chain(self._db.cursor().executemany(sql, identifiers), [(None,None,None,None)]):
+			if self._biopolymerIDCached:
+				rows = self._generateIndexedBiopolymerIDRows(typeID, identifiers)
+			elif bulk:
+				rows = self._generateBulkLookupRows(('namespace','identifier','extra'), identifiers, sql + "ORDER BY i.idx")
+			else:
+				rows = self._db.cursor().executemany(sql.format(input="(SELECT ?1 AS namespace, ?2 AS identifier, ?3 AS extra)"), identifiers)
+			for row in itertools.chain(rows, [(None,None,None,None)]):
 				if tag != row[0:3]:
 					if tag:
 						if not matches:
@@ -2110,6 +3251,111 @@ LEFT JOIN `db`.`biopolymer` AS bName
 	#_lookupBiopolymerIDs()
 	
 	
+	def _getBiopolymerIDIndex(self):
+		"""
+		Loads (or returns the already loaded) in-memory index of biopolymer IDs by name and label.
+
+		Names and labels are interned strings, each mapped to a slot (start << 32 | count) in
+		flat arrays of IDs (and namespace IDs, for names), which are sorted by name or label.
+
+		Returns:
+			dict: The index, with keys 'namespaces' { namespace:namespace_id }, 'types' (an array
+			of type_id by biopolymer_id, 0 for none), 'labels' { label:slot }, 'labelIDs',
+			'names' { name:slot }, 'nameNamespaceIDs' and 'nameIDs'.
+		"""
+		if self._biopolymerIDIndex != None:
+			return self._biopolymerIDIndex
+		
+		def slots(rows, columns):
+			# rows=[ (key,value,...), ... ] in key order
+			keys = dict()
+			lastKey = start = None
+			for n,row in enumerate(rows):
+				if row[0] != lastKey:
+					if lastKey != None:
+						keys[sys.intern(lastKey)] = (start << 32) | (n - start)
+					lastKey,start = row[0],n
+				for column,value in zip(columns, row[1:]):
+					column.append(value)
+			if lastKey != None:
+				keys[sys.intern(lastKey)] = (start << 32) | (len(columns[0]) - start)
+			return keys
+		#slots()
+		
+		self.log("loading biopolymer identifiers ...")
+		cursor = self._db.cursor()
+		index = dict()
+		with self._db:
+			index['namespaces'] = { row[0]:row[1] for row in cursor.execute("SELECT namespace, namespace_id FROM `db`.`namespace`") }
+			types = index['types'] = array.array('H')
+			for biopolymerID,typeID in cursor.execute("SELECT biopolymer_id, type_id FROM `db`.`biopolymer` ORDER BY biopolymer_id"):
+				if biopolymerID >= len(types):
+					types.extend(itertools.repeat(0, biopolymerID + 1 - len(types)))
+				types[biopolymerID] = typeID
+			index['labelIDs'] = array.array('q')
+			index['labels'] = slots(cursor.execute("SELECT label, biopolymer_id FROM `db`.`biopolymer` ORDER BY label, biopolymer_id"), (index['labelIDs'],))
+			index['nameNamespaceIDs'] = array.array('q')
+			index['nameIDs'] = array.array('q')
+			index['names'] = slots(cursor.execute("SELECT name, namespace_id, biopolymer_id FROM `db`.`biopolymer_name` ORDER BY name, namespace_id, biopolymer_id"), (index['nameNamespaceIDs'],index['nameIDs']))
+		self.log(" OK: %d labels, %d names\n" % (len(index['labels']), len(index['names'])))
+		self._biopolymerIDIndex = index
+		return index
+	#_getBiopolymerIDIndex()
+	
+	
+	def _generateIndexedBiopolymerIDRows(self, typeID, identifiers):
+		"""
+		Resolves biopolymer identifiers from the in-memory index, yielding the same rows as the lookup query in _lookupBiopolymerIDs().
+
+		Args:
+			typeID (int or Falseish): Type ID of the biopolymer, or Falseish for any type.
+			identifiers (iterable): Tuples (namespace, name, extra).
+
+		Yields:
+			tuple: (namespace, name, extra, biopolymer_id) for each match, or with biopolymer_id None for an input with no matches.
+		"""
+		index = self._getBiopolymerIDIndex()
+		namespaces,types = index['namespaces'], index['types']
+		labels,labelIDs = index['labels'], index['labelIDs']
+		names,nameNamespaceIDs,nameIDs = index['names'], index['nameNamespaceIDs'], index['nameIDs']
+		typeID = int(typeID) if typeID else None
+		cursor = self._db.cursor()
+		
+		for namespace,identifier,extra in identifiers:
+			ids = ()
+			if (namespace == None) or (identifier == None):
+				pass
+			elif namespace == '=':
+				# use sqlite's own text-to-number conversion, as the query does
+				value = next(cursor.execute("SELECT 1*?", (identifier,)))[0]
+				if isinstance(value, float) and value.is_integer():
+					value = int(value)
+				if isinstance(value, int) and (0 < value < len(types)) and types[value]:
+					ids = (value,)
+			else:
+				name = identifier if isinstance(identifier, str) else str(identifier)
+				if namespace == '-':
+					slot = labels.get(name)
+					if slot != None:
+						ids = set(labelIDs[(slot >> 32):(slot >> 32) + (slot & 0xffffffff)])
+				else:
+					slot = names.get(name)
+					if slot != None:
+						ns = str(namespace).strip(' ').translate(self._asciiLower)
+						namespaceID = None if (ns in ('','*')) else namespaces.get(ns, -1)
+						ids = set(nameIDs[n] for n in range((slot >> 32), (slot >> 32) + (slot & 0xffffffff)) if (namespaceID == None) or (nameNamespaceIDs[n] == namespaceID))
+			#if namespace
+			if typeID != None:
+				ids = [ i for i in ids if types[i] == typeID ]
+			if ids:
+				for i in ids:
+					yield (namespace, identifier, extra, i)
+			else:
+				yield (namespace, identifier, extra, None)
+		#foreach identifier
+	#_generateIndexedBiopolymerIDRows()
+	
+	
 	def generateBiopolymerIDsByIdentifiers(self, identifiers, minMatch=1, maxMatch=1, tally=None, errorCallback=None):
 		"""
 		Retrieve biopolymer IDs based on identifiers such as namespace and name.
@@ -2164,7 +3410,32 @@ LEFT JOIN `db`.`biopolymer` AS bName
 	#generateTypedBiopolymerIDsByIdentifiers()
 	
 	
-	def _searchBiopolymerIDs(self, typeID, texts):
+	def _generateSearchRows(self, sql, sqlIndex, texts):
+		"""
+		Runs a text search for each input, using the text search index where it can narrow the search.
+
+		Parameters:
+		-----------
+		sql : str
+			Search query which scans the searched tables.
+		sqlIndex : str
+			Equivalent search query which uses the text search index.
+		texts : list of tuples
+			Each tuple contains (text, extra).
+
+		Yields:
+		-------
+		Result rows from either query, for each input in order.
+		"""
+		cursor = self._db.cursor()
+		for text,extra in texts:
+			useIndex = isinstance(text, str) and max(len(part) for part in text.replace('_','%').split('%')) >= 3
+			for row in cursor.execute(sqlIndex if useIndex else sql, (text,extra)):
+				yield row
+	#_generateSearchRows()
+	
+	
+	def _searchBiopolymerIDs(self, typeID, texts, rank=False, limit=None):
 		"""
 		Helper method to perform text-based search for biopolymer IDs.
 
@@ -2174,6 +3445,11 @@ LEFT JOIN `db`.`biopolymer` AS bName
 			Specific type ID for filtering.
 		texts : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance: whole-label matches first, then
+			label, name and description matches, each by label; otherwise matches are in ID order.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Yields:
 		-------
@@ -2182,6 +3458,33 @@ LEFT JOIN `db`.`biopolymer` AS bName
 		# texts=[ (text,extra), ... ]
 		# yields (extra,label,id)
 		
+		# the trigram index answers the same LIKE patterns as the fallback scan, since sqlite
+		# still checks each candidate it returns against the pattern; it only narrows the search
+		# for texts with at least one trigram outside of any wildcards, so others still use the scan
+		sqlIndex = None
+		if self.hasDatabaseSearchIndex('biopolymer_search'):
+			sqlIndex = """
+SELECT ?2 AS extra, b.label, b.biopolymer_id
+FROM (
+  SELECT biopolymer_id, MIN(CASE WHEN field = 0 AND text LIKE ?1 THEN -1 ELSE field END) AS field
+  FROM `db`.`biopolymer_search`
+  WHERE text LIKE '%'||?1||'%'
+  GROUP BY biopolymer_id
+) AS s
+JOIN `db`.`biopolymer` AS b USING (biopolymer_id)
+"""
+			
+			if typeID:
+				sqlIndex += """
+WHERE b.type_id = %d
+""" % typeID
+			#if typeID
+			
+			sqlIndex += """
+ORDER BY %s
+""" % ("s.field, b.label, b.biopolymer_id" if rank else "b.biopolymer_id")
+		#if search index
+		
 		sql = """
 SELECT ?2 AS extra, b.label, b.biopolymer_id
 FROM `db`.`biopolymer` AS b
@@ -2202,13 +3505,26 @@ WHERE
 		
 		sql += """
 GROUP BY b.biopolymer_id
-"""
+ORDER BY %s
+""" % ("MIN(CASE WHEN b.label LIKE ?1 THEN -1 WHEN b.label LIKE '%'||?1||'%' THEN 0 WHEN bn.name LIKE '%'||?1||'%' THEN 1 ELSE 2 END), b.label, b.biopolymer_id" if rank else "b.biopolymer_id")
+		
+		if limit != None:
+			sql += """
+LIMIT %d
+""" % limit
+			if sqlIndex:
+				sqlIndex += """
+LIMIT %d
+""" % limit
+		#if limit
 		
-		return self._db.cursor().executemany(sql, texts)
+		if not sqlIndex:
+			return self._db.cursor().executemany(sql, texts)
+		return self._generateSearchRows(sql, sqlIndex, texts)
 	#_searchBiopolymerIDs()
 	
 	
-	def generateBiopolymerIDsBySearch(self, searches):
+	def generateBiopolymerIDsBySearch(self, searches, rank=False, limit=None):
 		"""
 		Retrieve biopolymer IDs based on a text-based search.
 
@@ -2216,17 +3532,21 @@ GROUP BY b.biopolymer_id
 		-----------
 		searches : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance rather than by ID.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Returns:
 		--------
 		Generator object yielding biopolymer IDs based on the given search criteria.
 		"""
 		# searches=[ (text,extra), ... ]
-		return self._searchBiopolymerIDs(None, searches)
+		return self._searchBiopolymerIDs(None, searches, rank, limit)
 	#generateBiopolymerIDsBySearch()
 	
 	
-	def generateTypedBiopolymerIDsBySearch(self, typeID, searches):
+	def generateTypedBiopolymerIDsBySearch(self, typeID, searches, rank=False, limit=None):
 		"""
 		Retrieve biopolymer IDs based on a text-based search with a specific type.
 
@@ -2236,13 +3556,17 @@ GROUP BY b.biopolymer_id
 			Specific type ID for filtering.
 		searches : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance rather than by ID.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Returns:
 		--------
 		Generator object yielding biopolymer IDs based on the given search criteria and type ID.
 		"""
 		# searches=[ (text,extra), ... ]
-		return self._searchBiopolymerIDs(typeID, searches)
+		return self._searchBiopolymerIDs(typeID, searches, rank, limit)
 	#generateTypedBiopolymerIDsBySearch()
 	
 	
@@ -2299,28 +3623,196 @@ GROUP BY namespace_id
 	#generateBiopolymerNameStats()
 	
 	
-	##################################################
-	# group data retrieval
-	
-	
-	def generateGroupsByIDs(self, ids):
+	def _sweepBiopolymerOverlaps(self, regions, bounds):
 		"""
-		Retrieve groups based on provided group IDs.
+		Finds the biopolymer regions overlapping each of a batch of input regions on one chromosome.
+
+		Args:
+			regions (list): Tuples (posMin, posMax, n) sorted by posMin, where n is the input's position in its batch.
+			bounds (list): Tuples (posMin, posMax, biopolymer_id) sorted by posMin.
+
+		Yields:
+			tuple: (n, set of overlapping biopolymer_ids) for each input region.
+		"""
+		# inputs are visited in start order, so biopolymer regions which end before the
+		# current input's start can't overlap any later input either
+		active = list()
+		j = 0
+		for posMin,posMax,n in regions:
+			while (j < len(bounds)) and (bounds[j][0] <= posMin):
+				active.append(bounds[j])
+				j += 1
+			active = [ b for b in active if b[1] >= posMin ]
+			matches = set(b[2] for b in active)
+			k = j
+			while (k < len(bounds)) and (bounds[k][0] <= posMax):
+				matches.add(bounds[k][2])
+				k += 1
+			yield (n, matches)
+	#_sweepBiopolymerOverlaps()
+	
+	
+	def generateBiopolymersByRegions(self, regions, ldprofile='', typeID=None, minMatch=1, maxMatch=None, tally=None, errorCallback=None):
+		"""
+		Retrieve the biopolymers whose regions overlap each of the given regions.
+
+		Candidate regions for the given LD profile are taken from the biopolymer_region R*Tree if
+		there is one, or otherwise from the region bins covering the inputs, and then swept against
+		the inputs in batches which are sorted by position.
 
 		Parameters:
 		-----------
-		ids : list of tuples
-			Each tuple contains (group_id, extra).
+		regions : iterable of tuples
+			Each tuple contains (label, chr, posMin, posMax, extra), in 1-based closed coordinates.
+		ldprofile : str, optional
+			Name of the LD profile whose region boundaries to use (default is '', no LD adjustment).
+		typeID : int or None, optional
+			Optional type ID filter.
+		minMatch : int, optional
+			Minimum number of matches allowed (default is 1).
+		maxMatch : int or None, optional
+			Maximum number of matches allowed (default is None for no limit).
+		tally : dict, optional
+			Dictionary to store match counts (default is None).
+		errorCallback : callable, optional
+			Function to handle errors.
 
 		Yields:
 		-------
-		Tuples containing group information:
-			(group_id, extra, type_id, subtype_id, label, description)
+		tuple
+			(label, chr, posMin, posMax, extra, biopolymer_id) for each overlap, in input order.
 		"""
-		# ids=[ (id,extra), ... ]
-		# yield:[ (id,extra,type_id,subtype_id,label,description), ... ]
-		sql = "SELECT group_id, ?2 AS extra, type_id, subtype_id, label, description FROM `db`.`group` WHERE group_id = ?1"
-		return self._db.cursor().executemany(sql, ids)
+		# regions=[ (label,chr,posMin,posMax,extra), ... ]
+		# yields (label,chr,posMin,posMax,extra,biopolymer_id)
+		ldprofileID = self.getLDProfileID(ldprofile)
+		if ldprofileID == None:
+			raise Exception("ERROR: unknown LD profile '%s'" % (ldprofile,))
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn.generateBiopolymersByRegions(rows, ldprofile, typeID, minMatch, maxMatch, t, e), regions, tally, errorCallback, False)
+			return
+		
+		rtree = self.hasDatabaseRTree('biopolymer_region__rtree')
+		if rtree:
+			sql = "SELECT rt.posMin, rt.posMax, rt.biopolymer_id FROM `db`.`biopolymer_region__rtree` AS rt"
+			if typeID:
+				sql += " JOIN `db`.`biopolymer` AS b ON b.biopolymer_id = rt.biopolymer_id AND b.type_id = %d" % (int(typeID),)
+			sql += " WHERE rt.ldprofileMin = %d AND rt.chrMin = ?1 AND rt.posMin <= ?3 AND rt.posMax >= ?2" % (ldprofileID,)
+		else:
+			sql = "SELECT MIN(br.posMin,br.posMax), MAX(br.posMin,br.posMax), br.biopolymer_id FROM `db`.`biopolymer_region` AS br"
+			if typeID:
+				sql += " JOIN `db`.`biopolymer` AS b ON b.biopolymer_id = br.biopolymer_id AND b.type_id = %d" % (int(typeID),)
+			sql += " WHERE br.ldprofile_id = %d AND br.chr = ?1 AND br.bin BETWEEN ?2 AND ?3" % (ldprofileID,)
+		gap = 1 << self._binLevels[0][1]
+		
+		minMatch = int(minMatch) if (minMatch != None) else 0
+		maxMatch = int(maxMatch) if (maxMatch != None) else None
+		numZero = numOne = numMany = 0
+		n = self._lookupIndexOffset
+		regions = iter(regions)
+		with self._db:
+			cursor = self._db.cursor()
+			while True:
+				batch = list(itertools.islice(regions, self._overlapBatchSize))
+				if not batch:
+					break
+				
+				# group the batch by chromosome
+				chrRegions = collections.defaultdict(list)
+				for i,region in enumerate(batch):
+					if (region[1] != None) and (region[2] != None) and (region[3] != None):
+						chrRegions[region[1]].append( (min(region[2],region[3]), max(region[2],region[3]), i) )
+				
+				# fetch the candidates' boundaries over spans of nearby inputs (merging any within
+				# one smallest bin of each other), and sweep them against the sorted inputs
+				matches = [None] * len(batch)
+				for chrom,chrList in chrRegions.items():
+					chrList.sort()
+					spans = list()
+					for posMin,posMax,i in chrList:
+						if spans and (posMin <= spans[-1][1] + gap):
+							spans[-1][1] = max(spans[-1][1], posMax)
+						else:
+							spans.append([posMin, posMax])
+					if rtree:
+						args = ((chrom,span[0],span[1]) for span in spans)
+					else:
+						args = ((chrom,) + bins for span in spans for bins in self.getRegionBinRanges(span[0], span[1]))
+					bounds = sorted(set(cursor.executemany(sql, args)))
+					for i,ids in self._sweepBiopolymerOverlaps(chrList, bounds):
+						matches[i] = ids
+				
+				for i,region in enumerate(batch):
+					n += 1
+					ids = matches[i] or ()
+					if not ids:
+						numZero += 1
+					elif len(ids) == 1:
+						numOne += 1
+					else:
+						numMany += 1
+					
+					if minMatch <= len(ids) <= (maxMatch if (maxMatch != None) else len(ids)):
+						for bID in (sorted(ids) or [None]):
+							yield tuple(region) + (bID,)
+					elif errorCallback:
+						errorCallback("\t".join(str(r) if (r != None) else "" for r in region), "%s match%s at index %d" % ((len(ids) or "no"),("" if len(ids) == 1 else "es"),n))
+				#foreach input
+			#while input
+		if tally != None:
+			tally['zero'] = numZero
+			tally['one']  = numOne
+			tally['many'] = numMany
+	#generateBiopolymersByRegions()
+	
+	
+	def generateBiopolymersByPositions(self, positions, ldprofile='', typeID=None, minMatch=1, maxMatch=None, tally=None, errorCallback=None):
+		"""
+		Retrieve the biopolymers whose regions contain each of the given positions.
+
+		Parameters:
+		-----------
+		positions : iterable of tuples
+			Each tuple contains (label, chr, pos, extra), in 1-based coordinates.
+		ldprofile, typeID, minMatch, maxMatch, tally, errorCallback :
+			See generateBiopolymersByRegions().
+
+		Yields:
+		-------
+		tuple
+			(label, chr, pos, extra, biopolymer_id) for each overlap, in input order.
+		"""
+		# positions=[ (label,chr,pos,extra), ... ]
+		regions = ((p[0],p[1],p[2],p[2],p[3]) for p in positions)
+		return ((r[0],r[1],r[2],r[4],r[5]) for r in self.generateBiopolymersByRegions(regions, ldprofile, typeID, minMatch, maxMatch, tally, errorCallback))
+	#generateBiopolymersByPositions()
+	
+	
+	##################################################
+	# group data retrieval
+	
+	
+	def generateGroupsByIDs(self, ids):
+		"""
+		Retrieve groups based on provided group IDs.
+
+		Parameters:
+		-----------
+		ids : list of tuples
+			Each tuple contains (group_id, extra).
+
+		Yields:
+		-------
+		Tuples containing group information:
+			(group_id, extra, type_id, subtype_id, label, description)
+		"""
+		# ids=[ (id,extra), ... ]
+		# yield:[ (id,extra,type_id,subtype_id,label,description), ... ]
+		ids,bulk = self._prepareLookupInput(ids)
+		if bulk:
+			sql = "SELECT g.group_id, i.extra, g.type_id, g.subtype_id, g.label, g.description FROM {input} AS i JOIN `db`.`group` AS g ON g.group_id = i.id ORDER BY i.idx"
+			return self._generateBulkLookupRows(('id','extra'), ids, sql)
+		sql = "SELECT group_id, ?2 AS extra, type_id, subtype_id, label, description FROM `db`.`group` WHERE group_id = ?1"
+		return self._db.cursor().executemany(sql, ids)
 	#generateGroupsByIDs()
 	
 	
@@ -2355,24 +3847,27 @@ GROUP BY namespace_id
 		# tally=dict() or None
 		# errorCallback=callable(input,error)
 		# yields (namespace,name,extra,id)
+		if self._parallelLookupChunkSize and self._pool:
+			yield from self._generateParallelLookupRows(lambda conn,rows,t,e: conn._lookupGroupIDs(typeID, rows, minMatch, maxMatch, t, e), identifiers, tally, errorCallback, True)
+			return
 		
 		sql = """
 SELECT i.namespace, i.identifier, i.extra, COALESCE(gID.group_id,gLabel.group_id,gName.group_id) AS group_id
-FROM (SELECT ?1 AS namespace, ?2 AS identifier, ?3 AS extra) AS i
+FROM {{input}} AS i
 LEFT JOIN `db`.`group` AS gID
   ON i.namespace = '='
   AND gID.group_id = 1*i.identifier
   AND ( ({0} IS NULL) OR (gID.type_id = {0}) )
 LEFT JOIN `db`.`group` AS gLabel
   ON i.namespace = '-'
-  AND gLabel.label = i.identifier
+  AND gLabel.label = +i.identifier
   AND ( ({0} IS NULL) OR (gLabel.type_id = {0}) )
 LEFT JOIN `db`.`namespace` AS n
   ON i.namespace NOT IN ('=','-')
   AND n.namespace = COALESCE(NULLIF(NULLIF(LOWER(TRIM(i.namespace)),''),'*'),n.namespace)
 LEFT JOIN `db`.`group_name` AS gn
   ON i.namespace NOT IN ('=','-')
-  AND gn.name = i.identifier
+  AND gn.name = +i.identifier
   AND gn.namespace_id = n.namespace_id
 LEFT JOIN `db`.`group` AS gName
   ON i.namespace NOT IN ('=','-')
@@ -2383,9 +3878,15 @@ LEFT JOIN `db`.`group` AS gName
 		minMatch = int(minMatch) if (minMatch != None) else 0
 		maxMatch = int(maxMatch) if (maxMatch != None) else None
 		tag = matches = None
-		n = numZero = numOne = numMany = 0
+		numZero = numOne = numMany = 0
+		n = self._lookupIndexOffset
+		identifiers,bulk = self._prepareLookupInput(identifiers)
 		with self._db:
-			for row in itertools.chain(self._db.cursor().executemany(sql, identifiers), [(None,None,None,None)]):
+			if bulk:
+				rows = self._generateBulkLookupRows(('namespace','identifier','extra'), identifiers, sql + "ORDER BY i.idx")
+			else:
+				rows = self._db.cursor().executemany(sql.format(input="(SELECT ?1 AS namespace, ?2 AS identifier, ?3 AS extra)"), identifiers)
+			for row in itertools.chain(rows, [(None,None,None,None)]):
 				if tag != row[0:3]:
 					if tag:
 						if not matches:
@@ -2468,7 +3969,7 @@ LEFT JOIN `db`.`group` AS gName
 	#generateTypedGroupIDsByIdentifiers()
 	
 	
-	def _searchGroupIDs(self, typeID, texts):
+	def _searchGroupIDs(self, typeID, texts, rank=False, limit=None):
 		"""
 		Helper method to perform text-based search for group IDs.
 
@@ -2478,6 +3979,11 @@ LEFT JOIN `db`.`group` AS gName
 			Specific type ID for filtering.
 		texts : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance: whole-label matches first, then
+			label, name and description matches, each by label; otherwise matches are in ID order.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Yields:
 		-------
@@ -2486,6 +3992,33 @@ LEFT JOIN `db`.`group` AS gName
 		# texts=[ (text,extra), ... ]
 		# yields (extra,label,id)
 		
+		# the trigram index answers the same LIKE patterns as the fallback scan, since sqlite
+		# still checks each candidate it returns against the pattern; it only narrows the search
+		# for texts with at least one trigram outside of any wildcards, so others still use the scan
+		sqlIndex = None
+		if self.hasDatabaseSearchIndex('group_search'):
+			sqlIndex = """
+SELECT ?2 AS extra, g.label, g.group_id
+FROM (
+  SELECT group_id, MIN(CASE WHEN field = 0 AND text LIKE ?1 THEN -1 ELSE field END) AS field
+  FROM `db`.`group_search`
+  WHERE text LIKE '%'||?1||'%'
+  GROUP BY group_id
+) AS s
+JOIN `db`.`group` AS g USING (group_id)
+"""
+			
+			if typeID:
+				sqlIndex += """
+WHERE g.type_id = %d
+""" % typeID
+			#if typeID
+			
+			sqlIndex += """
+ORDER BY %s
+""" % ("s.field, g.label, g.group_id" if rank else "g.group_id")
+		#if search index
+		
 		sql = """
 SELECT ?2 AS extra, g.label, g.group_id
 FROM `db`.`group` AS g
@@ -2506,13 +4039,26 @@ WHERE
 		
 		sql += """
 GROUP BY g.group_id
-"""
+ORDER BY %s
+""" % ("MIN(CASE WHEN g.label LIKE ?1 THEN -1 WHEN g.label LIKE '%'||?1||'%' THEN 0 WHEN gn.name LIKE '%'||?1||'%' THEN 1 ELSE 2 END), g.label, g.group_id" if rank else "g.group_id")
+		
+		if limit != None:
+			sql += """
+LIMIT %d
+""" % limit
+			if sqlIndex:
+				sqlIndex += """
+LIMIT %d
+""" % limit
+		#if limit
 		
-		return self._db.cursor().executemany(sql, texts)
+		if not sqlIndex:
+			return self._db.cursor().executemany(sql, texts)
+		return self._generateSearchRows(sql, sqlIndex, texts)
 	#_searchGroupIDs()
 	
 	
-	def generateGroupIDsBySearch(self, searches):
+	def generateGroupIDsBySearch(self, searches, rank=False, limit=None):
 		"""
 		Retrieve group IDs based on a text-based search.
 
@@ -2520,6 +4066,10 @@ GROUP BY g.group_id
 		-----------
 		searches : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance rather than by ID.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Yields:
 		-------
@@ -2527,11 +4077,11 @@ GROUP BY g.group_id
 			(extra, label, group_id)
 		"""
 		# searches=[ (text,extra), ... ]
-		return self._searchGroupIDs(None, searches)
+		return self._searchGroupIDs(None, searches, rank, limit)
 	#generateGroupIDsBySearch()
 	
 	
-	def generateTypedGroupIDsBySearch(self, typeID, searches):
+	def generateTypedGroupIDsBySearch(self, typeID, searches, rank=False, limit=None):
 		"""
 		Retrieve group IDs based on a text-based search with a specific type.
 
@@ -2541,6 +4091,10 @@ GROUP BY g.group_id
 			Specific type ID for filtering.
 		searches : list of tuples
 			Each tuple contains (text, extra).
+		rank : bool, optional
+			Whether to order each text's matches by relevance rather than by ID.
+		limit : int or None, optional
+			Maximum number of matches to return for each text.
 
 		Yields:
 		-------
@@ -2548,7 +4102,7 @@ GROUP BY g.group_id
 			(extra, label, group_id)
 		"""
 		# searches=[ (text,extra), ... ]
-		return self._searchGroupIDs(typeID, searches)
+		return self._searchGroupIDs(typeID, searches, rank, limit)
 	#generateTypedGroupIDsBySearch()
 	
 	
@@ -2602,6 +4156,469 @@ GROUP BY namespace_id
 	#generateGroupNameStats()
 	
 	
+	##################################################
+	# group hierarchy
+	
+	
+	def generateGroupClosure(self):
+		"""
+		Computes the transitive closure of the group containment hierarchy from group_group.
+
+		Only relationships flagged as containment are followed, from each containing group to the
+		groups it contains; cycles in the source data are tolerated.
+
+		Yields:
+		-------
+		tuple
+			(ancestor_group_id, descendant_group_id, depth, relationships) for every group
+			(as its own ancestor at depth 0) and every pair of groups connected by a path of
+			containment relationships, where depth is the length of the shortest path and
+			relationships is the union of (1 << relationship_id) over every edge on every path.
+		"""
+		cursor = self._db.cursor()
+		children = collections.defaultdict(list)
+		for groupID,relatedID,relationshipID in cursor.execute("SELECT group_id, related_group_id, relationship_id FROM `db`.`group_group` WHERE contains > 0"):
+			children[groupID].append( (relatedID, 1 << min(max(relationshipID, 0), 62)) )
+		
+		for row in cursor.execute("SELECT group_id FROM `db`.`group`"):
+			yield (row[0], row[0], 0, 0)
+		
+		# walk down from each containing group; a descendant is revisited only if it is reached
+		# by a shorter path or through new relationships, so this terminates even on cycles
+		for ancestorID in sorted(children):
+			found = dict()
+			queue = collections.deque( (childID, 1, flag) for childID,flag in children[ancestorID] )
+			while queue:
+				groupID,depth,flags = queue.popleft()
+				if groupID == ancestorID:
+					continue
+				prev = found.get(groupID)
+				if prev:
+					if (depth >= prev[0]) and ((flags | prev[1]) == prev[1]):
+						continue
+					depth = min(depth, prev[0])
+					flags = flags | prev[1]
+				found[groupID] = (depth, flags)
+				for childID,flag in children.get(groupID, ()):
+					queue.append( (childID, depth + 1, flags | flag) )
+			#while queue
+			for groupID in sorted(found):
+				yield (ancestorID, groupID, found[groupID][0], found[groupID][1])
+		#foreach ancestorID
+	#generateGroupClosure()
+	
+	
+	def generateGroupAncestorsByIDs(self, ids, maxDepth=None, includeSelf=False):
+		"""
+		Retrieve the groups which contain each of the given groups, directly or transitively.
+
+		Parameters:
+		-----------
+		ids : list of tuples
+			Each tuple contains (group_id, extra).
+		maxDepth : int or None, optional
+			Maximum number of containment relationships between a group and its ancestors.
+		includeSelf : bool, optional
+			Whether to include each group as its own ancestor, at depth 0.
+
+		Yields:
+		-------
+		Tuples containing ancestor groups, nearest first:
+			(group_id, extra, ancestor_group_id, depth, relationships)
+		"""
+		# ids=[ (id,extra), ... ]
+		# yield:[ (id,extra,ancestor_id,depth,relationships), ... ]
+		where = "" if includeSelf else " AND c.depth > 0"
+		if maxDepth != None:
+			where += " AND c.depth <= %d" % maxDepth
+		ids,bulk = self._prepareLookupInput(ids)
+		if bulk:
+			sql = "SELECT c.descendant_group_id, i.extra, c.ancestor_group_id, c.depth, c.relationships FROM {input} AS i JOIN `db`.`group_closure` AS c ON c.descendant_group_id = i.id%s ORDER BY i.idx, c.depth, c.ancestor_group_id" % (where,)
+			return self._generateBulkLookupRows(('id','extra'), ids, sql)
+		sql = "SELECT c.descendant_group_id, ?2 AS extra, c.ancestor_group_id, c.depth, c.relationships FROM `db`.`group_closure` AS c WHERE c.descendant_group_id = ?1%s ORDER BY c.depth, c.ancestor_group_id" % (where,)
+		return self._db.cursor().executemany(sql, ids)
+	#generateGroupAncestorsByIDs()
+	
+	
+	def generateGroupDescendantsByIDs(self, ids, maxDepth=None, includeSelf=False):
+		"""
+		Retrieve the groups contained by each of the given groups, directly or transitively.
+
+		Parameters:
+		-----------
+		ids : list of tuples
+			Each tuple contains (group_id, extra).
+		maxDepth : int or None, optional
+			Maximum number of containment relationships between a group and its descendants.
+		includeSelf : bool, optional
+			Whether to include each group as its own descendant, at depth 0.
+
+		Yields:
+		-------
+		Tuples containing descendant groups, nearest first:
+			(group_id, extra, descendant_group_id, depth, relationships)
+		"""
+		# ids=[ (id,extra), ... ]
+		# yield:[ (id,extra,descendant_id,depth,relationships), ... ]
+		where = "" if includeSelf else " AND c.depth > 0"
+		if maxDepth != None:
+			where += " AND c.depth <= %d" % maxDepth
+		ids,bulk = self._prepareLookupInput(ids)
+		if bulk:
+			sql = "SELECT c.ancestor_group_id, i.extra, c.descendant_group_id, c.depth, c.relationships FROM {input} AS i JOIN `db`.`group_closure` AS c ON c.ancestor_group_id = i.id%s ORDER BY i.idx, c.depth, c.descendant_group_id" % (where,)
+			return self._generateBulkLookupRows(('id','extra'), ids, sql)
+		sql = "SELECT c.ancestor_group_id, ?2 AS extra, c.descendant_group_id, c.depth, c.relationships FROM `db`.`group_closure` AS c WHERE c.ancestor_group_id = ?1%s ORDER BY c.depth, c.descendant_group_id" % (where,)
+		return self._db.cursor().executemany(sql, ids)
+	#generateGroupDescendantsByIDs()
+	
+	
+	def generateBiopolymerIDsByGroupIDs(self, ids, maxDepth=None):
+		"""
+		Retrieve the biopolymers in each of the given groups or any of the groups they contain.
+
+		Parameters:
+		-----------
+		ids : list of tuples
+			Each tuple contains (group_id, extra).
+		maxDepth : int or None, optional
+			Maximum depth of the contained groups to include; 0 includes only direct members.
+
+		Yields:
+		-------
+		Tuples containing member biopolymers, in ID order:
+			(group_id, extra, biopolymer_id, depth)
+			where depth is that of the nearest group through which the biopolymer is a member.
+			Placeholders for unrecognized members (biopolymer_id 0) are left out.
+		"""
+		# ids=[ (id,extra), ... ]
+		# yield:[ (id,extra,biopolymer_id,depth), ... ]
+		where = "" if (maxDepth == None) else (" AND c.depth <= %d" % maxDepth)
+		ids,bulk = self._prepareLookupInput(ids)
+		if bulk:
+			sql = "SELECT c.ancestor_group_id, i.extra, gb.biopolymer_id, MIN(c.depth) FROM {input} AS i JOIN `db`.`group_closure` AS c ON c.ancestor_group_id = i.id%s JOIN `db`.`group_biopolymer` AS gb ON gb.group_id = c.descendant_group_id AND gb.biopolymer_id != 0 GROUP BY i.idx, gb.biopolymer_id ORDER BY i.idx, gb.biopolymer_id" % (where,)
+			return self._generateBulkLookupRows(('id','extra'), ids, sql)
+		sql = "SELECT c.ancestor_group_id, ?2 AS extra, gb.biopolymer_id, MIN(c.depth) FROM `db`.`group_closure` AS c JOIN `db`.`group_biopolymer` AS gb ON gb.group_id = c.descendant_group_id AND gb.biopolymer_id != 0 WHERE c.ancestor_group_id = ?1%s GROUP BY gb.biopolymer_id ORDER BY gb.biopolymer_id" % (where,)
+		return self._db.cursor().executemany(sql, ids)
+	#generateBiopolymerIDsByGroupIDs()
+	
+	
+	##################################################
+	# group membership sets
+	
+	
+	def _getGroupMembershipIndex(self, minSpecificity=0, minImplication=0, minQuality=0):
+		"""
+		Loads (or returns the already loaded) in-memory sets of each group's member biopolymers.
+
+		Members are numbered densely in biopolymer_id order, and each group's members are kept
+		in whichever of two containers is smaller, as in roaring bitmaps: a sorted array of member
+		numbers for small groups, or an int bitmap over all member numbers for large ones.
+
+		Parameters:
+		-----------
+		minSpecificity, minImplication, minQuality : int, optional
+			Minimum scores of the group_biopolymer associations to include.
+
+		Returns:
+		--------
+		dict
+			The index, with keys 'ids' (an array of biopolymer_id by member number), 'size' (the
+			number of members) and 'groups' { group_id:container }.
+		"""
+		key = (minSpecificity, minImplication, minQuality)
+		if key in self._groupMembershipCache:
+			return self._groupMembershipCache[key]
+		
+		cursor = self._db.cursor()
+		sql = "SELECT DISTINCT biopolymer_id FROM `db`.`group_biopolymer` WHERE biopolymer_id != 0 AND specificity >= ? AND implication >= ? AND quality >= ? ORDER BY biopolymer_id"
+		ids = array.array('q', (row[0] for row in cursor.execute(sql, key)))
+		number = { biopolymerID:n for n,biopolymerID in enumerate(ids) }
+		size = len(ids)
+		
+		# an array costs 4 bytes per member and a bitmap 1 bit per member number
+		groups = dict()
+		sql = "SELECT DISTINCT group_id, biopolymer_id FROM `db`.`group_biopolymer` WHERE biopolymer_id != 0 AND specificity >= ? AND implication >= ? AND quality >= ? ORDER BY group_id, biopolymer_id"
+		for groupID,rows in itertools.groupby(cursor.execute(sql, key), key=operator.itemgetter(0)):
+			members = array.array('I', (number[row[1]] for row in rows))
+			groups[groupID] = self._packMemberBitmap(members, size) if (len(members) * 32 > size) else members
+		
+		index = {'ids':ids, 'size':size, 'groups':groups}
+		self._groupMembershipCache[key] = index
+		return index
+	#_getGroupMembershipIndex()
+	
+	
+	@staticmethod
+	def _packMemberBitmap(members, size):
+		"""
+		Converts an array of member numbers into an int bitmap.
+		"""
+		bits = bytearray((size + 7) >> 3)
+		for n in members:
+			bits[n >> 3] |= 1 << (n & 7)
+		return int.from_bytes(bits, 'little')
+	#_packMemberBitmap()
+	
+	
+	@staticmethod
+	def _unpackMemberBitmap(bitmap):
+		"""
+		Converts an int bitmap into a sorted array of member numbers.
+		"""
+		members = array.array('I')
+		bits = bitmap.to_bytes((bitmap.bit_length() + 7) >> 3, 'little')
+		for b,byte in enumerate(bits):
+			while byte:
+				low = byte & -byte
+				members.append((b << 3) + low.bit_length() - 1)
+				byte ^= low
+		return members
+	#_unpackMemberBitmap()
+	
+	
+	def _combineGroupMembers(self, index, groupIDs, intersect):
+		"""
+		Computes the union or intersection of some groups' members.
+
+		Returns:
+		--------
+		array or int or set
+			The combined members, as a sorted array, an int bitmap or a set of member numbers.
+		"""
+		groups = index['groups']
+		containers = [ groups.get(groupID, ()) for groupID in groupIDs ]
+		if not containers:
+			return ()
+		
+		if intersect:
+			# filter the smallest group's members through the others, unless they're all bitmaps
+			containers.sort(key=lambda c: c.bit_count() if isinstance(c, int) else len(c))
+			if isinstance(containers[0], int):
+				bitmap = containers[0]
+				for c in containers[1:]:
+					bitmap &= c
+				return bitmap
+			members = set(containers[0])
+			for c in containers[1:]:
+				if not members:
+					break
+				if isinstance(c, int):
+					bits = c.to_bytes((index['size'] + 7) >> 3, 'little')
+					members = { n for n in members if bits[n >> 3] & (1 << (n & 7)) }
+				else:
+					members.intersection_update(c)
+			return members
+		
+		# small unions stay sparse; otherwise merge everything into a bitmap
+		if all(not isinstance(c, int) for c in containers) and (sum(len(c) for c in containers) * 32 <= index['size']):
+			members = set()
+			for c in containers:
+				members.update(c)
+			return members
+		bitmap = 0
+		for c in containers:
+			bitmap |= c if isinstance(c, int) else self._packMemberBitmap(c, index['size'])
+		return bitmap
+	#_combineGroupMembers()
+	
+	
+	def countGroupBiopolymers(self, groupIDs, intersect=False, minSpecificity=0, minImplication=0, minQuality=0):
+		"""
+		Counts the biopolymers which are members of any (or all) of the given groups.
+
+		Parameters:
+		-----------
+		groupIDs : list of int
+			The groups to combine.
+		intersect : bool, optional
+			Whether to count members of all the groups rather than any of them.
+		minSpecificity, minImplication, minQuality : int, optional
+			Minimum scores of the group_biopolymer associations to include.
+
+		Returns:
+		--------
+		int
+			The number of member biopolymers.
+		"""
+		members = self._combineGroupMembers(self._getGroupMembershipIndex(minSpecificity, minImplication, minQuality), groupIDs, intersect)
+		return members.bit_count() if isinstance(members, int) else len(members)
+	#countGroupBiopolymers()
+	
+	
+	def getGroupBiopolymerIDs(self, groupIDs, intersect=False, minSpecificity=0, minImplication=0, minQuality=0):
+		"""
+		Retrieves the biopolymers which are members of any (or all) of the given groups.
+
+		Parameters:
+		-----------
+		groupIDs : list of int
+			The groups to combine.
+		intersect : bool, optional
+			Whether to return members of all the groups rather than any of them.
+		minSpecificity, minImplication, minQuality : int, optional
+			Minimum scores of the group_biopolymer associations to include.
+
+		Returns:
+		--------
+		list
+			The member biopolymer IDs, in order.
+		"""
+		index = self._getGroupMembershipIndex(minSpecificity, minImplication, minQuality)
+		members = self._combineGroupMembers(index, groupIDs, intersect)
+		if isinstance(members, int):
+			members = self._unpackMemberBitmap(members)
+		ids = index['ids']
+		return [ ids[n] for n in sorted(members) ]
+	#getGroupBiopolymerIDs()
+	
+	
+	def generateGroupOverlapCounts(self, pairs, minSpecificity=0, minImplication=0, minQuality=0):
+		"""
+		Counts the members of pairs of groups, and the members they share.
+
+		Parameters:
+		-----------
+		pairs : iterable of tuples
+			Each tuple contains (group_id, group_id).
+		minSpecificity, minImplication, minQuality : int, optional
+			Minimum scores of the group_biopolymer associations to include.
+
+		Yields:
+		-------
+		Tuples for each pair, in order:
+			(group_id, group_id, count, count, shared)
+		"""
+		index = self._getGroupMembershipIndex(minSpecificity, minImplication, minQuality)
+		groups = index['groups']
+		counts = dict()
+		def count(groupID):
+			if groupID not in counts:
+				c = groups.get(groupID, ())
+				counts[groupID] = c.bit_count() if isinstance(c, int) else len(c)
+			return counts[groupID]
+		for groupID1,groupID2 in pairs:
+			shared = self._combineGroupMembers(index, (groupID1, groupID2), True)
+			yield (groupID1, groupID2, count(groupID1), count(groupID2), shared.bit_count() if isinstance(shared, int) else len(shared))
+	#generateGroupOverlapCounts()
+	
+	
+	def clearGroupMembershipCache(self):
+		"""
+		Discards the in-memory group membership sets, which are loaded again as needed.
+		"""
+		self._groupMembershipCache.clear()
+	#clearGroupMembershipCache()
+	
+	
+	def _getGroupOverlapCacheKey(self, minSpecificity, minImplication, minQuality):
+		"""
+		Identify the currently loaded group memberships, for matching against the cached group overlaps.
+
+		Returns:
+			str: A key derived from the membership thresholds and every source's version and update time.
+		"""
+		md5 = hashlib.md5()
+		md5.update(repr((minSpecificity, minImplication, minQuality)).encode())
+		for row in self._db.cursor().execute("SELECT source_id, source, version, updated FROM `db`.`source` ORDER BY source_id"):
+			md5.update(repr(row).encode())
+		return md5.hexdigest()
+	#_getGroupOverlapCacheKey()
+	
+	
+	def _generateGroupOverlapRows(self, groupIDs, minSpecificity, minImplication, minQuality):
+		"""
+		Computes the shared member counts of every pair of the given groups with any members in common.
+
+		This is the sparse product of the group-by-biopolymer incidence matrix with its transpose,
+		one row at a time: each group's members are looked up in an inverted index of the groups
+		containing each biopolymer, and the later groups found there are tallied.
+
+		Yields:
+		-------
+		tuple
+			(group_id, related_group_id, members, related_members, shared), in group_id order and
+			then related_group_id order, with group_id < related_group_id.
+		"""
+		index = self._getGroupMembershipIndex(minSpecificity, minImplication, minQuality)
+		groups = index['groups']
+		if groupIDs == None:
+			groupIDs = groups.keys()
+		groupIDs = sorted(set(groupID for groupID in groupIDs if groupID in groups))
+		
+		# unpack each group's members and invert them into each biopolymer's (sorted) groups
+		members = dict()
+		memberGroups = collections.defaultdict(lambda: array.array('q'))
+		for groupID in groupIDs:
+			c = groups[groupID]
+			members[groupID] = self._unpackMemberBitmap(c) if isinstance(c, int) else c
+			for n in members[groupID]:
+				memberGroups[n].append(groupID)
+		
+		for groupID in groupIDs:
+			tally = collections.Counter()
+			for n in members[groupID]:
+				related = memberGroups[n]
+				tally.update(related[bisect.bisect_right(related, groupID):])
+			for relatedID in sorted(tally):
+				yield (groupID, relatedID, len(members[groupID]), len(members[relatedID]), tally[relatedID])
+		#foreach groupID
+	#_generateGroupOverlapRows()
+	
+	
+	def generateGroupOverlaps(self, groupIDs=None, minShared=1, minJaccard=0.0, minSpecificity=0, minImplication=0, minQuality=0, cache=False):
+		"""
+		Computes the shared member counts and Jaccard scores of every pair of groups.
+
+		Parameters:
+		-----------
+		groupIDs : list of int or None, optional
+			The groups to compare with each other, or None for all groups with any members.
+		minShared : int, optional
+			Minimum number of shared members of the pairs to report.
+		minJaccard : float, optional
+			Minimum Jaccard score (shared members / all members of either group) of the pairs to report.
+		minSpecificity, minImplication, minQuality : int, optional
+			Minimum scores of the group_biopolymer associations to include.
+		cache : bool, optional
+			Whether to read the overlaps of all groups from the group_overlap table, first storing
+			them there if it does not hold them for the current sources and thresholds; ignored if
+			groupIDs is given, and if the database is read-only the overlaps are computed uncached.
+
+		Yields:
+		-------
+		Tuples for each pair of groups meeting the thresholds, in group_id order:
+			(group_id, related_group_id, members, related_members, shared, jaccard)
+			with group_id < related_group_id.
+		"""
+		minShared = max(minShared, 1)
+		rows = None
+		if cache and (groupIDs == None) and self._dbFile:
+			key = self._getGroupOverlapCacheKey(minSpecificity, minImplication, minQuality)
+			try:
+				if self.getDatabaseSetting('group_overlap_key') != key:
+					self.log("caching group overlaps ...")
+					with self._db:
+						cursor = self._db.cursor()
+						cursor.execute("DELETE FROM `db`.`group_overlap`")
+						cursor.executemany("INSERT INTO `db`.`group_overlap` (group_id,related_group_id,members,related_members,shared) VALUES (?,?,?,?,?)", self._generateGroupOverlapRows(None, minSpecificity, minImplication, minQuality))
+						self.setDatabaseSetting('group_overlap_key', key)
+					self.log(" OK\n")
+				sql = "SELECT group_id, related_group_id, members, related_members, shared FROM `db`.`group_overlap` WHERE shared >= %d ORDER BY group_id, related_group_id" % (minShared,)
+				rows = self._db.cursor().execute(sql)
+			except apsw.ReadOnlyError:
+				self.log(" read-only\n")
+		#if cache
+		if rows == None:
+			rows = self._generateGroupOverlapRows(groupIDs, minSpecificity, minImplication, minQuality)
+		
+		for groupID,relatedID,members,relatedMembers,shared in rows:
+			if shared >= minShared:
+				jaccard = float(shared) / (members + relatedMembers - shared)
+				if jaccard >= minJaccard:
+					yield (groupID, relatedID, members, relatedMembers, shared, jaccard)
+	#generateGroupOverlaps()
+	
+	
 	##################################################
 	# liftover
 	# 
@@ -2624,10 +4641,11 @@ GROUP BY namespace_id
 		Returns:
 		--------
 		int
-			Number of liftOver chains found between old and new genome assemblies.
+			Number of liftOver chains found between old and new genome assemblies; if there are
+			none, the number of chains in the opposite direction, from which they can be derived.
 		"""
 		sql = "SELECT COUNT() FROM `db`.`chain` WHERE old_ucschg = ? AND new_ucschg = ?"
-		return max(row[0] for row in self._db.cursor().execute(sql, (oldHG, newHG)))
+		return max(row[0] for row in self._db.cursor().execute(sql, (oldHG, newHG))) or max(row[0] for row in self._db.cursor().execute(sql, (newHG, oldHG)))
 	#hasLiftOverChains()
 	
 	
@@ -2650,117 +4668,877 @@ GROUP BY namespace_id
 
 		Yields:
 		-------
-		Tuples containing liftOver chain information for the given region.
-			(chain_id, old_chr, score, old_start, old_end, new_start, is_fwd, new_chr, old_start, old_end, new_start)
-		"""
-		conv = (oldHG,newHG)
-		if conv in self._liftOverCache:
-			chains = self._liftOverCache[conv]
-		else:
-			chains = {'data':{}, 'keys':{}}
-			sql = """
-SELECT chain_id,
-  c.old_chr, c.score, c.old_start, c.old_end, c.new_start, c.is_fwd, c.new_chr,
-  cd.old_start, cd.old_end, cd.new_start
-FROM `db`.`chain` AS c
-JOIN `db`.`chain_data` AS cd USING (chain_id)
-WHERE c.old_ucschg=? AND c.new_ucschg=?
-ORDER BY c.old_chr, score DESC, cd.old_start
-"""
-			for row in self._db.cursor().execute(sql, conv):
-				chain = (row[2], row[3], row[4], row[5], row[6], row[7], row[0])
-				chr = row[1]
-				
-				if chr not in chains['data']:
-					chains['data'][chr] = {chain: []}
-					chains['keys'][chr] = [chain]
-				elif chain not in chains['data'][chr]:
-					chains['data'][chr][chain] = []
-					chains['keys'][chr].append(chain)
-				
-				chains['data'][chr][chain].append( (row[8],row[9],row[10]) )
-			#foreach row
-			
-			# Sort the chains by score
-			for k in chains['keys']:
-				chains['keys'][k].sort(reverse=True)
-			
-			self._liftOverCache[conv] = chains
-		#if chains are cached
-		
-		for c in chains['keys'].get(chrom, []):
-			# if the region overlaps the chain... (1-based, closed intervals)
-			if start <= c[2] and end >= c[1]:
-				data = chains['data'][chrom][c]
-				idx = bisect.bisect(data, (start, sys.maxsize, sys.maxsize)) - 1
-				while (idx < 0) or (data[idx][1] < start):
-					idx = idx + 1
-				while (idx < len(data)) and (data[idx][0] <= end):
-					yield (c[-1], data[idx][0], data[idx][1], data[idx][2], c[4], c[5])
-					idx = idx + 1
+		Tuples containing liftOver chain segment information for the given region, in chain score order.
+			(chain_id, old_start, old_end, new_start, is_fwd, new_chr)
+		"""
+		chains = self._getLiftOverChainIndex(oldHG, newHG).get(chrom)
+		if not chains:
+			return
+		segStart = chains['seg_start']
+		segEnd = chains['seg_end']
+		segNew = chains['seg_new']
+		for h in self._findLiftOverChains(chains, start, end):
+			idx = bisect.bisect_right(segStart, start, chains['seg_lo'][h], chains['seg_hi'][h]) - 1
+			idx = max(idx, chains['seg_lo'][h])
+			hi = chains['seg_hi'][h]
+			while (idx < hi) and (segEnd[idx] < start):
+				idx = idx + 1
+			while (idx < hi) and (segStart[idx] <= end):
+				yield (chains['chain_id'][h], segStart[idx], segEnd[idx], segNew[idx], chains['is_fwd'][h], chains['new_chr'][h])
+				idx = idx + 1
 		#foreach chain
 	#_generateApplicableLiftOverChains()
-	
-	
-	def _liftOverRegionUsingChains(self, label, start, end, extra, first_seg, end_seg, total_mapped_sz):
+
+
+	@classmethod
+	def packChainData(cls, segments):
 		"""
-		Map a region given the 1st and last segment as well as the total mapped size.
+		Pack a chain's aligned blocks into the BLOB stored in its chain.data column.
+
+		The blob holds three runs of little-endian int32: the delta-encoded old start positions,
+		the block lengths (old_end - old_start) and the delta-encoded new start positions, where
+		each delta is from the previous block (or from 0 for the first block).
 
 		Parameters:
 		-----------
-		label : str
-			Label of the region.
-		start : int
-			Start position of the region.
-		end : int
-			End position of the region.
-		extra : object
-			Additional data associated with the region.
-		first_seg : tuple
-			First segment information.
-		end_seg : tuple
-			Last segment information.
-		total_mapped_sz : int
-			Total mapped size of the region.
+		segments : iterable of tuple
+			(old_start, old_end, new_start) of each block, in old_start order.
 
 		Returns:
 		--------
-		tuple or None
-			Mapped region information if mapped successfully, otherwise None.
+		bytes
+			Packed block data.
+		"""
+		starts = array.array('i')
+		lengths = array.array('i')
+		news = array.array('i')
+		lastStart = lastNew = 0
+		for start,end,new in segments:
+			starts.append(start - lastStart)
+			lengths.append(end - start)
+			news.append(new - lastNew)
+			lastStart,lastNew = start,new
+		data = starts + lengths + news
+		if sys.byteorder != 'little':
+			data.byteswap()
+		return data.tobytes()
+	#packChainData()
+
+
+	@classmethod
+	def unpackChainData(cls, data):
 		"""
-		mapped_reg = None
-		
-		# The front and end differences are the distances from the
-		# beginning of the segment.
-		
-		# The front difference should be >= 0 and <= size of 1st segment
-		front_diff = max(0, min(start - first_seg[1], first_seg[2] - first_seg[1]))
-		
-		# The end difference should be similar, but w/ last
-		end_diff = max(0, min(end - end_seg[1], end_seg[2] - end_seg[1]))
-		
+		Decode a chain's packed blocks, as written by packChainData().
+
+		Parameters:
+		-----------
+		data : bytes
+			Packed block data.
+
+		Returns:
+		--------
+		tuple
+			(starts, ends, news) int64 arrays of the old start, old end and new start of each block.
+		"""
+		data = array.array('i', data)
+		if sys.byteorder != 'little':
+			data.byteswap()
+		n = len(data) // 3
+		starts = array.array('q', itertools.accumulate(data[:n]))
+		ends = array.array('q', map(operator.add, starts, data[n:2*n]))
+		news = array.array('q', itertools.accumulate(data[2*n:]))
+		return (starts, ends, news)
+	#unpackChainData()
+
+
+	def _findLiftOverChains(self, chains, start, end):
+		"""
+		Find the chains on one chromosome which overlap a region.
+
+		Parameters:
+		-----------
+		chains : dict
+			Chromosome index from _getLiftOverChainIndex().
+		start : int
+			Start position of the region.
+		end : int
+			End position of the region.
+
+		Returns:
+		--------
+		list
+			Positions of the overlapping chains within the index, in descending score order.
+		"""
+		# the index holds the chains sorted by their start position, alongside
+		# the running maximum of their end positions; every chain at or before
+		# the last one starting within the region is a candidate, and we can
+		# stop walking backwards as soon as the running maximum end falls short
+		# of the region, since no earlier chain can reach it either
+		chainEnd = chains['end']
+		maxEnd = chains['maxend']
+		hits = list()
+		idx = bisect.bisect_right(chains['start'], end)
+		while idx > 0:
+			idx -= 1
+			if maxEnd[idx] < start:
+				break
+			# if the region overlaps the chain... (1-based, closed intervals)
+			if chainEnd[idx] >= start:
+				hits.append(idx)
+		#while candidates
+
+		# apply the overlapping chains in order of score, as liftOver does
+		if len(hits) > 1:
+			hits.sort(key=chains['rank'].__getitem__)
+		return hits
+	#_findLiftOverChains()
+
+
+	def _getLiftOverChainIndex(self, oldHG, newHG):
+		"""
+		Retrieve (building and caching if necessary) the interval index over
+		the liftOver chains between two genome assemblies.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+
+		Returns:
+		--------
+		dict
+			Index for each old chromosome, as a dict of int64 arrays.  Chain columns are ordered by chain start:
+				'chain_id', 'start', 'end', 'is_fwd', 'new_chr' : chain attributes
+				'maxend' : running maximum of the chain end positions
+				'rank' : position of each chain in descending score order
+				'seg_lo', 'seg_hi' : range of each chain's segments within the segment columns
+			Segment columns are grouped by chain and ordered by segment start within each chain:
+				'seg_start', 'seg_end', 'seg_new' : old start, old end and new start of each segment
+		"""
+		conv = (oldHG,newHG)
+		if conv in self._liftOverCache:
+			self._liftOverCache.move_to_end(conv)
+			return self._liftOverCache[conv]
+
+		# try a shared copy, then the prepared index file next to the knowledge database, before rebuilding it
+		cacheKey = self._getLiftOverCacheKey()
+		index = None
+		if self._liftOverShared:
+			index = self._attachLiftOverSharedMemory(oldHG, newHG, cacheKey)
+		if index == None:
+			index = self._loadLiftOverChainIndexFile(oldHG, newHG, cacheKey)
+			if index == None:
+				index = self._buildLiftOverChainIndex(oldHG, newHG)
+				self._saveLiftOverChainIndexFile(oldHG, newHG, cacheKey, index)
+			if self._liftOverShared:
+				index = self._createLiftOverSharedMemory(oldHG, newHG, cacheKey, index) or index
+
+		self._liftOverCache[conv] = index
+		self._trimLiftOverCache()
+		return index
+	#_getLiftOverChainIndex()
+
+
+	def _trimLiftOverCache(self):
+		"""
+		Evict the least recently used liftOver chain indexes beyond the cache limit.
+
+		Evicted indexes are freed once no running lookup still refers to them; shared
+		memory blocks stay attached, so a later lookup can map them again without rebuilding.
+		"""
+		if self._liftOverCacheLimit != None:
+			while len(self._liftOverCache) > max(self._liftOverCacheLimit, 0):
+				self._liftOverCache.popitem(last=False)
+	#_trimLiftOverCache()
+
+
+	def _buildLiftOverChainIndex(self, oldHG, newHG):
+		"""
+		Build the interval index over the liftOver chains between two genome assemblies
+		from the chain and chain_data tables.
+
+		If no chains are stored for this direction, they are derived from the chains stored
+		for the opposite direction by swapping each chain's old and new coordinates: an
+		aligned block (old_start, old_end, new_start) becomes (new_start, new_start + length, old_start)
+		on a forward chain, or (new_start - length, new_start, old_end) on a reverse chain,
+		whose new positions descend as the old positions ascend.  Each chain keeps its score
+		and orientation, so the best-scoring chain wins in both directions.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+
+		Returns:
+		--------
+		dict
+			Index for each old chromosome, as described in _getLiftOverChainIndex().
+		"""
+		# rows arrive grouped by chromosome and then by chain in descending score order,
+		# so segments can be appended straight onto the column arrays; chains with packed
+		# data arrive as one row, and the rest as one row per chain_data block
+		sql = "SELECT 1 FROM `db`.`chain` WHERE old_ucschg = ? AND new_ucschg = ? LIMIT 1"
+		reverse = not any(self._db.cursor().execute(sql, (oldHG,newHG)))
+		if not reverse:
+			conv = (oldHG,newHG)
+			sql = """
+SELECT c.chain_id, c.old_chr, c.old_start, c.old_end, c.is_fwd, c.new_chr,
+  cd.old_start, cd.old_end, cd.new_start, c.data
+FROM `db`.`chain` AS c
+LEFT JOIN `db`.`chain_data` AS cd ON cd.chain_id = c.chain_id AND c.data IS NULL
+WHERE c.old_ucschg=? AND c.new_ucschg=? AND (c.data IS NOT NULL OR cd.chain_id IS NOT NULL)
+ORDER BY c.old_chr, c.score DESC, c.old_start DESC, c.old_end DESC, c.new_start DESC, c.is_fwd DESC, c.new_chr DESC, c.chain_id DESC, cd.old_start
+"""
+		else:
+			conv = (newHG,oldHG)
+			sql = """
+SELECT c.chain_id, c.new_chr, MIN(c.new_start,c.new_end) AS start, MAX(c.new_start,c.new_end) AS end, c.is_fwd, c.old_chr,
+  (CASE WHEN c.is_fwd THEN cd.new_start ELSE cd.new_start - (cd.old_end - cd.old_start) END) AS seg_start,
+  (CASE WHEN c.is_fwd THEN cd.new_start + (cd.old_end - cd.old_start) ELSE cd.new_start END) AS seg_end,
+  (CASE WHEN c.is_fwd THEN cd.old_start ELSE cd.old_end END) AS seg_new,
+  c.data
+FROM `db`.`chain` AS c
+LEFT JOIN `db`.`chain_data` AS cd ON cd.chain_id = c.chain_id AND c.data IS NULL
+WHERE c.old_ucschg=? AND c.new_ucschg=? AND (c.data IS NOT NULL OR cd.chain_id IS NOT NULL)
+ORDER BY c.new_chr, c.score DESC, start DESC, end DESC, c.old_start DESC, c.is_fwd DESC, c.old_chr DESC, c.chain_id DESC, seg_start
+"""
+		index = dict()
+		rankedIndex = dict()
+		chains = ranked = None
+		lastChr = lastChain = None
+		for row in self._db.cursor().execute(sql, conv):
+			if row[1] != lastChr:
+				lastChr = row[1]
+				lastChain = None
+				chains = index[lastChr] = { col:array.array('q') for col in self._liftOverChainColumns }
+				ranked = rankedIndex[lastChr] = { col:array.array('q') for col in ('chain_id','start','end','is_fwd','new_chr','seg_lo','seg_hi') }
+			if row[0] != lastChain:
+				lastChain = row[0]
+				if ranked['seg_lo']:
+					ranked['seg_hi'].append(len(chains['seg_start']))
+				ranked['chain_id'].append(row[0])
+				ranked['start'].append(row[2])
+				ranked['end'].append(row[3])
+				ranked['is_fwd'].append(row[4])
+				ranked['new_chr'].append(row[5])
+				ranked['seg_lo'].append(len(chains['seg_start']))
+			if row[9] == None:
+				chains['seg_start'].append(row[6])
+				chains['seg_end'].append(row[7])
+				chains['seg_new'].append(row[8])
+			else:
+				starts,ends,news = self.unpackChainData(row[9])
+				if not reverse:
+					chains['seg_start'].extend(starts)
+					chains['seg_end'].extend(ends)
+					chains['seg_new'].extend(news)
+				elif row[4]:
+					chains['seg_start'].extend(news)
+					chains['seg_end'].extend(map(operator.add, news, map(operator.sub, ends, starts)))
+					chains['seg_new'].extend(starts)
+				else:
+					# new positions descend along a reverse chain
+					chains['seg_start'].extend(map(operator.sub, reversed(news), map(operator.sub, reversed(ends), reversed(starts))))
+					chains['seg_end'].extend(reversed(news))
+					chains['seg_new'].extend(reversed(ends))
+		#foreach row
+
+		for chr,chains in index.items():
+			# order the ranked chains by start position; segments stay grouped in rank order
+			ranked = rankedIndex[chr]
+			ranked['seg_hi'].append(len(chains['seg_start']))
+			order = sorted(range(len(ranked['start'])), key=ranked['start'].__getitem__)
+			for col in ('chain_id','start','end','is_fwd','new_chr','seg_lo','seg_hi'):
+				chains[col] = array.array('q', (ranked[col][i] for i in order))
+			chains['rank'] = array.array('q', order)
+			end = 0
+			for e in chains['end']:
+				end = max(end, e)
+				chains['maxend'].append(end)
+		#foreach chr
+		return index
+	#_buildLiftOverChainIndex()
+
+
+	def _getLiftOverCacheKey(self):
+		"""
+		Identify the currently loaded liftOver chain data, for validating prepared index files.
+
+		Returns:
+		--------
+		str or None
+			A hash of the chainfiles source's version, update time and file checksums
+			(along with the index file format), or None if there is no chainfiles source.
+		"""
+		if not self._dbFile:
+			return None
+		sql = """
+SELECT s.version, s.updated, sf.filename, sf.size, sf.md5
+FROM `db`.`source` AS s
+LEFT JOIN `db`.`source_file` AS sf USING (source_id)
+WHERE s.source = 'chainfiles'
+ORDER BY sf.filename
+"""
+		rows = list(self._db.cursor().execute(sql))
+		if not rows:
+			return None
+		md5 = hashlib.md5()
+		md5.update(repr((self._liftOverCacheMagic, self._liftOverChainColumns, sys.byteorder)).encode())
+		for row in rows:
+			md5.update(repr(row).encode())
+		return md5.hexdigest()
+	#_getLiftOverCacheKey()
+
+
+	def _getLiftOverCacheFile(self, oldHG, newHG):
+		"""
+		Determine the path of the prepared liftOver chain index file for a pair of genome assemblies.
+
+		Returns:
+		--------
+		str or None
+			The path next to the knowledge database file, or None if no file database is loaded.
+		"""
+		if (not self._dbFile) or (self._dbFile == ':memory:'):
+			return None
+		return "%s.liftover.hg%dToHg%d" % (self._dbFile, oldHG, newHG)
+	#_getLiftOverCacheFile()
+
+
+	def _packLiftOverChainIndex(self, index):
+		"""
+		Lay out a liftOver chain index as one contiguous run of int64 columns.
+
+		Parameters:
+		-----------
+		index : dict
+			Index as returned by _getLiftOverChainIndex().
+
+		Returns:
+		--------
+		tuple
+			(layout, columns), where layout maps each chromosome to { column : (offset, length) }
+			with offsets in bytes, and columns lists the column arrays in layout order.
+		"""
+		layout = dict()
+		columns = list()
+		offset = 0
+		for chr in sorted(index):
+			layout[chr] = dict()
+			for col in self._liftOverChainColumns:
+				data = index[chr][col]
+				layout[chr][col] = (offset, len(data))
+				columns.append(data)
+				offset += 8 * len(data)
+		return (layout, columns)
+	#_packLiftOverChainIndex()
+
+
+	def _unpackLiftOverChainIndex(self, buf, layout):
+		"""
+		Rebuild a liftOver chain index as int64 views onto a packed buffer.
+
+		Parameters:
+		-----------
+		buf : buffer
+			Packed column data, such as a memory map or shared memory block.
+		layout : dict
+			Layout as returned by _packLiftOverChainIndex().
+
+		Returns:
+		--------
+		dict
+			Index for each old chromosome, as described in _getLiftOverChainIndex().
+		"""
+		buf = memoryview(buf)
+		index = dict()
+		for chr,cols in layout.items():
+			index[int(chr)] = { col:buf[offset:offset+8*length].cast('q') for col,(offset,length) in cols.items() }
+		return index
+	#_unpackLiftOverChainIndex()
+
+
+	def _formatLiftOverChainIndex(self, cacheKey, index):
+		"""
+		Lay out the header of a prepared liftOver chain index, for a file or shared memory block.
+
+		The header holds the format magic, the JSON header size and the JSON header
+		(cache key and column layout), padded so the columns start on an 8-byte boundary.
+
+		Parameters:
+		-----------
+		cacheKey : str
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+		index : dict
+			Index as returned by _getLiftOverChainIndex().
+
+		Returns:
+		--------
+		tuple
+			(header, columns), where header is bytes and columns lists the column data in layout order.
+		"""
+		layout,columns = self._packLiftOverChainIndex(index)
+		magic = self._liftOverCacheMagic
+		header = json.dumps({ 'key':cacheKey, 'layout':layout }).encode('utf-8')
+		header = magic + len(header).to_bytes(8, 'little') + header
+		return (header + bytes(-len(header) % 8), columns)
+	#_formatLiftOverChainIndex()
+
+
+	def _parseLiftOverChainIndex(self, buf, cacheKey):
+		"""
+		Map a prepared liftOver chain index from a file or shared memory block.
+
+		Parameters:
+		-----------
+		buf : buffer
+			Prepared index data, as laid out by _formatLiftOverChainIndex().
+		cacheKey : str
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+
+		Returns:
+		--------
+		dict or None
+			Index for each old chromosome, or None if the data is incomplete or for other chain data.
+		"""
+		buf = memoryview(buf)
+		magic = self._liftOverCacheMagic
+		if buf[:len(magic)] != magic:
+			return None
+		size = int.from_bytes(buf[len(magic):len(magic)+8], 'little')
+		header = json.loads(bytes(buf[len(magic)+8:len(magic)+8+size]).decode('utf-8'))
+		if header.get('key') != cacheKey:
+			return None
+		base = len(magic) + 8 + size
+		return self._unpackLiftOverChainIndex(buf[base + (-base % 8):], header['layout'])
+	#_parseLiftOverChainIndex()
+
+
+	def _loadLiftOverChainIndexFile(self, oldHG, newHG, cacheKey):
+		"""
+		Memory-map a prepared liftOver chain index file, if there is a current one.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		cacheKey : str or None
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+
+		Returns:
+		--------
+		dict or None
+			Index for each old chromosome, or None if there is no usable file.
+		"""
+		path = self._getLiftOverCacheFile(oldHG, newHG)
+		if (not cacheKey) or (not path) or (not os.path.exists(path)):
+			return None
+		try:
+			with open(path, 'rb') as f:
+				mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+			return self._parseLiftOverChainIndex(mm, cacheKey)
+		except (OSError, ValueError, KeyError):
+			return None
+	#_loadLiftOverChainIndexFile()
+
+
+	def _saveLiftOverChainIndexFile(self, oldHG, newHG, cacheKey, index):
+		"""
+		Write a prepared liftOver chain index file next to the knowledge database file.
+
+		The file is written under a temporary name and then moved into place, so concurrent
+		readers only ever see a complete file; failures (such as a read-only directory) are
+		ignored, since the file is only an optimization.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		cacheKey : str or None
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+		index : dict
+			Index as returned by _buildLiftOverChainIndex().
+		"""
+		path = self._getLiftOverCacheFile(oldHG, newHG)
+		if (not cacheKey) or (not path):
+			return
+		header,columns = self._formatLiftOverChainIndex(cacheKey, index)
+		tmpPath = "%s.%d.tmp" % (path, os.getpid())
+		try:
+			with open(tmpPath, 'wb') as f:
+				f.write(header)
+				for data in columns:
+					f.write(data)
+			os.replace(tmpPath, path)
+		except OSError:
+			try:
+				os.remove(tmpPath)
+			except OSError:
+				pass
+	#_saveLiftOverChainIndexFile()
+
+
+	def _getLiftOverSharedMemoryName(self, oldHG, newHG, cacheKey):
+		"""
+		Name the shared memory block for a liftOver chain index.
+
+		The name is derived from the chain data's cache key (which covers the index format)
+		so that processes only share blocks built from the same chain data, and is kept short
+		enough for platforms that limit shared memory names to 31 characters.
+
+		Returns:
+		--------
+		str
+			Shared memory block name.
+		"""
+		return "loki_" + hashlib.md5(("%s:%d:%d" % (cacheKey, oldHG, newHG)).encode('utf-8')).hexdigest()[:24]
+	#_getLiftOverSharedMemoryName()
+
+
+	def _attachLiftOverSharedMemory(self, oldHG, newHG, cacheKey):
+		"""
+		Map a liftOver chain index from a shared memory block prepared by this or another process.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		cacheKey : str or None
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+
+		Returns:
+		--------
+		dict or None
+			Index for each old chromosome, or None if no complete shared block exists yet.
+		"""
+		conv = (oldHG,newHG)
+		if conv in self._liftOverSharedBlocks:
+			return self._parseLiftOverChainIndex(self._liftOverSharedBlocks[conv][0].buf, cacheKey)
+		if not cacheKey:
+			return None
+		name = self._getLiftOverSharedMemoryName(oldHG, newHG, cacheKey)
+		try:
+			try:
+				shm = _LiftOverSharedMemory(name=name, track=False)
+			except TypeError:
+				shm = _LiftOverSharedMemory(name=name)
+				# before Python 3.13 attaching also registers the block to be unlinked when this process's
+				# resource tracker shuts down; multiprocessing children share their parent's tracker (which
+				# may have created the block), but an unrelated process would pull it out from under the rest
+				if multiprocessing.parent_process() == None:
+					from multiprocessing import resource_tracker
+					resource_tracker.unregister(shm._name, 'shared_memory')
+		except (OSError, ValueError):
+			return None
+		# the creating process writes the magic last, so an incomplete block does not parse
+		index = self._parseLiftOverChainIndex(shm.buf, cacheKey)
+		if index == None:
+			shm.close()
+			return None
+		self._liftOverSharedBlocks[conv] = (shm, False)
+		return index
+	#_attachLiftOverSharedMemory()
+
+
+	def _createLiftOverSharedMemory(self, oldHG, newHG, cacheKey, index):
+		"""
+		Copy a liftOver chain index into a new shared memory block for other processes to attach.
+
+		This process owns the block and unlinks it in clearLiftOverCache() (or, failing that,
+		when it exits); processes which already attached keep their mapping until they exit.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		cacheKey : str or None
+			Key of the loaded chain data, from _getLiftOverCacheKey().
+		index : dict
+			Index as returned by _buildLiftOverChainIndex().
+
+		Returns:
+		--------
+		dict or None
+			Index mapped from the shared block, or None if the block could not be created
+			(for instance because another process is creating it at the same time).
+		"""
+		if not cacheKey:
+			return None
+		header,columns = self._formatLiftOverChainIndex(cacheKey, index)
+		size = len(header) + sum(8 * len(data) for data in columns)
+		name = self._getLiftOverSharedMemoryName(oldHG, newHG, cacheKey)
+		try:
+			shm = _LiftOverSharedMemory(name=name, create=True, size=size)
+		except (OSError, ValueError):
+			return None
+		buf = shm.buf
+		offset = len(header)
+		for data in columns:
+			buf[offset:offset+8*len(data)] = memoryview(data).cast('B')
+			offset += 8 * len(data)
+		# write the magic last to mark the block complete
+		magic = self._liftOverCacheMagic
+		buf[len(magic):len(header)] = header[len(magic):]
+		buf[:len(magic)] = magic
+		del buf
+		self._liftOverSharedBlocks[(oldHG,newHG)] = (shm, True)
+		return self._parseLiftOverChainIndex(shm.buf, cacheKey)
+	#_createLiftOverSharedMemory()
+
+
+	def clearLiftOverCache(self, files=True):
+		"""
+		Discard all prepared liftOver chain indexes, in memory, in shared memory blocks
+		created by this process and in the index files next to the knowledge database file.
+
+		This must be called whenever the chain data is reloaded.
+
+		Args:
+			files (bool, optional): False to keep the index files, e.g. to release the memory
+				of a process which is done with liftOver.
+		"""
+		self._liftOverCache.clear()
+		for shm,owned in self._liftOverSharedBlocks.values():
+			if owned:
+				try:
+					shm.unlink()
+				except OSError:
+					pass
+		self._liftOverSharedBlocks.clear()
+		if files and self._dbFile and (self._dbFile != ':memory:'):
+			for path in glob.glob(glob.escape(self._dbFile) + '.liftover.hg*'):
+				try:
+					os.remove(path)
+				except OSError:
+					pass
+	#clearLiftOverCache()
+
+
+	def _liftOverRegionUsingChain(self, chains, h, idx, start, end):
+		"""
+		Map a region using one chain, if it covers enough of the region.
+
+		Parameters:
+		-----------
+		chains : dict
+			Chromosome index from _getLiftOverChainIndex().
+		h : int
+			Position of the chain within the index.
+		idx : int
+			Position within the segment columns to start searching from; it must be within
+			the chain's segments, and no earlier segment of the chain may overlap the region.
+		start : int
+			Start position of the region (start <= end).
+		end : int
+			End position of the region.
+
+		Returns:
+		--------
+		tuple or None
+			Mapped region (new_chr, new_start, new_end) if mapped successfully, otherwise None.
+		"""
+		segStart = chains['seg_start']
+		segEnd = chains['seg_end']
+		segNew = chains['seg_new']
+		
+		# find the first and last segments of this chain which overlap the region
+		hi = chains['seg_hi'][h]
+		while (idx < hi) and (segEnd[idx] < start):
+			idx = idx + 1
+		if (idx >= hi) or (segStart[idx] > end):
+			return None
+		first = idx
+		total_mapped_sz = 0
+		while (idx < hi) and (segStart[idx] <= end):
+			total_mapped_sz += segEnd[idx] - segStart[idx] + 1
+			idx = idx + 1
+		last = idx - 1
+		
+		# The front and end differences are the distances from the
+		# beginning of the segment.
+		
+		# The front difference should be >= 0 and <= size of 1st segment
+		front_diff = max(0, min(start - segStart[first], segEnd[first] - segStart[first]))
+		
+		# The end difference should be similar, but w/ last
+		end_diff = max(0, min(end - segStart[last], segEnd[last] - segStart[last]))
+		
 		# Now, if we are moving forward, we add the difference
 		# to the new_start, backward, we subtract
 		# Also, at this point, if backward, swap start/end
-		if first_seg[4]:
-			new_start = first_seg[3] + front_diff
-			new_end = end_seg[3] + end_diff
+		if chains['is_fwd'][h]:
+			new_start = segNew[first] + front_diff
+			new_end = segNew[last] + end_diff
 		else:
-			new_start = end_seg[3] - end_diff
-			new_end = first_seg[3] - front_diff
+			new_start = segNew[last] - end_diff
+			new_end = segNew[first] - front_diff
 		
 		# old_startHere, detect if we have mapped a sufficient fraction 
 		# of the region.  liftOver uses a default of 95%
-		mapped_size = total_mapped_sz - front_diff - (end_seg[2] - end_seg[1] + 1) + end_diff + 1
+		mapped_size = total_mapped_sz - front_diff - (segEnd[last] - segStart[last] + 1) + end_diff + 1
 		
 		if mapped_size / float(end - start + 1) >= 0.95: # TODO: configurable threshold?
-			mapped_reg = (label, first_seg[5], new_start, new_end, extra)
-		
-		return mapped_reg
+			return (chains['new_chr'][h], new_start, new_end)
+		return None
+	#_liftOverRegionUsingChain()
+	
+	
+	def _liftOverRegionUsingChains(self, chains, start, end):
+		"""
+		Map a region using the best-scoring overlapping chain that covers enough of it.
+
+		Parameters:
+		-----------
+		chains : dict
+			Chromosome index from _getLiftOverChainIndex().
+		start : int
+			Start position of the region (start <= end).
+		end : int
+			End position of the region.
+
+		Returns:
+		--------
+		tuple or None
+			Mapped region (new_chr, new_start, new_end) if mapped successfully, otherwise None.
+		"""
+		segStart = chains['seg_start']
+		for h in self._findLiftOverChains(chains, start, end):
+			lo = chains['seg_lo'][h]
+			idx = max(lo, bisect.bisect_right(segStart, start, lo, chains['seg_hi'][h]) - 1)
+			mapped_reg = self._liftOverRegionUsingChain(chains, h, idx, start, end)
+			if mapped_reg:
+				return mapped_reg
+		#foreach chain
+		return None
 	#_liftOverRegionUsingChains()
 	
 	
-	def generateLiftOverRegions(self, oldHG, newHG, regions, tally=None, errorCallback=None):
+	def _sweepLiftOverRegions(self, chains, regions):
+		"""
+		Map a sorted stream of regions on one chromosome in a single merged pass over its chains.
+
+		Parameters:
+		-----------
+		chains : dict
+			Chromosome index from _getLiftOverChainIndex().
+		regions : iterable
+			Regions as tuples (label, chr, posMin, posMax, extra), in ascending order
+			of their lesser position.
+
+		Yields:
+		-------
+		tuple
+			(region, mapped) for each input region, where mapped is (new_chr, new_start, new_end)
+			if the region was mapped successfully, otherwise None.
+
+		Raises:
+		-------
+		Exception
+			If the regions are not in ascending position order.
+		"""
+		chainStart = chains['start']
+		chainEnd = chains['end']
+		rank = chains['rank']
+		numChains = len(chainStart)
+		cursor = array.array('q', chains['seg_lo'])
+		active = list()
+		activeMinEnd = activeMaxStart = 0
+		p = 0
+		prev = None
+		for region in regions:
+			start,end = region[2],region[3]
+			if start > end:
+				start,end = end,start
+			if (prev != None) and (start < prev):
+				raise Exception("ERROR: liftOver input is not sorted by position on chromosome %s at %s" % (region[1], region[2]))
+			prev = start
+			
+			# since region starts never decrease, a chain becomes active once it
+			# starts within a region, and is retired once it ends before one
+			if activeMinEnd < start:
+				active = [ h for h in active if chainEnd[h] >= start ]
+				activeMinEnd = min((chainEnd[h] for h in active), default=sys.maxsize)
+			while (p < numChains) and (chainStart[p] <= end):
+				if chainEnd[p] >= start:
+					active.append(p)
+					activeMinEnd = min(activeMinEnd, chainEnd[p])
+					activeMaxStart = chainStart[p]
+				p += 1
+			if activeMaxStart <= end:
+				hits = list(active)
+			else:
+				hits = [ h for h in active if chainStart[h] <= end ]
+			if len(hits) > 1:
+				hits.sort(key=rank.__getitem__)
+			
+			# each chain's segment cursor also only moves forward
+			mapped_reg = None
+			for h in hits:
+				idx = cursor[h]
+				hi = chains['seg_hi'][h]
+				while (idx < hi) and (chains['seg_end'][idx] < start):
+					idx = idx + 1
+				cursor[h] = idx
+				mapped_reg = self._liftOverRegionUsingChain(chains, h, idx, start, end)
+				if mapped_reg:
+					break
+			#foreach chain
+			yield (region, mapped_reg)
+		#foreach region
+	#_sweepLiftOverRegions()
+	
+	
+	def _generateSortedLiftOverRegions(self, index, regions):
+		"""
+		Map regions sorted by chromosome and position using one merged sweep per chromosome.
+
+		Parameters:
+		-----------
+		index : dict
+			Chain index from _getLiftOverChainIndex().
+		regions : iterable
+			Regions as tuples (label, chr, posMin, posMax, extra), grouped by chromosome
+			and in ascending position order within each chromosome.
+
+		Yields:
+		-------
+		tuple
+			(region, mapped) for each input region, as from _sweepLiftOverRegions().
+
+		Raises:
+		-------
+		Exception
+			If the regions are not grouped by chromosome or not in position order.
+		"""
+		seen = set()
+		for chrom,group in itertools.groupby(regions, key=lambda r: r[1]):
+			if chrom in seen:
+				raise Exception("ERROR: liftOver input is not sorted by chromosome at chromosome %s" % (chrom,))
+			seen.add(chrom)
+			chains = index.get(chrom)
+			if chains:
+				for pair in self._sweepLiftOverRegions(chains, group):
+					yield pair
+			else:
+				for region in group:
+					yield (region, None)
+		#foreach chromosome
+	#_generateSortedLiftOverRegions()
+	
+	
+	def generateLiftOverRegions(self, oldHG, newHG, regions, tally=None, errorCallback=None, sorted=False):
 		"""
 		Generate liftOver regions based on old and new genome assemblies.
 
@@ -2777,6 +5555,10 @@ ORDER BY c.old_chr, score DESC, cd.old_start
 			A dictionary to store the count of lifted and non-lifted regions (default is None).
 		errorCallback : function or None, optional
 			A callback function to handle errors for non-liftable regions (default is None).
+		sorted : bool, optional
+			If True, the regions are already grouped by chromosome and ordered by position,
+			so they can be lifted in one sweep over the chains instead of a search per region;
+			an Exception is raised if they turn out not to be (default is False).
 
 		Yields:
 		-------
@@ -2784,48 +5566,21 @@ ORDER BY c.old_chr, score DESC, cd.old_start
 			Mapped regions in the format (label, chrom, new_start, new_end, extra).
 		"""
 		# regions=[ (label,chr,posMin,posMax,extra), ... ]
-		oldHG = int(oldHG)
-		newHG = int(newHG)
+		index = self._getLiftOverChainIndex(int(oldHG), int(newHG))
+		if sorted:
+			pairs = self._generateSortedLiftOverRegions(index, regions)
+		else:
+			pairs = ( (region, self._liftOverRegionUsingChains(index[region[1]], min(region[2],region[3]), max(region[2],region[3])) if (region[1] in index) else None) for region in regions )
 		numNull = numLift = 0
-		for region in regions:
+		for region,mapped_reg in pairs:
 			label,chrom,start,end,extra = region
 			
-			if start > end:
-				start,end = end,start
-			is_region = (start != end)
-			
-			# find and apply chains
-			mapped_reg = None
-			curr_chain = None
-			total_mapped_sz = 0
-			first_seg = None
-			end_seg = None
-			for seg in self._generateApplicableLiftOverChains(oldHG, newHG, chrom, start, end):
-				if curr_chain is None:
-					curr_chain = seg[0]
-					first_seg = seg
-					end_seg = seg
-					total_mapped_sz = seg[2] - seg[1] + 1
-				elif seg[0] != curr_chain:
-					mapped_reg = self._liftOverRegionUsingChains(label, start, end, extra, first_seg, end_seg, total_mapped_sz)
-					if mapped_reg:
-						break
-					curr_chain = seg[0]
-					first_seg = seg
-					end_seg = seg
-					total_mapped_sz = seg[2] - seg[1] + 1
-				else:
-					end_seg = seg
-					total_mapped_sz = total_mapped_sz + seg[2] - seg[1] + 1
-			
-			if not mapped_reg and first_seg is not None:
-				mapped_reg = self._liftOverRegionUsingChains(label, start, end, extra, first_seg, end_seg, total_mapped_sz)
-			
 			if mapped_reg:
 				numLift += 1
-				if not is_region:
-					mapped_reg = (mapped_reg[0], mapped_reg[1], mapped_reg[2], mapped_reg[2], extra)
-				yield mapped_reg
+				if start == end:
+					yield (label, mapped_reg[0], mapped_reg[1], mapped_reg[1], extra)
+				else:
+					yield (label, mapped_reg[0], mapped_reg[1], mapped_reg[2], extra)
 			else:
 				numNull += 1
 				if errorCallback:
@@ -2838,7 +5593,7 @@ ORDER BY c.old_chr, score DESC, cd.old_start
 	#generateLiftOverRegions()
 	
 	
-	def generateLiftOverLoci(self, oldHG, newHG, loci, tally=None, errorCallback=None):
+	def generateLiftOverLoci(self, oldHG, newHG, loci, tally=None, errorCallback=None, sorted=False):
 		"""
 		Generate liftOver loci based on old and new genome assemblies.
 
@@ -2855,6 +5610,9 @@ ORDER BY c.old_chr, score DESC, cd.old_start
 			A dictionary to store the count of lifted and non-lifted loci (default is None).
 		errorCallback : function or None, optional
 			A callback function to handle errors for non-liftable loci (default is None).
+		sorted : bool, optional
+			If True, the loci are already ordered by chromosome and position (default is False);
+			see generateLiftOverRegions().
 
 		Returns:
 		--------
@@ -2864,14 +5622,248 @@ ORDER BY c.old_chr, score DESC, cd.old_start
 		"""
 		# loci=[ (label,chr,pos,extra), ... ]
 		regions = ((l[0],l[1],l[2],l[2],l[3]) for l in loci)
-		newloci = ((r[0],r[1],r[2],r[4]) for r in self.generateLiftOverRegions(oldHG, newHG, regions, tally, errorCallback))
+		newloci = ((r[0],r[1],r[2],r[4]) for r in self.generateLiftOverRegions(oldHG, newHG, regions, tally, errorCallback, sorted))
 		return newloci
 	#generateLiftOverLoci()
 	
 	
+	def liftOverRegionBatch(self, oldHG, newHG, chrs, starts, ends):
+		"""
+		Lift over parallel arrays of regions all at once.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		chrs : sequence of int
+			Chromosome number of each region.
+		starts : sequence of int
+			Start position of each region.
+		ends : sequence of int
+			End position of each region.
+
+		Returns:
+		--------
+		tuple
+			(newChrs, newStarts, newEnds, unmapped), where the first three are int64 arrays
+			of lifted coordinates (0 for regions which could not be lifted) and unmapped is
+			a bytearray holding 1 for each region which could not be lifted.
+		"""
+		index = self._getLiftOverChainIndex(int(oldHG), int(newHG))
+		n = len(chrs)
+		newChrs = array.array('q', bytes(8*n))
+		newStarts = array.array('q', bytes(8*n))
+		newEnds = array.array('q', bytes(8*n))
+		unmapped = bytearray(n)
+		
+		# work through one chromosome's chains at a time, in position order
+		byChr = collections.defaultdict(list)
+		for i,chrom in enumerate(chrs):
+			byChr[chrom].append(i)
+		for chrom,idxs in byChr.items():
+			chains = index.get(chrom)
+			if not chains:
+				for i in idxs:
+					unmapped[i] = 1
+				continue
+			idxs.sort(key=lambda i: min(starts[i], ends[i]))
+			for region,mapped_reg in self._sweepLiftOverRegions(chains, ((i,chrom,starts[i],ends[i],None) for i in idxs)):
+				i = region[0]
+				if mapped_reg:
+					newChrs[i] = mapped_reg[0]
+					newStarts[i] = mapped_reg[1]
+					newEnds[i] = mapped_reg[1] if (starts[i] == ends[i]) else mapped_reg[2]
+				else:
+					unmapped[i] = 1
+			#foreach region
+		#foreach chr
+		return (newChrs, newStarts, newEnds, unmapped)
+	#liftOverRegionBatch()
+	
+	
+	def liftOverLocusBatch(self, oldHG, newHG, chrs, positions):
+		"""
+		Lift over parallel arrays of loci all at once.
+
+		Parameters:
+		-----------
+		oldHG : int
+			Old genome assembly identifier.
+		newHG : int
+			New genome assembly identifier.
+		chrs : sequence of int
+			Chromosome number of each locus.
+		positions : sequence of int
+			Position of each locus.
+
+		Returns:
+		--------
+		tuple
+			(newChrs, newPositions, unmapped), where the first two are int64 arrays of lifted
+			coordinates (0 for loci which could not be lifted) and unmapped is a bytearray
+			holding 1 for each locus which could not be lifted.
+		"""
+		newChrs,newPositions,_,unmapped = self.liftOverRegionBatch(oldHG, newHG, chrs, positions, positions)
+		return (newChrs, newPositions, unmapped)
+	#liftOverLocusBatch()
+	
+	
 #Database
 
 
+class SNPLocusFile(object):
+	"""
+	A memory-mapped, read-only copy of a knowledge database's SNP loci, as written by
+	Database.saveSNPLocusFile(), for batch lookups without SQL.
+
+	Lookups return the same loci in the same order as the equivalent Database queries,
+	as parallel arrays.
+	"""
+	
+	# leading bytes of an SNP locus file
+	_magic = b'LOKISNP1'
+	
+	# (name,typecode) of each column, in file order
+	_columns = (('rs','q'), ('chr','B'), ('pos','q'), ('validated','B'), ('order','q'))
+	
+	
+	def __init__(self, path, key=None):
+		"""
+		Maps an SNP locus file.
+
+		Args:
+			path (str): The file to map.
+			key (str, optional): The key the file must have been written with, such as from
+				Database._getSNPLocusFileKey(); a ValueError is raised if it doesn't match.
+		"""
+		with open(path, 'rb') as f:
+			self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+		buf = memoryview(self._mmap)
+		magic = self._magic
+		if buf[:len(magic)] != magic:
+			raise ValueError("ERROR: '%s' is not an SNP locus file" % (path,))
+		size = int.from_bytes(buf[len(magic):len(magic)+8], 'little')
+		header = json.loads(bytes(buf[len(magic)+8:len(magic)+8+size]).decode('utf-8'))
+		if key and (header['key'] != key):
+			raise ValueError("ERROR: SNP locus file '%s' is out of date" % (path,))
+		base = len(magic) + 8 + size
+		base += -base % 8
+		self._count = header['count']
+		self._views = dict()
+		for col,(offset,fmt) in header['layout'].items():
+			itemsize = array.array(fmt).itemsize
+			self._views[col] = buf[base+offset:base+offset+self._count*itemsize].cast(fmt)
+		self._rs = self._views['rs']
+		self._chr = self._views['chr']
+		self._pos = self._views['pos']
+		self._validated = self._views['validated']
+		self._order = self._views['order']
+	#__init__()
+	
+	
+	def __len__(self):
+		return self._count
+	#__len__()
+	
+	
+	def close(self):
+		"""
+		Unmaps the file; arrays already returned by lookups remain valid.
+		"""
+		for view in self._views.values():
+			view.release()
+		self._views = dict()
+		self._rs = self._chr = self._pos = self._validated = self._order = None
+		self._mmap.close()
+	#close()
+	
+	
+	def _bisectPosition(self, chrom, pos):
+		"""
+		Finds the first place in chr/pos order at or after a position.
+
+		Returns:
+			int: The index into the 'order' permutation.
+		"""
+		lo,hi = 0, self._count
+		while lo < hi:
+			mid = (lo + hi) // 2
+			i = self._order[mid]
+			if (self._chr[i], self._pos[i]) < (chrom, pos):
+				lo = mid + 1
+			else:
+				hi = mid
+		return lo
+	#_bisectPosition()
+	
+	
+	def lookupRS(self, rses, validated=None):
+		"""
+		Finds the loci of each of a list of SNPs.
+
+		Args:
+			rses (sequence): The rs# of each SNP.
+			validated (bool, optional): Flag to filter validated SNP loci. Defaults to None for all.
+
+		Returns:
+			tuple: Parallel arrays (indices, chrs, positions) with one entry per locus found,
+			where indices are positions in rses; each SNP's loci are in chr/pos order, as
+			from Database.generateSNPLociByRSes().
+		"""
+		indices = array.array('q')
+		chrs = array.array('B')
+		positions = array.array('q')
+		rsView,chrView,posView,validView = self._rs, self._chr, self._pos, self._validated
+		for n,rs in enumerate(rses):
+			try:
+				rs = int(rs)
+			except (TypeError, ValueError):
+				continue
+			i = bisect.bisect_left(rsView, rs)
+			while (i < self._count) and (rsView[i] == rs):
+				if (validated == None) or (validView[i] == (1 if validated else 0)):
+					indices.append(n)
+					chrs.append(chrView[i])
+					positions.append(posView[i])
+				i += 1
+		return (indices, chrs, positions)
+	#lookupRS()
+	
+	
+	def lookupPositions(self, chrs, positions, validated=None):
+		"""
+		Finds the SNPs at each of a list of positions.
+
+		Args:
+			chrs (sequence): The chromosome number of each position.
+			positions (sequence): Each position (1-based).
+			validated (bool, optional): Flag to filter validated SNP loci. Defaults to None for all.
+
+		Returns:
+			tuple: Parallel arrays (indices, rses) with one entry per locus found, where indices
+			are positions in the inputs; the SNPs at each position are in rs order.
+		"""
+		indices = array.array('q')
+		rses = array.array('q')
+		chrView,posView,validView,order = self._chr, self._pos, self._validated, self._order
+		for n,(chrom,pos) in enumerate(zip(chrs, positions)):
+			k = self._bisectPosition(chrom, pos)
+			while k < self._count:
+				i = order[k]
+				if (chrView[i] != chrom) or (posView[i] != pos):
+					break
+				if (validated == None) or (validView[i] == (1 if validated else 0)):
+					indices.append(n)
+					rses.append(self._rs[i])
+				k += 1
+		return (indices, rses)
+	#lookupPositions()
+	
+#SNPLocusFile
+
+
 # TODO: find a better place for this liftover testing code
 """
 if __name__ == "__main__":
@@ -548,12 +548,18 @@ class Source(object):
 	
 	
 	def addChainData(self, chain_data_list):
+		# chain_data_list=[ (chain_id,old_start,old_end,new_start), ... ]
 		"""
-		Adds all of the chain data into the chain data table
+		Adds all of the chain data, packed into the data column of each
+		chain row.  The chain_data_list must be grouped by chain_id and
+		ordered by old_start within each chain
 		"""
-		self.prepareTableForUpdate('chain_data')
-		sql = "INSERT INTO `db`.`chain_data` (chain_id,old_start,old_end,new_start,source_id) VALUES (?,?,?,?,%d)" % (self.getSourceID(),)
-		self._db.cursor().executemany(sql, chain_data_list)
+		self.prepareTableForUpdate('chain')
+		sql = "UPDATE `db`.`chain` SET data = ? WHERE chain_id = ?"
+		self._db.cursor().executemany(sql, (
+			(self._loki.packChainData(seg[1:] for seg in segs), chainID)
+			for chainID,segs in itertools.groupby(chain_data_list, key=lambda row: row[0])
+		))
 	#addChainData()
 	
 	
@@ -2,6 +2,7 @@
 
 import collections
 import hashlib
+import itertools
 import os
 import pkgutil
 import sys
@@ -34,6 +35,7 @@ class Updater(object):
 		self._updating = False
 		self._tablesUpdated = None
 		self._tablesDeindexed = None
+		self._liftOverBatch = False
 		self.lock = Lock()
 	#__init__()
 	
@@ -188,9 +190,10 @@ class Updater(object):
 	#downloadAndHash()
 	
 	
-	def updateDatabase(self, sources=None, sourceOptions=None, cacheOnly=False, forceUpdate=False):
+	def updateDatabase(self, sources=None, sourceOptions=None, cacheOnly=False, forceUpdate=False, liftOverBatch=False):
 		if self._updating:
 			raise Exception("_updating set before updateDatabase()")
+		self._liftOverBatch = liftOverBatch
 		self._loki.testDatabaseWriteable()
 		if self._loki.getDatabaseSetting('finalized',int):
 			raise Exception("cannot update a finalized database")
@@ -319,6 +322,10 @@ class Updater(object):
 				shutil.rmtree(path)
 			#foreach source
 			
+			# any prepared liftOver indexes are stale if the chains were reloaded
+			if 'chain' in self._tablesUpdated or 'chain_data' in self._tablesUpdated:
+				self._loki.clearLiftOverCache()
+			
 			# pull the latest GRCh/UCSChg conversions
 			#   http://genome.ucsc.edu/FAQ/FAQreleases.html
 			#   http://genome.ucsc.edu/goldenPath/releaseLog.html
@@ -441,6 +448,13 @@ class Updater(object):
 			if 'biopolymer_region' in self._tablesUpdated:
 				self.updateBiopolymerZones()
 				#self.log("MEMORY: %d bytes (%d peak)\n" % self._loki.getDatabaseMemoryUsage()) #DEBUG
+			if 'group' in self._tablesUpdated or 'group_group' in self._tablesUpdated:
+				self.updateGroupClosure()
+				#self.log("MEMORY: %d bytes (%d peak)\n" % self._loki.getDatabaseMemoryUsage()) #DEBUG
+			
+			# any exported SNP locus file is stale if the loci changed
+			if 'snp_locus' in self._tablesUpdated:
+				self._loki.clearSNPLocusFile()
 			
 			# reindex all remaining tables
 			self.log("finishing update ...")
@@ -486,38 +500,50 @@ class Updater(object):
 		cursor = self._db.cursor()
 		numLift = numNull = 0
 		tally = dict()
-		trash = set()
 		
-		# identify range of _ROWID_ in snp_locus
-		# (two separate queries is faster because a simple MIN() or MAX() only peeks at the index;
-		# SQLite isn't clever enough to do that for both at the same time, it does a table scan instead)
-		firstRowID = min(row[0] for row in cursor.execute("SELECT MIN(_ROWID_) FROM `db`.`snp_locus`"))
-		lastRowID = max(row[0] for row in cursor.execute("SELECT MAX(_ROWID_) FROM `db`.`snp_locus`"))
-		
-		# define a callback to store loci that can't be lifted over, for later deletion
-		def errorCallback(region):
-			trash.add( (region[0],) )
+		# stage the lifted loci in a temp table, so the source rows can be replaced
+		# in one set-based pass rather than updated and deleted one _ROWID_ at a time
+		cursor.execute("""
+CREATE TEMP TABLE `temp`.`_snp_locus_liftover` (
+  rs INTEGER NOT NULL,
+  chr TINYINT NOT NULL,
+  pos BIGINT NOT NULL,
+  validated TINYINT NOT NULL,
+  source_id TINYINT NOT NULL
+)
+""")
 		
-		# we can't SELECT and UPDATE the same table at the same time,
-		# so read in batches of 2.5 million at a time based on _ROWID_
-		minRowID = firstRowID
-		maxRowID = minRowID + 2500000 - 1
-		while minRowID <= lastRowID:
-			sql = "SELECT _ROWID_, chr, pos, NULL FROM `db`.`snp_locus`"
-			sql += " WHERE (_ROWID_ BETWEEN ? AND ?) AND source_id IN (%s)" % (','.join(str(i) for i in sourceIDs))
-			oldLoci = list(cursor.execute(sql, (minRowID,maxRowID)))
-			newLoci = self._loki.generateLiftOverLoci(oldHG, newHG, oldLoci, tally, errorCallback)
-			sql = "UPDATE OR REPLACE `db`.`snp_locus` SET chr = ?2, pos = ?3 WHERE _ROWID_ = ?1"
-			cursor.executemany(sql, newLoci)
+		# read the loci in position order so liftOver can sweep the chains in one pass,
+		# and lift them in batches of 2.5 million at a time
+		sql = "SELECT rs, chr, pos, validated, source_id FROM `db`.`snp_locus`"
+		sql += " WHERE source_id IN (%s)" % (','.join(str(i) for i in sourceIDs))
+		sql += " ORDER BY chr, pos"
+		oldLoci = ( (row[0], row[1], row[2], row[3:]) for row in self._db.cursor().execute(sql) )
+		insertCursor = self._db.cursor()
+		sql = "INSERT INTO `temp`.`_snp_locus_liftover` (rs, chr, pos, validated, source_id) VALUES (?,?,?,?,?)"
+		while True:
+			batch = list(itertools.islice(oldLoci, 2500000))
+			if not batch:
+				break
+			if self._liftOverBatch:
+				newLoci = self.generateBatchLiftOverLoci(oldHG, newHG, batch, tally)
+			else:
+				newLoci = self._loki.generateLiftOverLoci(oldHG, newHG, batch, tally, sorted=True)
+			insertCursor.executemany(sql, ( (l[0], l[1], l[2], l[3][0], l[3][1]) for l in newLoci ))
 			numLift += tally['lift']
 			numNull += tally['null']
-			if trash:
-				cursor.executemany("DELETE FROM `db`.`snp_locus` WHERE _ROWID_ = ?", trash)
-				trash.clear()
-			minRowID = maxRowID + 1
-			maxRowID = minRowID + 2500000 - 1
 		#foreach batch
 		
+		# swap the lifted loci in for the originals, in index order
+		cursor.execute("DELETE FROM `db`.`snp_locus` WHERE source_id IN (%s)" % (','.join(str(i) for i in sourceIDs)))
+		cursor.execute("""
+INSERT INTO `db`.`snp_locus` (rs, chr, pos, validated, source_id)
+SELECT rs, chr, pos, validated, source_id
+FROM `temp`.`_snp_locus_liftover`
+ORDER BY chr, pos, rs
+""")
+		cursor.execute("DROP TABLE `temp`.`_snp_locus_liftover`")
+		
 		self.log(" OK: %d loci lifted over, %d dropped\n" % (numLift,numNull))
 	#liftOverSNPLoci()	
 	
@@ -528,43 +554,91 @@ class Updater(object):
 		cursor = self._db.cursor()
 		numLift = numNull = 0
 		tally = dict()
-		trash = set()
 		
-		# identify range of _ROWID_ in biopolymer_region
-		# (two separate queries is faster because a simple MIN() or MAX() only peeks at the index;
-		# SQLite isn't clever enough to do that for both at the same time, it does a table scan instead)
-		firstRowID = min(row[0] for row in cursor.execute("SELECT MIN(_ROWID_) FROM `db`.`biopolymer_region`"))
-		lastRowID = max(row[0] for row in cursor.execute("SELECT MAX(_ROWID_) FROM `db`.`biopolymer_region`"))
-		
-		# define a callback to store regions that can't be lifted over, for later deletion
-		def errorCallback(region):
-			trash.add( (region[0],) )
+		# stage the lifted regions in a temp table, so the source rows can be replaced
+		# in one set-based pass rather than updated and deleted one _ROWID_ at a time
+		cursor.execute("""
+CREATE TEMP TABLE `temp`.`_biopolymer_region_liftover` (
+  biopolymer_id INTEGER NOT NULL,
+  ldprofile_id INTEGER NOT NULL,
+  chr TINYINT NOT NULL,
+  posMin BIGINT NOT NULL,
+  posMax BIGINT NOT NULL,
+  source_id TINYINT NOT NULL
+)
+""")
 		
-		# we can't SELECT and UPDATE the same table at the same time,
-		# so read in batches of 2.5 million at a time based on _ROWID_
+		# read the regions in position order so liftOver can sweep the chains in one pass,
+		# and lift them in batches of 2.5 million at a time
 		# (for regions this will probably be all of them in one go, but just in case)
-		minRowID = firstRowID
-		maxRowID = minRowID + 2500000 - 1
-		while minRowID <= lastRowID:
-			sql = "SELECT _ROWID_, chr, posMin, posMax, NULL FROM `db`.`biopolymer_region`"
-			sql += " WHERE (_ROWID_ BETWEEN ? AND ?) AND source_id IN (%s)" % (','.join(str(i) for i in sourceIDs))
-			oldRegions = list(cursor.execute(sql, (minRowID,maxRowID)))
-			newRegions = self._loki.generateLiftOverRegions(oldHG, newHG, oldRegions, tally, errorCallback)
-			sql = "UPDATE OR REPLACE `db`.`biopolymer_region` SET chr = ?2, posMin = ?3, posMax = ?4 WHERE _ROWID_ = ?1 AND (1 OR ?5)"
-			cursor.executemany(sql, newRegions)
+		sql = "SELECT biopolymer_id, chr, posMin, posMax, ldprofile_id, source_id FROM `db`.`biopolymer_region`"
+		sql += " WHERE source_id IN (%s)" % (','.join(str(i) for i in sourceIDs))
+		sql += " ORDER BY chr, MIN(posMin,posMax)"
+		oldRegions = ( (row[0], row[1], row[2], row[3], row[4:]) for row in self._db.cursor().execute(sql) )
+		insertCursor = self._db.cursor()
+		sql = "INSERT INTO `temp`.`_biopolymer_region_liftover` (biopolymer_id, ldprofile_id, chr, posMin, posMax, source_id) VALUES (?,?,?,?,?,?)"
+		while True:
+			batch = list(itertools.islice(oldRegions, 2500000))
+			if not batch:
+				break
+			if self._liftOverBatch:
+				newRegions = self.generateBatchLiftOverRegions(oldHG, newHG, batch, tally)
+			else:
+				newRegions = self._loki.generateLiftOverRegions(oldHG, newHG, batch, tally, sorted=True)
+			insertCursor.executemany(sql, ( (r[0], r[4][0], r[1], r[2], r[3], r[4][1]) for r in newRegions ))
 			numLift += tally['lift']
 			numNull += tally['null']
-			if trash:
-				cursor.executemany("DELETE FROM `db`.`biopolymer_region` WHERE _ROWID_ = ?", trash)
-				trash.clear()
-			minRowID = maxRowID + 1
-			maxRowID = minRowID + 2500000 - 1
 		#foreach batch
 		
+		# swap the lifted regions in for the originals, in primary key order; as before,
+		# a lifted region replaces any other source's identical region
+		cursor.execute("DELETE FROM `db`.`biopolymer_region` WHERE source_id IN (%s)" % (','.join(str(i) for i in sourceIDs)))
+		cursor.execute("""
+INSERT OR REPLACE INTO `db`.`biopolymer_region` (biopolymer_id, ldprofile_id, chr, posMin, posMax, source_id)
+SELECT biopolymer_id, ldprofile_id, chr, posMin, posMax, source_id
+FROM `temp`.`_biopolymer_region_liftover`
+ORDER BY biopolymer_id, ldprofile_id, chr, posMin, posMax
+""")
+		cursor.execute("DROP TABLE `temp`.`_biopolymer_region_liftover`")
+		
 		self.log(" OK: %d regions lifted over, %d dropped\n" % (numLift,numNull))
 	#liftOverRegions()
 	
 	
+	def generateBatchLiftOverLoci(self, oldHG, newHG, loci, tally=None, errorCallback=None):
+		# loci=[ (label,chr,pos,extra), ... ]
+		# same results as Database.generateLiftOverLoci(), but lifted as one array batch
+		newChrs,newPositions,unmapped = self._loki.liftOverLocusBatch(oldHG, newHG, [l[1] for l in loci], [l[2] for l in loci])
+		numNull = sum(unmapped)
+		if tally != None:
+			tally['null'] = numNull
+			tally['lift'] = len(loci) - numNull
+		for i,locus in enumerate(loci):
+			if unmapped[i]:
+				if errorCallback:
+					errorCallback( (locus[0], locus[1], locus[2], locus[2], locus[3]) )
+			else:
+				yield (locus[0], newChrs[i], newPositions[i], locus[3])
+	#generateBatchLiftOverLoci()
+	
+	
+	def generateBatchLiftOverRegions(self, oldHG, newHG, regions, tally=None, errorCallback=None):
+		# regions=[ (label,chr,posMin,posMax,extra), ... ]
+		# same results as Database.generateLiftOverRegions(), but lifted as one array batch
+		newChrs,newStarts,newEnds,unmapped = self._loki.liftOverRegionBatch(oldHG, newHG, [r[1] for r in regions], [r[2] for r in regions], [r[3] for r in regions])
+		numNull = sum(unmapped)
+		if tally != None:
+			tally['null'] = numNull
+			tally['lift'] = len(regions) - numNull
+		for i,region in enumerate(regions):
+			if unmapped[i]:
+				if errorCallback:
+					errorCallback(region)
+			else:
+				yield (region[0], newChrs[i], newStarts[i], newEnds[i], region[4])
+	#generateBatchLiftOverRegions()
+	
+	
 	def cleanupSNPMerges(self):
 		self.log("verifying SNP merge records ...")
 		self.prepareTableForQuery('snp_merge')
@@ -1080,29 +1154,27 @@ FROM `db`.`group_biopolymer`
 			raise Exception("ERROR: could not determine database setting 'zone_size'")
 		dbc = self._db.cursor()
 		
-		# make sure all regions are correctly oriented
+		# make sure all regions are correctly oriented, and assign each one to its bin
 		dbc.execute("UPDATE `db`.`biopolymer_region` SET posMin = posMax, posMax = posMin WHERE posMin > posMax")
+		dbc.execute("UPDATE `db`.`biopolymer_region` SET bin = %s" % (self._loki.getRegionBinSQL(),))
 		
-		# define zone generator
-		def _zones(size, regions):
-			# regions=[ (id,chr,posMin,posMax),... ]
-			# yields:[ (id,chr,zone),... ]
-			for r in regions:
-				for z in range(int(r[2]/size),int(r[3]/size)+1):
-					yield (r[0],r[1],z)
-		#_zones()
-		
-		# feed all regions through the zone generator
+		# expand each biopolymer's extent on each chromosome into the zones it covers, all in one pass
 		self.prepareTableForUpdate('biopolymer_zone')
 		self.prepareTableForQuery('biopolymer_region')
 		dbc.execute("DELETE FROM `db`.`biopolymer_zone`")
-		dbc.executemany(
-			"INSERT OR IGNORE INTO `db`.`biopolymer_zone` (biopolymer_id,chr,zone) VALUES (?,?,?)",
-			_zones(
-				size,
-				self._db.cursor().execute("SELECT biopolymer_id,chr,MIN(posMin),MAX(posMax) FROM `db`.`biopolymer_region` GROUP BY biopolymer_id, chr")
-			)
-		)
+		dbc.execute("""
+INSERT OR IGNORE INTO `db`.`biopolymer_zone` (biopolymer_id,chr,zone)
+WITH RECURSIVE z (biopolymer_id,chr,zone,zoneMax) AS (
+  SELECT biopolymer_id, chr, MIN(posMin) / %d, MAX(posMax) / %d
+  FROM `db`.`biopolymer_region`
+  GROUP BY biopolymer_id, chr
+  UNION ALL
+  SELECT biopolymer_id, chr, zone + 1, zoneMax
+  FROM z
+  WHERE zone < zoneMax
+)
+SELECT biopolymer_id, chr, zone FROM z
+""" % (size,size))
 		
 		# clean up
 		self.prepareTableForQuery('biopolymer_zone')
@@ -1113,4 +1185,25 @@ FROM `db`.`group_biopolymer`
 	#updateBiopolymerZones()
 	
 	
+	def updateGroupClosure(self):
+		self.log("calculating group hierarchy closure ...")
+		dbc = self._db.cursor()
+		
+		# expand the direct containment relationships into every ancestor/descendant pair
+		self.prepareTableForUpdate('group_closure')
+		self.prepareTableForQuery('group_group')
+		dbc.execute("DELETE FROM `db`.`group_closure`")
+		sql = "INSERT INTO `db`.`group_closure` (ancestor_group_id,descendant_group_id,depth,relationships) VALUES (?,?,?,?)"
+		dbc.executemany(sql, self._loki.generateGroupClosure())
+		
+		# clean up
+		self.prepareTableForQuery('group_closure')
+		for row in dbc.execute("SELECT COUNT(), SUM(CASE WHEN depth > 0 THEN 1 ELSE 0 END), MAX(depth) FROM `db`.`group_closure`"):
+			numTotal = row[0]
+			numPairs = row[1] or 0
+			maxDepth = row[2] or 0
+		self.log(" OK: %d records (%d ancestor/descendant pairs, depth %d)\n" % (numTotal,numPairs,maxDepth))
+	#updateGroupClosure()
+	
+	
 #Updater
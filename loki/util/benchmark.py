@@ -0,0 +1,238 @@
+#!/usr/bin/env python
+
+"""
+Timing comparisons for LOKI query internals against a knowledge database file.
+
+Usage:
+    <code>python -m loki.util.benchmark <lokidb> liftover [--old 19] [--new 38] [--count 100000]</code>
+    <code>python -m loki.util.benchmark <lokidb> profiles [--count 100000]</code>
+"""
+
+import argparse
+import bisect
+import os
+import random
+import shutil
+import tempfile
+import time
+import urllib.parse
+
+from loki import loki_db
+
+
+def _timed(func, *args):
+	"""
+	Runs a function and measures its wall-clock duration.
+
+	Returns:
+	--------
+	tuple
+		(seconds, result)
+	"""
+	t0 = time.time()
+	ret = func(*args)
+	return (time.time() - t0, ret)
+#_timed()
+
+
+def _scanLiftOverChains(index, chrom, start, end):
+	"""
+	The original linear scan over every chain on a chromosome, in score order,
+	applied to the same index structure used by Database liftOver.
+
+	Returns:
+	--------
+	list
+		Segment tuples (chain_id, old_start, old_end, new_start, is_fwd, new_chr).
+	"""
+	chains = index.get(chrom)
+	if not chains:
+		return []
+	ret = []
+	for h in sorted(range(len(chains['chain_id'])), key=chains['rank'].__getitem__):
+		if start <= chains['end'][h] and end >= chains['start'][h]:
+			idx = bisect.bisect_right(chains['seg_start'], start, chains['seg_lo'][h], chains['seg_hi'][h]) - 1
+			idx = max(idx, chains['seg_lo'][h])
+			while (idx < chains['seg_hi'][h]) and (chains['seg_end'][idx] < start):
+				idx = idx + 1
+			while (idx < chains['seg_hi'][h]) and (chains['seg_start'][idx] <= end):
+				ret.append( (chains['chain_id'][h], chains['seg_start'][idx], chains['seg_end'][idx], chains['seg_new'][idx], chains['is_fwd'][h], chains['new_chr'][h]) )
+				idx = idx + 1
+	return ret
+#_scanLiftOverChains()
+
+
+def benchmarkLiftOverIndex(db, oldHG, newHG, count, seed=0):
+	"""
+	Compares chain lookup via the interval index against the linear chain scan.
+
+	Parameters:
+	-----------
+	db : loki_db.Database
+		Database with liftOver chains loaded.
+	oldHG, newHG : int
+		Genome assemblies to lift between.
+	count : int
+		Number of random loci to look up.
+	seed : int, optional
+		Random seed for the generated loci.
+	"""
+	t,index = _timed(db._getLiftOverChainIndex, oldHG, newHG)
+	print("index build: %1.3fs (%d chromosomes, %d chains)" % (t, len(index), sum(len(c['chain_id']) for c in index.values())))
+	if not index:
+		return
+
+	# draw loci from within the extent of the chains on each chromosome
+	rnd = random.Random(seed)
+	chroms = sorted(index)
+	loci = []
+	for n in range(count):
+		chrom = rnd.choice(chroms)
+		pos = rnd.randint(index[chrom]['start'][0], index[chrom]['maxend'][-1])
+		loci.append( (chrom, pos, pos + rnd.choice((0,0,0,100,10000))) )
+
+	tScan,scan = _timed(lambda: [ _scanLiftOverChains(index, l[0], l[1], l[2]) for l in loci ])
+	tIndex,indexed = _timed(lambda: [ list(db._generateApplicableLiftOverChains(oldHG, newHG, l[0], l[1], l[2])) for l in loci ])
+	if scan != indexed:
+		print("ERROR: indexed lookup results differ from linear scan")
+	print("linear scan: %1.3fs (%d lookups/s)" % (tScan, count / max(tScan, 1e-9)))
+	print("interval index: %1.3fs (%d lookups/s)" % (tIndex, count / max(tIndex, 1e-9)))
+	print("speedup: %1.1fx" % (tScan / max(tIndex, 1e-9)))
+#benchmarkLiftOverIndex()
+
+
+def _rebuildKnowledge(srcFile, dstFile, profile):
+	"""
+	Rebuilds a knowledge database file the way an update does: bulk loading every table
+	with its indices dropped, then indexing, analyzing and compacting the new file.
+
+	Returns:
+	--------
+	loki_db.Database
+		The rebuilt database, still attached.
+	"""
+	db = loki_db.Database(updating=True, profile=profile)
+	db.setVerbose(False)
+	db.attachDatabaseFile(dstFile, quiet=True)
+	cursor = db._db.cursor()
+	cursor.execute("ATTACH DATABASE ? AS `src`", ("file:%s?mode=ro" % (urllib.parse.quote(os.path.abspath(srcFile)),),))
+	tblList = [ tblName for tblName in db._schema['db'] if list(cursor.execute("SELECT 1 FROM `src`.`sqlite_master` WHERE type = 'table' AND name = ?", (tblName,))) ]
+	with db._db:
+		db.dropDatabaseIndices(None, 'db', tblList)
+		for tblName in tblList:
+			columns = ",".join("`%s`" % row[1] for row in cursor.execute("PRAGMA `db`.table_info(`%s`)" % (tblName,)))
+			cursor.execute("DELETE FROM `db`.`%s`" % (tblName,))
+			cursor.execute("INSERT INTO `db`.`%s` (%s) SELECT %s FROM `src`.`%s`" % (tblName,columns,columns,tblName))
+		db.createDatabaseIndices(None, 'db', tblList)
+	cursor.execute("DETACH DATABASE `src`")
+	db.optimizeDatabase()
+	return db
+#_rebuildKnowledge()
+
+
+def _runQueryMix(db, inputs):
+	"""
+	Runs each of a representative set of lookups over its inputs.
+
+	Returns:
+	--------
+	dict
+		{ query : (seconds, number of results) }
+	"""
+	queries = (
+		('snps by rs', db.generateSNPLociByRSes, inputs['rses']),
+		('snps by region', db.generateSNPsByRegions, inputs['regions']),
+		('biopolymers by name', db.generateBiopolymerIDsByIdentifiers, inputs['names']),
+		('biopolymers by region', db.generateBiopolymersByRegions, inputs['regions']),
+		('groups by name', db.generateGroupIDsByIdentifiers, inputs['groups']),
+		('biopolymers by search', db.generateBiopolymerIDsBySearch, inputs['texts']),
+	)
+	ret = dict()
+	for name,func,args in queries:
+		ret[name] = _timed(lambda: sum(1 for row in func(args)))
+	return ret
+#_runQueryMix()
+
+
+def benchmarkStorageProfiles(dbFile, count, seed=0):
+	"""
+	Compares the storage profiles on a build workload and a representative query mix.
+
+	The build workload rebuilds the knowledge database file (such as a test-data build) under
+	each writable profile; the query mix then looks up random SNPs, biopolymers and groups
+	drawn from the file under every profile, first cold and then again with warm caches.
+
+	Parameters:
+	-----------
+	dbFile : str
+		Knowledge database file, which must be up to date so it can also be opened read-only.
+	count : int
+		Number of random inputs for each lookup.
+	seed : int, optional
+		Random seed for the generated inputs.
+	"""
+	profiles = sorted(loki_db.Database._storageProfiles)
+	tempDir = tempfile.mkdtemp(prefix='loki_benchmark.', dir=os.path.dirname(os.path.abspath(dbFile)))
+	try:
+		for profile in profiles:
+			if loki_db.Database._storageProfiles[profile]['readOnly']:
+				continue
+			path = os.path.join(tempDir, profile + '.db')
+			t,db = _timed(_rebuildKnowledge, dbFile, path, profile)
+			pageSize = db._db.cursor().execute("PRAGMA `db`.page_size").fetchone()[0]
+			db.detachDatabaseFile(quiet=True)
+			print("build %-10s: %7.3fs (%d byte pages, %d bytes)" % (profile, t, pageSize, os.path.getsize(path)))
+			os.remove(path)
+	finally:
+		shutil.rmtree(tempDir, ignore_errors=True)
+
+	# draw inputs from what the file actually contains
+	db = loki_db.Database()
+	db.setVerbose(False)
+	db.attachDatabaseFile(dbFile, quiet=True)
+	cursor = db._db.cursor()
+	rnd = random.Random(seed)
+	def sample(sql):
+		rows = list(cursor.execute(sql + " LIMIT 1000000"))
+		return [ rnd.choice(rows) for n in range(count) ] if rows else []
+	loci = sample("SELECT chr, pos FROM `db`.`snp_locus`") or sample("SELECT chr, posMin FROM `db`.`biopolymer_region`")
+	inputs = {
+		'rses': sorted( (str(row[0]), None) for row in sample("SELECT rs FROM `db`.`snp_locus`") ),
+		'regions': [ (None, row[0], row[1], row[1] + rnd.choice((0,100,10000)), None) for row in loci ],
+		'names': [ (None, row[0], None) for row in sample("SELECT name FROM `db`.`biopolymer_name`") ],
+		'groups': [ (None, row[0], None) for row in sample("SELECT name FROM `db`.`group_name`") ],
+		'texts': [ (row[0][:6], None) for row in sample("SELECT label FROM `db`.`biopolymer`")[:max(count // 1000, 1)] ],
+	}
+	db.detachDatabaseFile(quiet=True)
+
+	for profile in profiles:
+		db = loki_db.Database(profile=profile)
+		db.setVerbose(False)
+		db.attachDatabaseFile(dbFile, quiet=True)
+		if not db._dbFile:
+			print("query %-10s: could not open the knowledge database file" % (profile,))
+			continue
+		for run in ('cold','warm'):
+			results = _runQueryMix(db, inputs)
+			print("query %-10s %s: %7.3fs (%s)" % (profile, run, sum(r[0] for r in results.values()), ", ".join("%s %1.3fs" % (name, r[0]) for name,r in results.items())))
+		db.detachDatabaseFile(quiet=True)
+#benchmarkStorageProfiles()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="LOKI query benchmarks")
+	parser.add_argument('knowledge', type=str, help="the knowledge database file to use")
+	parser.add_argument('benchmark', type=str, choices=('liftover','profiles'), help="the benchmark to run")
+	parser.add_argument('--old', type=int, default=19, help="old UCSC genome build (default: 19)")
+	parser.add_argument('--new', type=int, default=38, help="new UCSC genome build (default: 38)")
+	parser.add_argument('--count', type=int, default=100000, help="number of random inputs (default: 100000)")
+	args = parser.parse_args()
+
+	if args.benchmark == 'profiles':
+		benchmarkStorageProfiles(args.knowledge, args.count)
+	else:
+		db = loki_db.Database()
+		db.setVerbose(False)
+		db.attachDatabaseFile(args.knowledge)
+		benchmarkLiftOverIndex(db, args.old, args.new, args.count)
+#__main__
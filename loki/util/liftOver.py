@@ -1,7 +1,38 @@
 #!/usr/bin/env python
 
+"""
+Lift genomic coordinates in BED or VCF files between genome assemblies using the
+liftOver chains in a LOKI knowledge database.
+
+Usage:
+    <code>python -m loki.util.liftOver <input> <lokidb> <output> <unmap> [oldhg=19] [newhg=38] [options]</code>
+
+Input is streamed in chunks; each chunk is split by chromosome across a pool of worker
+processes, and mapped and unmapped lines are written in input order.  Any of the files
+may be '-' for stdin/stdout/stderr, and names ending in '.gz' are read or written gzipped.
+
+Options:
+    --format {bed,vcf}  input format (default: from the input file name, otherwise bed)
+    --processes N       number of worker processes (default: all CPUs; 1 to work in this process)
+    --chunk-size N      number of input lines per chunk (default: 100000)
+
+BED start positions are 0-based and VCF positions are 1-based, as usual; only the chromosome
+and position columns are rewritten (BED thickStart/thickEnd and VCF alleles are left as they are).
+Header lines are copied to the mapped output, and lines which cannot be lifted (or parsed)
+are copied unchanged to the unmapped output.
+"""
+
+import argparse
+import array
+import collections
+import concurrent.futures
+import gzip
+import itertools
+import multiprocessing
+import os
 import sys
-import bisect
+
+from loki import loki_db
 
 ##################################################
 # Note on included docstring
@@ -14,8 +45,8 @@ class liftOver(object):
 	"""
 	A class for lifting over genomic coordinates between assemblies.
 
-	This class provides methods to map genomic regions from one assembly
-	(old_ucschg) to another (new_ucschg) using chain data stored in a database.
+	This class maps genomic regions from one assembly (old_ucschg) to another
+	(new_ucschg) using the liftOver engine of a LOKI database.
 
 	Attributes:
 	-----------
@@ -25,34 +56,16 @@ class liftOver(object):
 		Version of the old assembly (e.g., 19).
 	_new_ucschg : int
 		Version of the new assembly (e.g., 38).
-	_cached : bool
-		Flag indicating whether to use cached chain data for optimization.
-	_minFrac : float
-		Minimum fraction of the region that must be mapped for successful liftOver.
 
 	Methods:
 	--------
 	__init__(db, old_ucschg, new_ucschg, cached=False):
 		Initializes a liftOver object with the provided parameters.
 
-	_initChains():
-		Initializes the cached chain data from the database.
-
-	_findChains(chrom, start, end):
-		Finds chain segments that overlap with the given region.
-
 	liftRegion(chrom, start, end):
 		Lifts a genomic region from old_ucschg to new_ucschg assembly.
-
-	_mapRegion(region, first_seg, end_seg, total_mapped_sz):
-		Maps a region using chain segment data.
-
-	Notes:
-	------
-	This class assumes chain data is stored in the LOKI database and uses
-	this data to perform liftOver operations between assemblies.
 	"""
-	
+
 	def __init__(self, db, old_ucschg, new_ucschg, cached=False):
 		"""
 		Initializes a liftOver object with the provided parameters.
@@ -66,109 +79,23 @@ class liftOver(object):
 		new_ucschg : int
 			Version of the new assembly (e.g., 38).
 		cached : bool, optional
-			Flag indicating whether to use cached chain data (default is False).
+			Ignored; the database always keeps an indexed copy of the chains.
 		"""
 		# db is a loki_db.Database object
 		self._db = db
 		self._old_ucschg = old_ucschg
 		self._new_ucschg = new_ucschg
-		self._cached = cached
-		self._minFrac = 0.95
-		if self._cached:
-			self._cached_data = {}
-			self._cached_keys = {}
-			self._chainData = self._initChains()
-	
-	def _initChains(self):
-		"""
-		Initializes the cached chain data from the database.
+	#__init__()
 
-		This method constructs a cached representation of chain data for
-		optimized region mapping.
-		"""
-		for row in self._db._db.cursor().execute("SELECT chain_id, old_chr, score, chain.old_start, " + 
-			"chain.old_end, chain.new_start, is_fwd, new_chr, " + 
-			"chain_data.old_start, chain_data.old_end, chain_data.new_start " + 
-			"FROM db.chain INNER JOIN db.chain_data USING (chain_id) " +
-			"WHERE old_ucschg=? AND new_ucschg=?" + 
-			"ORDER BY old_chr, score DESC, chain_data.old_start",
-			(self._old_ucschg,self._new_ucschg)):
-				
-			chain = (row[2], row[3], row[4], row[5], row[6], row[7], row[0])
-			chr = row[1]
-					
-			if chr not in self._cached_data:
-				self._cached_data[chr] = {chain: []}
-				self._cached_keys[chr] = [chain]
-			elif chain not in self._cached_data[chr]:
-				self._cached_data[chr][chain] = []
-				self._cached_keys[chr].append(chain)
-			
-			self._cached_data[chr][chain].append((row[8],row[9],row[10]))
-		
-		# Sort the chains by score
-		for k in self._cached_keys:
-			self._cached_keys[k].sort(reverse=True)
-
-			
-				
-	def _findChains(self, chrom, start, end):
-		"""
-		Finds chain segments that overlap with the given region.
-
-		Parameters:
-		-----------
-		chrom : str
-			Chromosome name or identifier.
-		start : int
-			Start position of the region.
-		end : int
-			End position of the region.
 
-		Yields:
-		------
-		tuple:
-			Chain segment details including chain_id, old_start, old_end,
-			new_start, is_fwd, new_chr.
-
-		Notes:
-		------
-		This method queries the database or uses cached data to find chain
-		segments that overlap with the specified region.
-		"""
-		if not self._cached:
-			for row in self._db._db.cursor().execute(
-			"SELECT chain.chain_id, chain_data.old_start, chain_data.old_end, chain_data.new_start, is_fwd, new_chr " +
-			"FROM chain INNER JOIN chain_data ON chain.chain_id = chain_data.chain_id " +
-			"WHERE old_ucschg=? AND new_ucschg=? AND old_chr=? AND chain.old_end>=? AND chain.old_start<? AND chain_data.old_end>=? AND chain_data.old_start<? " +
-			"ORDER BY score DESC",
-			(self._old_ucschg, self._new_ucschg, chrom, start, end, start, end)):
-				yield row
-		else:
-			for c in self._cached_keys.get(chrom, []):
-				# if the region overlaps the chain...
-				if start <= c[2] and end >= c[1]:
-					data = self._cached_data[chrom][c]
-					idx = bisect.bisect(data, (start, sys.maxint, sys.maxint))
-					if idx:
-						idx = idx-1
-
-					if idx < len(data) - 1 and start == data[idx + 1]:
-						idx = idx + 1
-					
-					while idx < len(data) and data[idx][0] < end:
-						yield (c[-1], data[idx][0], data[idx][1], data[idx][2], c[4], c[5])
-						idx = idx + 1
-					
-					
 	def liftRegion(self, chrom, start, end):
 		"""
 		Lifts a genomic region from old_ucschg to new_ucschg assembly.
 
 		Parameters:
 		-----------
-		chrom : str
-			Chromosome name or identifier.
+		chrom : int
+			Chromosome number.
 		start : int
 			Start position of the region.
 		end : int
@@ -178,176 +105,247 @@ class liftOver(object):
 		--------
 		tuple or None:
 			Mapped region (new_chr, new_start, new_end) or None if unable to map.
-
-		Notes:
-		------
-		This method uses chain data to map the specified genomic region from
-		the old_ucschg assembly to the new_ucschg assembly.
-		"""
-		# We need to actually lift regions to detect dropped sections
-		is_region = True
-		
-		# If the start and end are swapped, reverse them, please
-		if start > end:
-			(start, end) = (end, start)
-		elif start == end:
-			is_region = False
-			end = start + 1	
-		
-		ch_list = self._findChains(chrom, start, end)
-		
-		# This will be a tuple of (start, end) of the mapped region
-		# If the function returns "None", then it was unable to map
-		# the region into the new assembly
-		mapped_reg = None
-		
-		curr_chain = None
-		
-		total_mapped_sz = 0
-		first_seg = None
-		end_seg = None
-		for seg in ch_list:
-			if curr_chain is None:
-				curr_chain = seg[0]
-				first_seg = seg
-				end_seg = seg
-				total_mapped_sz = seg[2] - seg[1]
-			elif seg[0] != curr_chain:
-				mapped_reg = self._mapRegion((start, end), first_seg, end_seg, total_mapped_sz)
-				if not mapped_reg:
-					first_seg = seg
-					end_seg = seg
-					total_mapped_sz = seg[2] - seg[1]
-				else:
-					break
-			else:
-				end_seg = seg
-				total_mapped_sz = total_mapped_sz + seg[2] - seg[1]
-				
-		if not mapped_reg and first_seg is not None:
-			mapped_reg = self._mapRegion((start, end), first_seg, end_seg, total_mapped_sz)
-		
-		if mapped_reg and not is_region:
-			mapped_reg = (mapped_reg[0], mapped_reg[1], mapped_reg[1]) #bug?
-		
-		return mapped_reg
-		
-				
-				
-
-	def _mapRegion(self, region, first_seg, end_seg, total_mapped_sz):
 		"""
-		Maps a region using chain segment data.
+		for r in self._db.generateLiftOverRegions(self._old_ucschg, self._new_ucschg, [(None, chrom, start, end, None)]):
+			return (r[1], r[2], r[3])
+		return None
+	#liftRegion()
 
-		Parameters:
-		-----------
-		region : tuple
-			Genomic region (start, end) to map.
-		first_seg : tuple
-			First segment of the chain (chain_id, old_start, old_end, new_start, is_fwd, new_chr).
-		end_seg : tuple
-			Last segment of the chain (chain_id, old_start, old_end, new_start, is_fwd, new_chr).
-		total_mapped_sz : int
-			Total size of mapped segments.
+#liftOver
 
-		Returns:
-		--------
-		tuple or None:
-			Mapped region (new_chr, new_start, new_end) or None if unable to map.
 
-		Notes:
-		------
-		This method calculates the mapped region based on the chain segments
-		and verifies if the mapped fraction meets the minimum required.
-		"""
-		mapped_reg = None
-		
-		# The front and end differences are the distances from the
-		# beginning of the segment.
-		
-		# The front difference should be >= 0 and <= size of 1st segment
-		front_diff = max(0, min(region[0] - first_seg[1], first_seg[2] - first_seg[1]))
-		
-		# The end difference should be similar, but w/ last
-		end_diff = max(0, min(region[1] - end_seg[1], end_seg[2] - end_seg[1]))
-		
-		# Now, if we are moving forward, we add the difference
-		# to the new_start, backward, we subtract
-		# Also, at this point, if backward, swap start/end
-		if first_seg[4]:
-			new_start = first_seg[3] + front_diff
-			new_end = end_seg[3] + end_diff
+##################################################
+# worker processes
+
+
+_workerDB = None
+
+
+def _initLiftOverWorker(dbFile, shared, lock):
+	"""
+	Opens the knowledge database in a worker process.
+
+	Parameters:
+	-----------
+	dbFile : str
+		Knowledge database file.
+	shared : bool
+		Whether to map the chain index from the shared memory block prepared by the parent process.
+	lock : multiprocessing.Lock
+		Lock held while attaching, since the schema audit briefly writes to the database file
+		and concurrent audits would deadlock.
+	"""
+	global _workerDB
+	_workerDB = loki_db.Database()
+	_workerDB.setVerbose(False)
+	_workerDB.setLiftOverCacheShared(shared)
+	with lock:
+		_workerDB.attachDatabaseFile(dbFile)
+#_initLiftOverWorker()
+
+
+def _liftOverChromosome(oldHG, newHG, chrom, starts, ends):
+	"""
+	Lifts one chromosome's regions from a chunk of input in a worker process.
+
+	Returns:
+	--------
+	tuple
+		(newChrs, newStarts, newEnds, unmapped), as from Database.liftOverRegionBatch().
+	"""
+	return _workerDB.liftOverRegionBatch(oldHG, newHG, [chrom] * len(starts), starts, ends)
+#_liftOverChromosome()
+
+
+##################################################
+# input/output formats
+
+
+def _parseLine(line, fileFormat):
+	"""
+	Parses the coordinates of one input line.
+
+	Returns:
+	--------
+	tuple or None or False
+		(fields, chromosome number, chr prefix, start, end) in LOKI's 1-based closed coordinates,
+		None for header lines, or False for lines which cannot be parsed.
+	"""
+	if (not line.strip()) or line.startswith('#') or ((fileFormat == 'bed') and line.startswith(('track','browser'))):
+		return None
+	fields = line.split('\t')
+	if (len(fields) < 3) and (fileFormat == 'bed'):
+		fields = line.split()
+	prefix = ''
+	chrom = fields[0]
+	if chrom.lower().startswith('chr'):
+		prefix,chrom = chrom[:3],chrom[3:]
+	try:
+		if fileFormat == 'vcf':
+			start = end = int(fields[1])
 		else:
-			new_start = end_seg[3] - end_diff
-			new_end = first_seg[3] - front_diff
-				
-		# old_startHere, detect if we have mapped a sufficient fraction 
-		# of the region.  liftOver uses a default of 95%
-		mapped_size = total_mapped_sz - front_diff - (end_seg[2] - end_seg[1]) + end_diff
-		
-		if mapped_size / float(region[1] - region[0]) >= self._minFrac:
-			mapped_reg = (first_seg[5], new_start, new_end)
-			
-		return mapped_reg
+			start,end = int(fields[1]) + 1, int(fields[2])
+	except (IndexError, ValueError):
+		return False
+	return (fields, loki_db.Database.chr_num.get(chrom, -1), prefix, start, end)
+#_parseLine()
 
-if __name__ == "__main__":
-	from loki import loki_db
-	
-	if len(sys.argv) < 5:
-		print "usage: %s <input> <lokidb> <output> <unmap> [oldhg=19] [newhg=38]" % (sys.argv[0],)
-		sys.exit(2)
-	
-	db = loki_db.Database(sys.argv[2])
-	
-	old = int(sys.argv[5]) if (len(sys.argv) > 5) else 19
-	new = int(sys.argv[6]) if (len(sys.argv) > 6) else 38
-	#lo = liftOver(db, old, new, False)
-	f = (sys.stdin  if (sys.argv[1] == '-') else file(sys.argv[1],'r'))
-	m = (sys.stdout if (sys.argv[3] == '-') else file(sys.argv[3],'w'))
-	u = (sys.stderr if (sys.argv[4] == '-') else file(sys.argv[4],'w'))
-	
-	def generateInputs(f):
-		"""
-		Generates input data for liftOver region conversion.
 
-		Parameters:
-		-----------
-		f : file object
-			Input file object containing genomic coordinates.
-
-		Yields:
-		------
-		tuple:
-			Tuple containing processed genomic region information:
-			(formatted_line, chromosome_number, start_position, end_position, None).
-
-		Notes:
-		------
-		This function reads lines from the input file object 'f', processes
-		genomic coordinates, replaces spaces and tabs with colons, adjusts
-		chromosome names, and retrieves chromosome numbers from 'db'.
-		"""
-		for l in f:
-			wds = l.split()
-			if wds[0].lower().startswith('chr'):
-				wds[0] = wds[0][3:]
-			yield (l.strip().replace(" ",":").replace("\t",":"), db.chr_num.get(wds[0],-1), int(wds[1]), int(wds[2]), None)
-	
-	def errorCallback(r):
-		"""
-		Error callback function for handling liftOver errors.
+def _formatLine(parsed, fileFormat, newChr, newStart, newEnd):
+	"""
+	Rewrites the coordinates of one parsed input line.
 
-		Parameters:
-		-----------
-		r : tuple
-			Tuple containing error details to be processed.
+	Returns:
+	--------
+	str
+		Output line, without a line terminator.
+	"""
+	fields = list(parsed[0])
+	fields[0] = parsed[2] + loki_db.Database.chr_name.get(newChr, str(newChr))
+	if fileFormat == 'vcf':
+		fields[1] = str(newStart)
+	else:
+		fields[1] = str(newStart - 1)
+		fields[2] = str(newEnd)
+	return '\t'.join(fields)
+#_formatLine()
 
-		Notes:
-		------
-		This function prints the error details to the stderr stream 'u'
-		in a tab-separated format.
-		"""
-		print >> u, "\t".join(str(c) for c in r)
-	
-	for r in db.generateLiftOverRegions(old, new, generateInputs(f), errorCallback=errorCallback):
-		print >> m, "chr%s\t%s\t%d\t%d" % (db.chr_name.get(r[1],r[1]), r[0], r[2], r[3])
+
+def _openFile(path, mode):
+	"""
+	Opens an input or output text file, where '-' is stdin or stdout and '.gz' files are (de)compressed.
+	"""
+	if path == '-':
+		return sys.stdin if ('r' in mode) else sys.stdout
+	if path.endswith('.gz'):
+		return gzip.open(path, mode + 't')
+	return open(path, mode)
+#_openFile()
+
+
+##################################################
+# liftOver pipeline
+
+
+def generateLiftOverLines(dbFile, oldHG, newHG, lines, fileFormat='bed', processes=None, chunkSize=100000, shared=True):
+	"""
+	Lifts over a stream of BED or VCF lines, in chunks split by chromosome across worker processes.
+
+	Parameters:
+	-----------
+	dbFile : str
+		Knowledge database file.
+	oldHG, newHG : int
+		Genome assemblies to lift between.
+	lines : iterable of str
+		Input lines.
+	fileFormat : str, optional
+		'bed' or 'vcf'.
+	processes : int or None, optional
+		Number of worker processes (None for all CPUs, 1 to work in this process).
+	chunkSize : int, optional
+		Number of input lines per chunk; at most two chunks per worker are held in memory at once.
+	shared : bool, optional
+		Whether workers map one copy of the chain index from shared memory, rather than each
+		loading their own.
+
+	Yields:
+	-------
+	tuple
+		(mapped, line) for each input line in input order, where mapped is True for lifted
+		or header lines and False for lines which could not be lifted.
+	"""
+	# prepare the chain index once up front, so the workers only have to map it
+	db = loki_db.Database()
+	db.setVerbose(False)
+	db.setLiftOverCacheShared(shared and (processes != 1))
+	db.attachDatabaseFile(dbFile)
+	db._getLiftOverChainIndex(oldHG, newHG)
+
+	pool = None
+	workers = processes or os.cpu_count() or 1
+	if processes == 1:
+		def lift(*args):
+			f = concurrent.futures.Future()
+			f.set_result(db.liftOverRegionBatch(args[0], args[1], [args[2]] * len(args[3]), args[3], args[4]))
+			return f
+	else:
+		pool = concurrent.futures.ProcessPoolExecutor(workers, initializer=_initLiftOverWorker, initargs=(dbFile, shared, multiprocessing.Lock()))
+		def lift(*args):
+			return pool.submit(_liftOverChromosome, *args)
+
+	def finishChunk(chunk, parsed, jobs):
+		results = dict()
+		for chrom,(idxs,job) in jobs.items():
+			newChrs,newStarts,newEnds,unmapped = job.result()
+			for n,i in enumerate(idxs):
+				if not unmapped[n]:
+					results[i] = (newChrs[n], newStarts[n], newEnds[n])
+		for i,line in enumerate(chunk):
+			if parsed[i] == None:
+				yield (True, line)
+			elif i in results:
+				yield (True, _formatLine(parsed[i], fileFormat, *results[i]))
+			else:
+				yield (False, line)
+	#finishChunk()
+
+	try:
+		pending = collections.deque()
+		lines = iter(lines)
+		while True:
+			chunk = [ line.rstrip('\r\n') for line in itertools.islice(lines, chunkSize) ]
+			if not chunk:
+				break
+			parsed = [ _parseLine(line, fileFormat) for line in chunk ]
+			groups = collections.defaultdict(lambda: (array.array('q'), array.array('q'), array.array('q')))
+			for i,p in enumerate(parsed):
+				if p and (p[1] > 0):
+					g = groups[p[1]]
+					g[0].append(i)
+					g[1].append(p[3])
+					g[2].append(p[4])
+			jobs = { chrom:(g[0], lift(oldHG, newHG, chrom, g[1], g[2])) for chrom,g in groups.items() }
+			pending.append( (chunk, parsed, jobs) )
+
+			# keep a bounded number of chunks in flight
+			while len(pending) > 2 * workers:
+				yield from finishChunk(*pending.popleft())
+		#while input
+		while pending:
+			yield from finishChunk(*pending.popleft())
+	finally:
+		if pool:
+			pool.shutdown(cancel_futures=True)
+		db.clearLiftOverCache(files=False)
+#generateLiftOverLines()
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Lift BED or VCF coordinates between genome assemblies using a LOKI knowledge database")
+	parser.add_argument('input', type=str, help="input BED or VCF file, or '-' for stdin")
+	parser.add_argument('knowledge', type=str, help="the knowledge database file to use")
+	parser.add_argument('output', type=str, help="output file for lifted lines, or '-' for stdout")
+	parser.add_argument('unmapped', type=str, help="output file for lines which could not be lifted, or '-' for stderr")
+	parser.add_argument('oldhg', type=int, nargs='?', default=19, help="old UCSC genome build (default: 19)")
+	parser.add_argument('newhg', type=int, nargs='?', default=38, help="new UCSC genome build (default: 38)")
+	parser.add_argument('--format', type=str, choices=('bed','vcf'), default=None, help="input format (default: from the input file name, otherwise bed)")
+	parser.add_argument('--processes', type=int, default=None, help="number of worker processes (default: all CPUs)")
+	parser.add_argument('--chunk-size', type=int, default=100000, help="number of input lines per chunk (default: 100000)")
+	args = parser.parse_args()
+
+	fileFormat = args.format
+	if not fileFormat:
+		fileFormat = 'vcf' if args.input.lower().endswith(('.vcf','.vcf.gz')) else 'bed'
+	if not os.path.exists(args.knowledge):
+		sys.exit("ERROR: knowledge database file '%s' not found" % (args.knowledge,))
+
+	f = _openFile(args.input, 'r')
+	m = _openFile(args.output, 'w')
+	u = sys.stderr if (args.unmapped == '-') else _openFile(args.unmapped, 'w')
+	for mapped,line in generateLiftOverLines(args.knowledge, args.oldhg, args.newhg, f, fileFormat, args.processes, args.chunk_size):
+		(m if mapped else u).write(line + '\n')
+	for h in (f, m, u):
+		if h not in (sys.stdin, sys.stdout, sys.stderr):
+			h.close()
+#__main__
@@ -0,0 +1,343 @@
+#!/usr/bin/env python
+
+"""
+A long-running local query server which keeps a LOKI knowledge database, its connection pool
+and its caches warm between jobs, and a client which mirrors the Database query methods.
+
+Usage:
+    <code>python -m loki.util.server <lokidb> [--port 7117] [--connections N] [--liftover 19:38] [--profile serve] [--identifier-cache]</code>
+
+Requests are HTTP POSTs to localhost with a JSON body of the method's keyword arguments, one
+per Database method, and answers carry the method's results along with any tally and error
+callbacks.  Identical requests which arrive while one is already running share its answer.
+
+    client = Client(port=7117)
+    for rs,extra,chrom,pos in client.generateSNPLociByRSes(rses, tally=tally):
+        ...
+"""
+
+import argparse
+import array
+import concurrent.futures
+import http.client
+import http.server
+import inspect
+import json
+import os
+import sys
+import threading
+
+from loki import loki_db
+
+
+# Database methods which yield rows, and those which return one value
+_generators = frozenset((
+	'generateCurrentRSesByRSes', 'generateSNPLociByRSes', 'generateSNPsByRegions',
+	'generateBiopolymersByIDs', 'generateBiopolymerIDsByIdentifiers', 'generateTypedBiopolymerIDsByIdentifiers',
+	'generateBiopolymerIDsBySearch', 'generateTypedBiopolymerIDsBySearch', 'generateBiopolymerNameStats',
+	'generateBiopolymersByRegions', 'generateBiopolymersByPositions',
+	'generateGroupsByIDs', 'generateGroupIDsByIdentifiers', 'generateTypedGroupIDsByIdentifiers',
+	'generateGroupIDsBySearch', 'generateTypedGroupIDsBySearch', 'generateGroupNameStats',
+	'generateGroupAncestorsByIDs', 'generateGroupDescendantsByIDs', 'generateBiopolymerIDsByGroupIDs',
+	'generateGroupOverlapCounts', 'generateGroupOverlaps',
+	'generateLiftOverLoci', 'generateLiftOverRegions',
+))
+_calls = frozenset((
+	'getLDProfileIDs', 'getNamespaceIDs', 'getRelationshipIDs', 'getRoleIDs', 'getSourceIDs', 'getTypeIDs', 'getSubtypeIDs',
+	'getUCSChgByGRCh', 'countGroupBiopolymers', 'getGroupBiopolymerIDs', 'liftOverRegionBatch',
+))
+
+
+def _toJSON(value):
+	"""
+	Converts the values JSON cannot encode directly (arrays, byte masks, sets, generators) into lists.
+	"""
+	if isinstance(value, (array.array, bytes, bytearray, set, frozenset)) or inspect.isgenerator(value) or isinstance(value, (map, filter, zip)):
+		return list(value)
+	raise TypeError("cannot encode %s" % (type(value).__name__,))
+#_toJSON()
+
+
+def _encode(value):
+	return json.dumps(value, default=_toJSON, separators=(',',':'), sort_keys=True).encode('utf-8')
+#_encode()
+
+
+##################################################
+# server
+
+
+class QueryServer(http.server.ThreadingHTTPServer):
+	"""
+	A localhost HTTP server answering Database queries on a pool of read-only connections.
+
+	Attributes:
+	-----------
+	db : loki_db.Database
+		The knowledge database, with its connection pool open.
+	stats : dict
+		Counts of 'requests' answered, and of those 'coalesced' into an identical running request.
+	"""
+
+	def __init__(self, db, port=7117, connections=None, liftOver=(), identifierCache=False):
+		"""
+		Opens the connection pool, preloads the requested caches on every connection and starts listening.
+
+		Parameters:
+		-----------
+		db : loki_db.Database
+			A Database with a knowledge database file attached.
+		port : int, optional
+			The localhost port to listen on.
+		connections : int or None, optional
+			The number of pooled connections (default: the number of CPUs).
+		liftOver : iterable of (int, int), optional
+			(oldHG, newHG) pairs whose liftOver chain indices are loaded up front.
+		identifierCache : bool, optional
+			Whether identifier lookups use (and preload) the in-memory biopolymer ID index.
+		"""
+		db.setBiopolymerIDCache(identifierCache)
+		db.setLiftOverCacheShared(True)
+		db.openConnectionPool(connections or os.cpu_count() or 1)
+		self.db = db
+		self.stats = {'requests':0, 'coalesced':0}
+		self._running = dict()
+		self._runningLock = threading.Lock()
+
+		# check out every connection at once, so each one gets its own caches loaded
+		conns = [ db.checkoutConnection() for n in range(db.getConnectionPoolCapacity()) ]
+		try:
+			for conn in conns:
+				for oldHG,newHG in liftOver:
+					conn._getLiftOverChainIndex(oldHG, newHG)
+				if identifierCache:
+					conn._getBiopolymerIDIndex()
+		finally:
+			for conn in conns:
+				db.checkinConnection(conn)
+
+		super().__init__(('127.0.0.1', port), _QueryRequestHandler)
+	#__init__()
+
+
+	def answer(self, method, kwargs):
+		"""
+		Runs a query, or waits for an identical one which is already running.
+
+		Parameters:
+		-----------
+		method : str
+			The Database method name.
+		kwargs : dict
+			The method's keyword arguments, as decoded from the request.
+
+		Returns:
+		--------
+		bytes
+			The encoded answer: {"result": ...} with "tally" and "errors" for generator methods.
+		"""
+		key = (method, _encode(kwargs))
+		with self._runningLock:
+			self.stats['requests'] += 1
+			future = self._running.get(key)
+			if future:
+				self.stats['coalesced'] += 1
+				owner = False
+			else:
+				future = self._running[key] = concurrent.futures.Future()
+				owner = True
+		if not owner:
+			return future.result()
+
+		try:
+			with self.db.connection() as conn:
+				func = getattr(conn, method)
+				if method in _generators:
+					tally = dict()
+					errors = list()
+					params = inspect.signature(func).parameters
+					if 'tally' in params:
+						kwargs['tally'] = tally
+					if 'errorCallback' in params:
+						kwargs['errorCallback'] = lambda *args: errors.append(args)
+					answer = {'result':list(func(**kwargs)), 'tally':tally, 'errors':errors}
+				else:
+					answer = {'result':func(**kwargs)}
+			future.set_result(_encode(answer))
+		except BaseException as e:
+			future.set_exception(e)
+		finally:
+			with self._runningLock:
+				del self._running[key]
+		return future.result()
+	#answer()
+
+#QueryServer
+
+
+class _QueryRequestHandler(http.server.BaseHTTPRequestHandler):
+
+	protocol_version = 'HTTP/1.1'
+
+
+	def _reply(self, status, body):
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+	#_reply()
+
+
+	def do_GET(self):
+		if self.path == '/status':
+			self._reply(200, _encode({'file':self.server.db._dbFile, 'connections':self.server.db.getConnectionPoolCapacity(), 'stats':self.server.stats}))
+		else:
+			self._reply(404, _encode({'error':"ERROR: unknown path '%s'" % (self.path,)}))
+	#do_GET()
+
+
+	def do_POST(self):
+		method = self.path.strip('/')
+		body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+		if (method not in _generators) and (method not in _calls):
+			self._reply(404, _encode({'error':"ERROR: '%s' is not a knowledge database query" % (method,)}))
+			return
+		try:
+			kwargs = json.loads(body or b'{}')
+			answer = self.server.answer(method, kwargs)
+		except Exception as e:
+			self._reply(500, _encode({'error':str(e)}))
+			return
+		self._reply(200, answer)
+	#do_POST()
+
+
+	def log_message(self, format, *args):
+		pass
+	#log_message()
+
+#_QueryRequestHandler
+
+
+##################################################
+# client
+
+
+class Client(object):
+	"""
+	A client for a QueryServer, with the same query methods and signatures as loki_db.Database.
+
+	Generator methods return an iterator over the result rows (as tuples), fill in any tally dict
+	and replay any error callbacks in order; other methods return their value as decoded from JSON.
+	"""
+
+	def __init__(self, host='127.0.0.1', port=7117, timeout=None):
+		"""
+		Parameters:
+		-----------
+		host : str, optional
+			The server's host.
+		port : int, optional
+			The server's port.
+		timeout : float or None, optional
+			Seconds to wait for an answer, or None to wait indefinitely.
+		"""
+		self._host = host
+		self._port = port
+		self._timeout = timeout
+		self._local = threading.local()
+	#__init__()
+
+
+	def _request(self, httpMethod, path, body=None):
+		# one persistent connection per thread
+		conn = getattr(self._local, 'conn', None)
+		for attempt in (1,2):
+			if not conn:
+				conn = self._local.conn = http.client.HTTPConnection(self._host, self._port, timeout=self._timeout)
+			try:
+				conn.request(httpMethod, path, body, {'Content-Type':'application/json'})
+				response = conn.getresponse()
+				answer = json.loads(response.read())
+				break
+			except (http.client.HTTPException, ConnectionError):
+				# the server may have closed an idle connection; retry once on a new one
+				conn.close()
+				conn = self._local.conn = None
+				if attempt == 2:
+					raise
+		if response.status != 200:
+			raise Exception(answer.get('error') or ("ERROR: knowledge database server answered %d" % (response.status,)))
+		return answer
+	#_request()
+
+
+	def getStatus(self):
+		"""
+		Gets the server's database file, connection count and request statistics.
+		"""
+		return self._request('GET', '/status')
+	#getStatus()
+
+
+	def __getattr__(self, name):
+		if (name not in _generators) and (name not in _calls):
+			raise AttributeError("'%s' object has no attribute '%s'" % (type(self).__name__, name))
+		signature = inspect.signature(getattr(loki_db.Database, name))
+
+		def query(*args, **kwargs):
+			bound = signature.bind(None, *args, **kwargs)
+			bound.arguments.pop('self', None)
+			tally = bound.arguments.pop('tally', None)
+			errorCallback = bound.arguments.pop('errorCallback', None)
+			answer = self._request('POST', '/' + name, _encode(bound.arguments))
+			if name not in _generators:
+				return answer['result']
+			if tally != None:
+				tally.update(answer['tally'])
+			if errorCallback:
+				for error in answer['errors']:
+					errorCallback(*error)
+			return iter([ tuple(row) for row in answer['result'] ])
+		#query()
+		query.__name__ = name
+		query.__doc__ = getattr(loki_db.Database, name).__doc__
+		return query
+	#__getattr__()
+
+#Client
+
+
+if __name__ == "__main__":
+	parser = argparse.ArgumentParser(description="Serve LOKI knowledge database queries on a local port")
+	parser.add_argument('knowledge', type=str, help="the knowledge database file to use")
+	parser.add_argument('--port', type=int, default=7117, help="localhost port to listen on (default: 7117)")
+	parser.add_argument('--connections', type=int, default=None, help="number of pooled read-only connections (default: all CPUs)")
+	parser.add_argument('--liftover', type=str, action='append', default=[], metavar='OLD:NEW', help="preload the liftOver chains between two UCSC builds, such as 19:38 (may be repeated)")
+	parser.add_argument('--profile', type=str, choices=sorted(loki_db.Database._storageProfiles), default='default', help="storage profile; 'serve' opens the finished file read-only and immutable (default: default)")
+	parser.add_argument('--identifier-cache', action='store_true', help="preload the in-memory biopolymer identifier index")
+	args = parser.parse_args()
+
+	if not os.path.exists(args.knowledge):
+		sys.exit("ERROR: knowledge database file '%s' not found" % (args.knowledge,))
+	try:
+		liftOver = [ tuple(int(hg) for hg in pair.split(':')) for pair in args.liftover ]
+	except ValueError:
+		sys.exit("ERROR: liftOver builds must be given as OLD:NEW, such as 19:38")
+
+	db = loki_db.Database(profile=args.profile)
+	db.setVerbose(False)
+	db.attachDatabaseFile(args.knowledge)
+	if not db._dbFile:
+		sys.exit("ERROR: could not open knowledge database file '%s'" % (args.knowledge,))
+	server = QueryServer(db, args.port, args.connections, liftOver, args.identifier_cache)
+	sys.stderr.write("serving '%s' on 127.0.0.1:%d with %d connections\n" % (args.knowledge, server.server_address[1], db.getConnectionPoolCapacity()))
+	try:
+		server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+	finally:
+		server.server_close()
+		db.closeConnectionPool()
+#__main__